@@ -1,17 +1,56 @@
+import threading
 from flask import Flask
 from app.config import Config
-from app.services.rag_service import initialize_rag_chain
+from app.services.rag_service import start_rag_init, reconnect_after_fork
+from app.services.stats_cube import start_stats_refresher
+from app.services.reference_cache import warm_up_defaults
+from app.services.similarity_index import start_warm_up as start_similarity_warm_up
+from app.services.schedule_index import start_warm_up as start_schedule_warm_up
+from app.services.log_archive import start_log_archiver
+from app.services.question_clusters import start_reclusterer
+from app.services.tracing import instrument_http
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    # Outgoing HTTP calls (ServiceNow) show up as spans in request traces
+    instrument_http()
     
     # Register Blueprints
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
-    # Initialize RAG Chain
+    # Initialize RAG Chain (now, in the background or on first use; see RAG_INIT_MODE).
+    # A preloaded gunicorn master always builds it now, so workers inherit it ready.
     with app.app_context():
-        initialize_rag_chain()
-        
+        start_rag_init("eager" if Config.PRELOAD_APP else None)
+
+    # Threads do not survive a fork: with PRELOAD_APP the master stays single-threaded
+    # and every worker starts its own in gunicorn's post_fork hook (after_fork below)
+    if not Config.PRELOAD_APP:
+        start_background_services()
+
     return app
+
+def start_background_services():
+    # Precompute SHOW_STATS charts in the background
+    start_stats_refresher()
+    # Resolve the user/group sys_ids every session needs without delaying startup
+    threading.Thread(target=warm_up_defaults, name="reference-warm-up", daemon=True).start()
+    # Load the closed-change history for similar-change search before the first question needs it
+    start_similarity_warm_up()
+    # Load freezes and planned changes before the first conflict check or free-window search needs them
+    start_schedule_warm_up()
+    # Move old log days to compressed partitions and apply retention
+    start_log_archiver()
+    # Cluster unanswered questions into knowledge gaps (after the RAG chain, so its embeddings are used)
+    start_reclusterer()
+
+def after_fork():
+    """
+    Runs in each worker forked from a preloaded master (gunicorn.conf.py post_fork).
+    SQLite handles and thread pools are reset by the modules' own fork hooks; this
+    re-creates the LLM clients and starts the worker's background threads.
+    """
+    reconnect_after_fork()
+    start_background_services()
@@ -6,17 +6,96 @@ load_dotenv()
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "change_this_to_a_random_secret_key")
     GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+    # When the RAG chain is built: eager (before serving), background (thread at startup) or lazy (first question)
+    RAG_INIT_MODE = os.environ.get("RAG_INIT_MODE", "eager").lower()
+    # Whether gunicorn preloads the app: the master builds the RAG state once, workers fork from it.
+    # gunicorn.conf.py writes its final decision (PRELOAD_APP or --preload) back to this variable
+    PRELOAD_APP = os.environ.get("PRELOAD_APP", "false").lower() == "true"
+    # Memory-mapped KB/template vectors shared by all workers (rebuilt when docs/ changes)
+    VECTOR_INDEX_DIR = os.environ.get("VECTOR_INDEX_DIR", "vector_index")
     
     # ServiceNow Config
     SERVICENOW_INSTANCE = os.environ.get("SERVICENOW_INSTANCE")
     SERVICENOW_USER = os.environ.get("SERVICENOW_USER")
     SERVICENOW_PASSWORD = os.environ.get("SERVICENOW_PASSWORD")
+
+    # Overall deadline (seconds) for the approver/related/conflict lookups in the ticket view
+    TICKET_ENRICHMENT_TIMEOUT = float(os.environ.get("TICKET_ENRICHMENT_TIMEOUT", "4"))
+    # Conflicts listed in the ticket view (same CI / same group first)
+    TICKET_CONFLICT_LIMIT = int(os.environ.get("TICKET_CONFLICT_LIMIT", "10"))
+
+    # Similar-change search: seconds between incremental refreshes of the local index, and matches shown
+    SIMILARITY_REFRESH_SECONDS = int(os.environ.get("SIMILARITY_REFRESH_SECONDS", "900"))
+    SIMILARITY_TOP_K = int(os.environ.get("SIMILARITY_TOP_K", "3"))
+
+    # Rows per ServiceNow page for scheduled change listings ("Load more") and exports
+    SCHEDULE_PAGE_SIZE = int(os.environ.get("SCHEDULE_PAGE_SIZE", "50"))
+    EXPORT_PAGE_SIZE = int(os.environ.get("EXPORT_PAGE_SIZE", "500"))
+
+    # Schedule conflict index: seconds between incremental refreshes, and how far ahead planned changes are loaded
+    SCHEDULE_INDEX_REFRESH_SECONDS = int(os.environ.get("SCHEDULE_INDEX_REFRESH_SECONDS", "300"))
+    SCHEDULE_INDEX_HORIZON_DAYS = int(os.environ.get("SCHEDULE_INDEX_HORIZON_DAYS", "180"))
+    # Free-window finder: days searched when no range is given, and window length when none is given
+    SCHEDULE_SEARCH_DAYS = int(os.environ.get("SCHEDULE_SEARCH_DAYS", "14"))
+    SCHEDULE_DEFAULT_WINDOW_HOURS = float(os.environ.get("SCHEDULE_DEFAULT_WINDOW_HOURS", "4"))
+
+    # Seconds between background recomputations of the SHOW_STATS cube (0 disables the refresher)
+    STATS_REFRESH_SECONDS = int(os.environ.get("STATS_REFRESH_SECONDS", "300"))
+    # Days of change history kept in the in-memory analytics dataset
+    DATASET_HISTORY_DAYS = int(os.environ.get("DATASET_HISTORY_DAYS", "365"))
+
+    # user/change/group -> sys_id lookups: entry lifetime (seconds) and max entries per kind
+    REFERENCE_CACHE_TTL = int(os.environ.get("REFERENCE_CACHE_TTL", "3600"))
+    REFERENCE_CACHE_SIZE = int(os.environ.get("REFERENCE_CACHE_SIZE", "5000"))
+    # Approver whose queue PENDING_APPROVALS shows
+    APPROVALS_USER = os.environ.get("APPROVALS_USER", "david.loo")
+
+    # Pending approvals/tasks cache: refresh in the background after MAX_AGE seconds, never serve after MAX_STALE
+    PENDING_CACHE_MAX_AGE = int(os.environ.get("PENDING_CACHE_MAX_AGE", "60"))
+    PENDING_CACHE_MAX_STALE = int(os.environ.get("PENDING_CACHE_MAX_STALE", "900"))
+
+    # Shared secret ServiceNow sends in the X-Webhook-Token header (webhook disabled when unset)
+    WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+    # Seconds between each worker's checks for events another worker received, and the debounce before index refreshes
+    WEBHOOK_SYNC_SECONDS = float(os.environ.get("WEBHOOK_SYNC_SECONDS", "1"))
+    WEBHOOK_REFRESH_DELAY = float(os.environ.get("WEBHOOK_REFRESH_DELAY", "5"))
     
     # File Paths
     LOG_FILE = "query_logs.csv"
     FEEDBACK_FILE = "feedback_logs.csv"
     CALENDAR_FILE = "change_calendar.csv"
     ESCALATION_FILE = "escalation_logs.csv"
+    # SQLite (WAL) store for interaction/feedback/escalation logs; the CSV files above are imported into it once
+    LOG_DB_FILE = os.environ.get("LOG_DB_FILE", "logs.db")
+    # Days of logs kept in SQLite; older days move to gzip partitions in LOG_ARCHIVE_DIR (checked every LOG_ARCHIVE_INTERVAL seconds)
+    LOG_HOT_DAYS = int(os.environ.get("LOG_HOT_DAYS", "14"))
+    LOG_ARCHIVE_DIR = os.environ.get("LOG_ARCHIVE_DIR", "log_archive")
+    LOG_ARCHIVE_INTERVAL = int(os.environ.get("LOG_ARCHIVE_INTERVAL", "3600"))
+    # Archived partitions older than this many days are deleted (0 = keep forever)
+    LOG_RETENTION_DAYS = int(os.environ.get("LOG_RETENTION_DAYS", "365"))
+    # Knowledge-gap clustering: cosine similarity needed to join a cluster, re-cluster period (s), questions considered
+    QUESTION_CLUSTER_THRESHOLD = float(os.environ.get("QUESTION_CLUSTER_THRESHOLD", "0.8"))
+    QUESTION_CLUSTER_INTERVAL = int(os.environ.get("QUESTION_CLUSTER_INTERVAL", "1800"))
+    QUESTION_CLUSTER_WINDOW = int(os.environ.get("QUESTION_CLUSTER_WINDOW", "5000"))
+    # Request tracing: OTLP/JSON lines in TRACE_FILE, rolled over at TRACE_FILE_MAX_BYTES with TRACE_FILE_BACKUPS kept
+    TRACE_ENABLED = os.environ.get("TRACE_ENABLED", "true").lower() == "true"
+    TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+    TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+    TRACE_FILE_BACKUPS = int(os.environ.get("TRACE_FILE_BACKUPS", "3"))
+    # Most recent traces the dashboard's trace viewer picks the slowest from
+    TRACE_VIEW_SCAN = int(os.environ.get("TRACE_VIEW_SCAN", "500"))
+    # Sampling profiler for /ask: initial rate of 1 in PROFILE_SAMPLE_EVERY requests (0 = off until switched on from /analytics)
+    PROFILE_SAMPLE_EVERY = int(os.environ.get("PROFILE_SAMPLE_EVERY", "0"))
+    PROFILE_INTERVAL_MS = int(os.environ.get("PROFILE_INTERVAL_MS", "10"))
+    PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+    # Seconds a worker caches the on/off switch before re-reading it from the log store
+    PROFILE_SETTINGS_TTL = int(os.environ.get("PROFILE_SETTINGS_TTL", "5"))
+    # Background log writer: rows buffered before callers fall back to writing synchronously, and rows per transaction
+    LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+    LOG_BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "500"))
+    # Rows per page of the dashboard's unanswered/feedback/escalation tables (default and upper bound for ?limit=)
+    ANALYTICS_PAGE_SIZE = int(os.environ.get("ANALYTICS_PAGE_SIZE", "25"))
+    ANALYTICS_PAGE_SIZE_MAX = int(os.environ.get("ANALYTICS_PAGE_SIZE_MAX", "200"))
     
     if not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY not found. Please set it in your .env file.")
@@ -1,13 +1,10 @@
-import os
 import re
-import csv
 import datetime
-from collections import Counter, defaultdict
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash
-from langchain_core.messages import HumanMessage, AIMessage
+from collections import Counter
+from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for, flash, Response
 
 from app.config import Config
-from app.utils import check_schedule_conflict
+from app.utils import check_schedule_conflict, find_schedule_windows
 from app.services.logging_service import log_interaction, log_feedback, log_escalation
 from app.services.data_service import (
     get_servicenow_stats, create_change_request,
@@ -17,11 +14,31 @@ from app.services.ticket_service import get_ticket_details
 from app.services.email_service import generate_email_draft
 from app.services.rag_service import analyze_risk_score
 import app.services.rag_service as rag_service
-from app.services.scheduled_changes_service import get_scheduled_changes, export_scheduled_changes
+from app.services.scheduled_changes_service import get_scheduled_changes, get_more_scheduled_changes, export_scheduled_changes
 from app.services.validator_service import validate_emergency_change
+import app.services.single_flight as single_flight
+import app.services.webhook_service as webhook_service
+import app.services.schedule_index as schedule_index
+from app.services.conflict_matrix import get_conflict_matrix
+import app.services.analytics_api as analytics_api
+import app.services.question_clusters as question_clusters
+import app.services.tracing as tracing
+import app.services.profiler as profiler
+import app.services.log_store as log_store
+import app.services.log_writer as log_writer
+import app.services.log_archive as log_archive
+from app.services.export_service import stream_csv_export
 
 main_bp = Blueprint('main', __name__)
 
+@main_bp.before_app_request
+def apply_webhook_events():
+    # Cache invalidations that reached another worker's webhook (throttled, see webhook_service.sync)
+    try:
+        webhook_service.sync()
+    except Exception as e:
+        print(f"Webhook Sync Error: {e}")
+
 @main_bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
@@ -60,11 +77,15 @@ def index():
     return render_template('index.html', role=session.get('role'))
 
 @main_bp.route('/ask', methods=['POST'])
+@tracing.traced_request("POST /ask")
+@profiler.profiled
 def ask_question():
     if 'user' not in session:
         return jsonify({"error": "Unauthorized"}), 401
 
-    if not rag_service.rag_chain:
+    if not rag_service.ensure_initialized():
+        if rag_service.initializing():
+            return jsonify({"error": "Chatbot is starting up, please try again in a moment."}), 503
         return jsonify({"error": "Chatbot not initialized."}), 500
 
     data = request.get_json()
@@ -77,6 +98,7 @@ def ask_question():
     lower_q = question.lower()
 
     # Reconstruct chat history for RAG
+    from langchain_core.messages import HumanMessage, AIMessage
     chat_history = []
     for msg in chat_history_json:
         if msg.get('type') == 'human':
@@ -90,6 +112,7 @@ def ask_question():
     # --- LLM-BASED ROUTING ---
     intent = rag_service.classify_intent(question, chat_history)
     print(f"DEBUG: Detected Intent: {intent}")
+    tracing.set_root_attribute("intent", intent)
 
     # --- KEYWORD OVERRIDES REMOVED ---
     # Relying solely on LLM classification as per user request.
@@ -146,12 +169,12 @@ def ask_question():
             else:
                  return jsonify({"answer": "❌ Failed to create cloned ticket."})
 
-        suggestion = None
+        suggestions = []
         
         # Check if user explicitly chose "Find similar changes" (The "Sample Change" path)
         if "find similar changes" in lower_q or "search similar changes" in lower_q:
              from app.services.smart_change_creator import find_similar_changes
-             suggestion = find_similar_changes(question)
+             suggestions = find_similar_changes(question)
         
         # If generic "Create change" request, ask for preference (Sample vs Template)
         else:
@@ -176,31 +199,38 @@ def ask_question():
             })
 
         # Proceed with finding similar changes (if that path was chosen)
-        if suggestion:
+        if suggestions:
             from app.config import Config
             INSTANCE = Config.SERVICENOW_INSTANCE
-            view_link = f"{INSTANCE}/nav_to.do?uri=change_request.do?sysparm_query=number={suggestion['number']}"
             
-            return jsonify({"answer": f"💡 **Smart Suggestion**: I found a successful past change that matches your request:\n\n"
-                                      f"<div style='background: #f0fdf4; border-left: 4px solid #22c55e; padding: 12px; border-radius: 4px; margin: 10px 0; box-shadow: 0 1px 2px rgba(0,0,0,0.05); min-width: 600px;'>"
-                                      f"  <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 8px;'>"
-                                      f"    <div style='font-weight: 700; color: #15803d; font-size: 14px;'>{suggestion['number']}</div>"
-                                      f"    <a href='{view_link}' target='_blank' style='background-color: #293e40; color: white; padding: 6px 12px; text-decoration: none; border-radius: 6px; font-size: 12px; font-weight: 500; white-space: nowrap;'>View Change</a>"
-                                      f"  </div>"
-                                      f"  <div>"
-                                      f"    <div style='color: #374151; font-size: 13px; margin-top: 4px;'><strong>Short Description:</strong> {suggestion['short_description']}</div>"
-                                      f"    <div style='color: #6b7280; font-size: 12px; margin-top: 4px;'><strong style='color: #374151;'>Description:</strong> {suggestion.get('description', '')[:100]}...</div>"
-                                      f"    <div style='display: flex; flex-wrap: wrap; margin-top: 8px; font-size: 11px; color: #4b5563;'>"
-                                      f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Type:</span> {suggestion.get('type', 'N/A')}</div>"
-                                      f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Priority:</span> {suggestion.get('priority', 'N/A')}</div>"
-                                      f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Risk:</span> {suggestion.get('risk', 'N/A')}</div>"
-                                      f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Impact:</span> {suggestion.get('impact', 'N/A')}</div>"
-                                      f"      <div style='width: 100%; margin-bottom: 4px;'><span style='font-weight: 600;'>Group:</span> {suggestion.get('assignment_group', {}).get('display_value') if isinstance(suggestion.get('assignment_group'), dict) else suggestion.get('assignment_group', 'N/A')}</div>"
-                                      f"    </div>"
-                                      f"  </div>"
-                                      f"</div>\n\n"
-                                      f"Would you like to use this as a template?<br>\n"
-                                      f"<div style='margin-top: 10px;'><button onclick=\"document.getElementById('user-input').value='Clone {suggestion['number']}'; document.getElementById('user-input').focus();\" style='background: linear-gradient(135deg, #10b981 0%, #059669 100%); color: white; border: none; padding: 8px 16px; border-radius: 6px; cursor: pointer; font-size: 13px; font-weight: 500; box-shadow: 0 2px 4px rgba(16, 185, 129, 0.2); transition: all 0.2s;'>Clone Change</button></div>"})
+            cards = []
+            for suggestion in suggestions:
+                view_link = f"{INSTANCE}/nav_to.do?uri=change_request.do?sysparm_query=number={suggestion['number']}"
+                cards.append(
+                    f"<div style='background: #f0fdf4; border-left: 4px solid #22c55e; padding: 12px; border-radius: 4px; margin: 10px 0; box-shadow: 0 1px 2px rgba(0,0,0,0.05); min-width: 600px;'>"
+                    f"  <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 8px;'>"
+                    f"    <div style='font-weight: 700; color: #15803d; font-size: 14px;'>{suggestion['number']} <span style='background: #dcfce7; color: #166534; padding: 2px 8px; border-radius: 10px; font-size: 11px; font-weight: 600; margin-left: 6px;'>{round(suggestion.get('similarity', 0) * 100)}% match</span></div>"
+                    f"    <a href='{view_link}' target='_blank' style='background-color: #293e40; color: white; padding: 6px 12px; text-decoration: none; border-radius: 6px; font-size: 12px; font-weight: 500; white-space: nowrap;'>View Change</a>"
+                    f"  </div>"
+                    f"  <div>"
+                    f"    <div style='color: #374151; font-size: 13px; margin-top: 4px;'><strong>Short Description:</strong> {suggestion['short_description']}</div>"
+                    f"    <div style='color: #6b7280; font-size: 12px; margin-top: 4px;'><strong style='color: #374151;'>Description:</strong> {(suggestion.get('description') or '')[:100]}...</div>"
+                    f"    <div style='display: flex; flex-wrap: wrap; margin-top: 8px; font-size: 11px; color: #4b5563;'>"
+                    f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Type:</span> {suggestion.get('type', 'N/A')}</div>"
+                    f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Priority:</span> {suggestion.get('priority', 'N/A')}</div>"
+                    f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Risk:</span> {suggestion.get('risk', 'N/A')}</div>"
+                    f"      <div style='width: 50%; margin-bottom: 4px;'><span style='font-weight: 600;'>Impact:</span> {suggestion.get('impact', 'N/A')}</div>"
+                    f"      <div style='width: 100%; margin-bottom: 4px;'><span style='font-weight: 600;'>Group:</span> {suggestion.get('assignment_group', {}).get('display_value') if isinstance(suggestion.get('assignment_group'), dict) else suggestion.get('assignment_group', 'N/A')}</div>"
+                    f"    </div>"
+                    f"  </div>"
+                    f"  <div style='margin-top: 8px;'><button onclick=\"document.getElementById('user-input').value='Clone {suggestion['number']}'; document.getElementById('user-input').focus();\" style='background: linear-gradient(135deg, #10b981 0%, #059669 100%); color: white; border: none; padding: 8px 16px; border-radius: 6px; cursor: pointer; font-size: 13px; font-weight: 500; box-shadow: 0 2px 4px rgba(16, 185, 129, 0.2); transition: all 0.2s;'>Clone Change</button></div>"
+                    f"</div>"
+                )
+            
+            intro = "a successful past change that matches" if len(suggestions) == 1 else f"{len(suggestions)} successful past changes that match"
+            return jsonify({"answer": f"💡 **Smart Suggestion**: I found {intro} your request, ranked by similarity:\n\n"
+                                      + "".join(cards) +
+                                      f"\n\nWould you like to use one of these as a template?"})
 
         # If no similar changes found, create a new one and show "Red Card"
         # If no similar changes found, just show the apology message (Red Card)
@@ -237,6 +267,9 @@ def ask_question():
 
     # 7. Schedule Conflict & Scheduled Changes Intent
     if intent == "SCHEDULE_QUERY":
+        # Free-window search ("earliest 4-hour window next week") before plain conflict checks
+        if any(keyword in lower_q for keyword in ["earliest", "next available", "free window", "free slot", "when can i", "find a window", "find a slot"]):
+             return find_schedule_windows(question)
         # Check for conflict detection first (specific type of schedule query)
         if any(keyword in lower_q for keyword in ["conflict", "available", "can i"]):
              return check_schedule_conflict(question)
@@ -327,8 +360,11 @@ def ask_question():
 def feedback():
     if 'user' not in session:
         return jsonify({"error": "Unauthorized"}), 401
-    data = request.get_json()
-    log_feedback(data.get('type'), data.get('content', ''))
+    data = request.get_json(silent=True) or {}
+    try:
+        log_feedback(data.get('type'), data.get('content', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify({"status": "success"})
 
 @main_bp.route('/escalate', methods=['POST'])
@@ -348,121 +384,120 @@ def analytics():
     if 'user' not in session or session.get('role') != 'Change Admin':
         return redirect(url_for('main.login'))
         
-    logs = []
-    unanswered_list = []
-    all_questions = []
-    daily_volume = defaultdict(int)
-    hourly_volume = defaultdict(int)
-    status_counts = {"Answered": 0, "Unanswered": 0}
-    
-    total_queries = 0
-    
-    if os.path.exists(Config.LOG_FILE):
-        try:
-            with open(Config.LOG_FILE, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                rows = list(reader)
-                total_queries = len(rows)
-                
-                for row in rows:
-                    logs.insert(0, row)
-                    
-                    try:
-                        dt = datetime.datetime.strptime(row['Timestamp'], "%Y-%m-%d %H:%M:%S")
-                        date_key = dt.strftime("%Y-%m-%d")
-                        hour_key = dt.strftime("%H:00")
-                        
-                        daily_volume[date_key] += 1
-                        hourly_volume[hour_key] += 1
-                    except: pass
-
-                    all_questions.append(row['Question'].strip())
-
-                    stat = row['Status']
-                    if stat in status_counts:
-                        status_counts[stat] += 1
-                    
-                    if stat == 'Unanswered':
-                        unanswered_list.append(row)
-
-        except Exception as e:
-            print(f"Log Error: {e}")
-
-    feedback_data = {"thumbs_up": 0, "thumbs_down": 0}
-    recent_feedback = []
-    
-    if os.path.exists(Config.FEEDBACK_FILE):
-        try:
-            with open(Config.FEEDBACK_FILE, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                fb_rows = list(reader)
-                for row in fb_rows:
-                    recent_feedback.insert(0, row)
-                    if row['Type'] in feedback_data:
-                        feedback_data[row['Type']] += 1
-        except Exception as e: pass
-
-    escalations = []
-    if os.path.exists(Config.ESCALATION_FILE):
-        try:
-            with open(Config.ESCALATION_FILE, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                escalations = list(reader)
-                escalations.reverse() # Newest first
-        except Exception as e: pass
-
-    success_rate = 0
-    if total_queries > 0:
-        success_rate = round((status_counts["Answered"] / total_queries) * 100, 1)
-
-    total_feedback = feedback_data["thumbs_up"] + feedback_data["thumbs_down"]
-    satisfaction_score = 0
-    if total_feedback > 0:
-        satisfaction_score = round((feedback_data["thumbs_up"] / total_feedback) * 100, 1)
-
-    # Fill in missing dates for a continuous timeline
-    if daily_volume:
-        min_date_str = min(daily_volume.keys())
-        max_date_str = max(daily_volume.keys())
-        
-        current_date = datetime.datetime.strptime(min_date_str, "%Y-%m-%d")
-        end_date = datetime.datetime.strptime(max_date_str, "%Y-%m-%d")
-        
-        sorted_dates = []
-        volume_data = []
-        
-        while current_date <= end_date:
-            date_str = current_date.strftime("%Y-%m-%d")
-            sorted_dates.append(date_str)
-            volume_data.append(daily_volume.get(date_str, 0))
-            current_date += datetime.timedelta(days=1)
-    else:
-        sorted_dates = []
-        volume_data = []
-
-    stop_words = {'what', 'is', 'the', 'how', 'to', 'a', 'an', 'of', 'in', 'for', 'template', 'change', 'does', 'can', 'i', 'give', 'me', 'show'}
-    words = [w for w in " ".join(all_questions).lower().split() if w not in stop_words and len(w) > 3]
-    top_keywords = Counter(words).most_common(8)
+    # Only the KPI cards are rendered server-side (a handful of counter rows);
+    # charts and tables load lazily from /api/analytics/*
+    status = analytics_api.status()
+    feedback = analytics_api.feedback()
+    top_keywords = Counter(log_store.counters("keyword")).most_common(8)
 
     return render_template('analytics.html', 
-                           total=total_queries, 
-                           success_rate=success_rate,
-                           satisfaction_score=satisfaction_score,
-                           unanswered_count=len(unanswered_list),
-                           chart_labels=sorted_dates,
-                           chart_data=volume_data,
-                           status_counts=[status_counts["Answered"], status_counts["Unanswered"]],
-                           feedback_counts=[feedback_data["thumbs_up"], feedback_data["thumbs_down"]],
-                           logs=logs[:50], 
-                           unanswered_list=unanswered_list,
-                           top_keywords=top_keywords,
-                           recent_feedback=recent_feedback[:10],
-                           escalations=escalations)
+                           total=status["total"], 
+                           success_rate=status["success_rate"],
+                           satisfaction_score=feedback["satisfaction_score"],
+                           unanswered_count=status["counts"]["Unanswered"],
+                           top_keywords=top_keywords)
+
+def _analytics_api_guard():
+    if 'user' not in session or session.get('role') != 'Change Admin':
+        return jsonify({"error": "Unauthorized"}), 401
+    return None
+
+@main_bp.route('/api/analytics/<kind>')
+def analytics_api_data(kind):
+    """
+    JSON data for the analytics dashboard.
+    kind: volume | status | feedback_summary (charts), gaps (clustered unanswered questions),
+    traces (slowest recent /ask requests), profiles (sampled /ask profiles and the profiler switch)
+    or unanswered | feedback | escalations (paged lists).
+    Query params: start, end (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS), and for lists cursor and limit.
+    """
+    denied = _analytics_api_guard()
+    if denied:
+        return denied
+
+    try:
+        start, end = analytics_api.parse_range(request.args.get('start'), request.args.get('end'))
+        if kind == 'volume':
+            return jsonify(analytics_api.volume(start, end))
+        if kind == 'status':
+            return jsonify(analytics_api.status(start, end))
+        if kind == 'feedback_summary':
+            return jsonify(analytics_api.feedback(start, end))
+        if kind == 'traces':
+            return jsonify({"traces": tracing.recent_traces(int(request.args.get('limit', 20)))})
+        if kind == 'profiles':
+            return jsonify({"profiles": profiler.recent_profiles(int(request.args.get('limit', 50))),
+                            "settings": profiler.settings()})
+        if kind == 'gaps':
+            return jsonify(question_clusters.top_gaps(int(request.args.get('limit', 10))))
+        if kind in analytics_api.PAGE_TABLES:
+            return jsonify(analytics_api.page(kind, start, end, request.args.get('cursor'), request.args.get('limit')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"error": f"Unknown analytics resource: {kind}"}), 404
+
+@main_bp.route('/api/profiler', methods=['POST'])
+def profiler_switch():
+    """
+    Turn the /ask sampling profiler on or off for all workers: {"enabled": true, "sample_every": 100}.
+    """
+    denied = _analytics_api_guard()
+    if denied:
+        return denied
+
+    data = request.get_json(silent=True) or {}
+    try:
+        return jsonify(profiler.configure(data.get('enabled', False), data.get('sample_every', 100)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@main_bp.route('/analytics/profiles/<int:profile_id>.<fmt>')
+def download_profile(profile_id, fmt):
+    """
+    Download a stored profile as folded stacks (.folded, for flamegraph.pl / speedscope) or a flame graph (.svg).
+    """
+    if 'user' not in session or session.get('role') != 'Change Admin':
+        return redirect(url_for('main.login'))
+
+    profile = profiler.get_profile(profile_id)
+    if not profile:
+        return "Profile not found", 404
+    name = f"profile-{profile_id}-{profile['intent'] or 'unknown'}"
+    if fmt == 'folded':
+        return Response(profile['folded'] + "\n", mimetype='text/plain',
+                        headers={"Content-Disposition": f"attachment; filename={name}.folded"})
+    if fmt == 'svg':
+        title = (f"/ask {profile['intent'] or ''} - {profile['duration_ms']} ms, {profile['samples']} samples "
+                 f"every {profile['interval_ms']} ms ({profile['timestamp']}, request {profile['request_id']})")
+        return Response(profiler.to_flamegraph_svg(profile['folded'], title), mimetype='image/svg+xml',
+                        headers={"Content-Disposition": f"inline; filename={name}.svg"})
+    return f"Unknown format: {fmt}", 400
+
+@main_bp.route('/analytics/export')
+def export_logs():
+    """
+    Download one log table (interactions, feedback or escalations) as CSV,
+    optionally limited to ?start=&end= (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS, inclusive).
+    """
+    if 'user' not in session or session.get('role') != 'Change Admin':
+        return redirect(url_for('main.login'))
+
+    table = request.args.get('table', 'interactions')
+    if table not in log_store.TABLES:
+        return f"Unknown table: {table}", 400
+    try:
+        start, end = analytics_api.parse_range(request.args.get('start'), request.args.get('end'))
+    except ValueError as e:
+        return f"Invalid date range: {e}", 400
+
+    compress = request.accept_encodings['gzip'] > 0
+    return stream_csv_export(log_archive.export_rows(table, start, end), log_store.TABLES[table], f"{table}.csv", compress)
 
 @main_bp.route('/export_changes')
 def export_changes():
     """
-    Export scheduled changes to CSV.
+    Export scheduled changes to CSV (streamed, gzip-compressed when accepted).
     """
     if 'user' not in session:
         return redirect(url_for('main.login'))
@@ -471,4 +506,89 @@ def export_changes():
     if not query:
         return "No query provided", 400
         
-    return export_scheduled_changes(query)
+    # Compress the stream when the browser accepts gzip
+    compress = request.accept_encodings['gzip'] > 0
+    return export_scheduled_changes(query, compress=compress)
+
+@main_bp.route('/scheduled_changes/more')
+def more_scheduled_changes():
+    """
+    Next page of a scheduled changes listing (the chat table's "Load more" button).
+    """
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+        
+    query = request.args.get('query', '')
+    cursor = request.args.get('cursor')
+    if not query or not cursor:
+        return jsonify({"error": "query and cursor are required."}), 400
+        
+    return get_more_scheduled_changes(query, cursor)
+
+@main_bp.route('/metrics/servicenow')
+def servicenow_metrics():
+    """
+    Request coalescing counters for ServiceNow GETs.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+        
+    return jsonify(single_flight.metrics())
+
+@main_bp.route('/metrics/log_writer')
+def log_writer_metrics():
+    """
+    Queue depth and batch counters of the background log writer (this worker only).
+    """
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+        
+    return jsonify(log_writer.stats())
+
+@main_bp.route('/webhooks/servicenow', methods=['POST'])
+def servicenow_webhook():
+    """
+    Change/approval/task events pushed by a ServiceNow business rule.
+    Accepts one event object or {"events": [...]}.
+    """
+    if not Config.WEBHOOK_SECRET:
+        return jsonify({"error": "Webhook not configured."}), 503
+    if not webhook_service.verify_token(request.headers.get('X-Webhook-Token', '')):
+        return jsonify({"error": "Unauthorized"}), 401
+        
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "JSON body required."}), 400
+    events = data.get('events', [data])
+    if not isinstance(events, list):
+        return jsonify({"error": "events must be a list."}), 400
+    
+    # The whole batch is validated before any of it is applied
+    try:
+        actions = webhook_service.handle_events(events)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+            
+    return jsonify({"status": "ok", "actions": actions})
+
+@main_bp.route('/conflict_matrix')
+def conflict_matrix():
+    """
+    Every overlapping pair of planned changes in a window (default: this week),
+    grouped by CI and assignment group. ?format=csv downloads the pairs.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+        
+    today = datetime.date.today()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    start = schedule_index.parse_datetime(request.args.get('start', '')) or datetime.datetime.combine(week_start, datetime.time.min)
+    end = schedule_index.parse_datetime(request.args.get('end', '')) or datetime.datetime.combine(week_start + datetime.timedelta(days=6), datetime.time.min)
+    if end.time() == datetime.time.min:
+        end = schedule_index.day_window(end)[1]
+    if end < start:
+        return jsonify({"error": "end must not be before start."}), 400
+        
+    as_csv = request.args.get('format', 'json').lower() == 'csv'
+    compress = request.accept_encodings['gzip'] > 0
+    return get_conflict_matrix(start, end, as_csv=as_csv, compress=compress)
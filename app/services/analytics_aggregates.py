@@ -0,0 +1,37 @@
+"""
+Write-time aggregates for the /analytics dashboard.
+
+Every logged interaction, feedback and escalation also bumps a set of counters
+(daily/hourly volume, answered vs unanswered, feedback up/down, keyword
+frequencies). The counters live in the log store and are updated in the same
+transaction as the row they count, so the dashboard reads a few small counter
+rows instead of every log.
+"""
+
+STOP_WORDS = {'what', 'is', 'the', 'how', 'to', 'a', 'an', 'of', 'in', 'for', 'template', 'change', 'does', 'can', 'i', 'give', 'me', 'show'}
+
+
+def keywords(question):
+    return [w for w in question.lower().split() if w not in STOP_WORDS and len(w) > 3]
+
+
+def counter_updates(table, row):
+    """{(counter name, key): increment} for one new log row."""
+    day = row["Timestamp"][:10]
+    if table == "feedback":
+        return {("feedback", row["Type"]): 1, ("feedback_day", f"{day} {row['Type']}"): 1}
+    if table == "escalations":
+        return {("escalations", ""): 1}
+
+    updates = {("total", ""): 1, ("status", row["Status"]): 1}
+    time_part = row["Timestamp"][11:]
+    if time_part:
+        # Per-day breakdowns let date-range queries on the dashboard be answered from counters too
+        updates[("daily", day)] = 1
+        updates[("hourly", f"{time_part[:2]}:00")] = 1
+        updates[("day_hour", f"{day} {time_part[:2]}")] = 1
+        updates[("status_day", f"{day} {row['Status']}")] = 1
+    for word in keywords(row["Question"].strip()):
+        updates[("keyword", word)] = updates.get(("keyword", word), 0) + 1
+    return updates
+
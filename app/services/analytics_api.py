@@ -0,0 +1,168 @@
+"""
+Data behind the /api/analytics/* JSON endpoints the dashboard loads lazily.
+
+Series and breakdowns come from the write-time counters (per-day counters for
+whole-day ranges); only ranges with a time of day fall back to indexed,
+partition-pruned reads of the log store.
+Lists are paged newest-first with an opaque keyset cursor: (timestamp, id) of
+the last row returned, so a page costs the same however deep it is.
+"""
+import json
+import base64
+import datetime
+from app.config import Config
+import app.services.log_store as log_store
+import app.services.log_archive as log_archive
+
+PAGE_TABLES = {
+    "unanswered": ("interactions", "Unanswered"),
+    "feedback": ("feedback", None),
+    "escalations": ("escalations", None),
+}
+
+
+def parse_range(start, end):
+    """
+    Normalizes ?start=&end= (YYYY-MM-DD or YYYY-MM-DD HH:MM:SS) to inclusive timestamp bounds.
+    Raises ValueError for anything else.
+    """
+    bounds = []
+    for value, day_suffix in ((start, " 00:00:00"), (end, " 23:59:59")):
+        if not value:
+            bounds.append(None)
+            continue
+        value = value.strip()
+        if len(value) == 10:
+            datetime.datetime.strptime(value, "%Y-%m-%d")
+            value += day_suffix
+        else:
+            datetime.datetime.strptime(value, "%Y-%m-%d %H:%M:%S")
+        bounds.append(value)
+    if bounds[0] and bounds[1] and bounds[0] > bounds[1]:
+        raise ValueError("start must not be after end")
+    return bounds[0], bounds[1]
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["Timestamp"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(timestamp), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _fill_days(daily, start=None, end=None):
+    """Continuous day-by-day series (missing days as 0) between start and end, or the first and last logged day."""
+    first = (start or min(daily, default=""))[:10]
+    last = (end or max(daily, default=""))[:10]
+    if not first or not last:
+        return [], []
+    current = datetime.datetime.strptime(first, "%Y-%m-%d")
+    stop = datetime.datetime.strptime(last, "%Y-%m-%d")
+    labels, data = [], []
+    while current <= stop:
+        key = current.strftime("%Y-%m-%d")
+        labels.append(key)
+        data.append(daily.get(key, 0))
+        current += datetime.timedelta(days=1)
+    return labels, data
+
+
+def _whole_days(start, end):
+    """True when the range covers whole days, so per-day counters can answer it exactly."""
+    return (not start or start.endswith("00:00:00")) and (not end or end.endswith("23:59:59"))
+
+
+def _day_counters(name, start, end):
+    """Per-day counters ("YYYY-MM-DD <suffix>" keys) for the days in [start, end]."""
+    first = start[:10] if start else None
+    # "~" sorts after every suffix, so the last day's keys are all included
+    last = f"{end[:10]}~" if end else None
+    return log_store.counters(name, first, last)
+
+
+def volume(start=None, end=None):
+    """Daily query counts plus the hour-of-day profile, from counters (one row per day/hour)."""
+    if not (start or end):
+        daily = log_store.counters("daily")
+        hourly = log_store.counters("hourly")
+    elif _whole_days(start, end):
+        daily = log_store.counters("daily", start and start[:10], end and end[:10])
+        hourly = {}
+        for key, n in _day_counters("day_hour", start, end).items():
+            hour = f"{key[11:13]}:00"
+            hourly[hour] = hourly.get(hour, 0) + n
+    else:
+        daily, hourly = {}, {}
+        for row in log_archive.iter_rows("interactions", start, end, newest_first=False):
+            day, hour = row["Timestamp"][:10], f"{row['Timestamp'][11:13]}:00"
+            daily[day] = daily.get(day, 0) + 1
+            hourly[hour] = hourly.get(hour, 0) + 1
+    labels, data = _fill_days(daily, start, end)
+    return {"labels": labels, "data": data, "hourly": dict(sorted(hourly.items()))}
+
+
+def _sum_by_suffix(day_counters, counts):
+    for key, n in day_counters.items():
+        suffix = key[11:]
+        counts[suffix] = counts.get(suffix, 0) + n
+    return counts
+
+
+def status(start=None, end=None):
+    counts = {"Answered": 0, "Unanswered": 0}
+    if not (start or end):
+        counts.update(log_store.counters("status"))
+    elif _whole_days(start, end):
+        _sum_by_suffix(_day_counters("status_day", start, end), counts)
+    else:
+        counts = {s: log_archive.count("interactions", start, end, s) for s in counts}
+    total = counts["Answered"] + counts["Unanswered"]
+    success_rate = round(counts["Answered"] / total * 100, 1) if total else 0
+    return {"counts": counts, "total": total, "success_rate": success_rate}
+
+
+def feedback(start=None, end=None):
+    counts = {"thumbs_up": 0, "thumbs_down": 0}
+    if not (start or end):
+        counts.update(log_store.counters("feedback"))
+    elif _whole_days(start, end):
+        _sum_by_suffix(_day_counters("feedback_day", start, end), counts)
+    else:
+        for row in log_archive.iter_rows("feedback", start, end):
+            counts[row["Type"]] = counts.get(row["Type"], 0) + 1
+    rated = counts["thumbs_up"] + counts["thumbs_down"]
+    satisfaction = round(counts["thumbs_up"] / rated * 100, 1) if rated else 0
+    return {"counts": counts, "satisfaction_score": satisfaction}
+
+
+def page(kind, start=None, end=None, cursor=None, limit=None):
+    """One newest-first page of unanswered questions, feedback or escalations."""
+    table, status_filter = PAGE_TABLES[kind]
+    limit = max(1, min(int(limit or Config.ANALYTICS_PAGE_SIZE), Config.ANALYTICS_PAGE_SIZE_MAX))
+    after = None
+    if cursor:
+        after = decode_cursor(cursor)
+        # Everything on the next page is at or before the cursor's timestamp
+        if not end or after[0] < end:
+            end = after[0]
+
+    items = []
+    for row in log_archive.iter_rows(table, start, end, status_filter, newest_first=True, with_id=True):
+        if after and (row["Timestamp"], row["id"]) >= after:
+            continue
+        items.append(row)
+        if len(items) > limit:
+            break
+
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    items = items[:limit]
+    for row in items:
+        del row["id"]
+    return {"items": items, "next_cursor": next_cursor}
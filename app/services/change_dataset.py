@@ -0,0 +1,274 @@
+"""
+Columnar in-memory copy of change requests for analytics.
+
+Changes are loaded from ServiceNow page by page and stored as NumPy columns:
+timestamps as datetime64[s] arrays and low-cardinality fields (state, risk,
+group, ...) as integer codes into a label list. Filters, histograms and
+cross-tabs are then plain vectorized operations over the whole table, which
+covers the breakdowns the stats API cannot express as a single group-by.
+
+A snapshot is never modified in place; refreshes build a new one and swap it
+in, so readers can keep using the snapshot they hold without locking.
+"""
+import time
+import datetime
+import threading
+import requests
+import numpy as np
+from requests.auth import HTTPBasicAuth
+from app.config import Config
+
+CATEGORICAL_COLUMNS = ("state", "risk", "priority", "impact", "type", "approval",
+                       "category", "assignment_group", "assigned_to")
+TIME_COLUMNS = ("opened_at", "closed_at", "start_date", "end_date", "sys_updated_on")
+PAGE_SIZE = 1000
+
+_lock = threading.Lock()
+_snapshot = None        # dict, see build_snapshot()
+_last_refresh = None    # UTC
+_refreshing = False
+
+
+def _field(record, name, key):
+    value = record.get(name, "")
+    if isinstance(value, dict):
+        return value.get(key) or ""
+    return value or ""
+
+
+def _to_datetimes(values):
+    try:
+        return np.array(values, dtype="datetime64[s]")
+    except ValueError:
+        parsed = []
+        for value in values:
+            try:
+                parsed.append(np.datetime64(value, "s"))
+            except ValueError:
+                parsed.append(np.datetime64("NaT"))
+        return np.array(parsed, dtype="datetime64[s]")
+
+
+def _encode(values):
+    labels, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    return codes.astype(np.int32), [label if label else "Unknown" for label in labels.tolist()]
+
+
+def build_snapshot(records):
+    """
+    Builds a columnar snapshot from Table API records fetched with
+    sysparm_display_value=all (display values for categories, raw values for dates).
+    """
+    snapshot = {
+        "number": np.array([_field(r, "number", "value") for r in records], dtype=object),
+        "codes": {},
+        "labels": {},
+    }
+    for column in CATEGORICAL_COLUMNS:
+        codes, labels = _encode([_field(r, column, "display_value") for r in records])
+        snapshot["codes"][column] = codes
+        snapshot["labels"][column] = labels
+    for column in TIME_COLUMNS:
+        snapshot[column] = _to_datetimes([_field(r, column, "value") for r in records])
+    return snapshot
+
+
+def _merge(old, new):
+    """Rows of `new` replace rows of `old` with the same number; everything is re-encoded."""
+    keep = ~np.isin(old["number"], new["number"])
+    merged = {"number": np.concatenate([old["number"][keep], new["number"]]), "codes": {}, "labels": {}}
+    for column in CATEGORICAL_COLUMNS:
+        old_values = np.asarray(old["labels"][column], dtype=object)[old["codes"][column][keep]]
+        new_values = np.asarray(new["labels"][column], dtype=object)[new["codes"][column]]
+        codes, labels = _encode(np.concatenate([old_values, new_values]))
+        merged["codes"][column] = codes
+        merged["labels"][column] = labels
+    for column in TIME_COLUMNS:
+        merged[column] = np.concatenate([old[column][keep], new[column]])
+    return merged
+
+
+def get_snapshot():
+    """Returns the current snapshot, or None if nothing has been loaded yet."""
+    return _snapshot
+
+
+def size():
+    snapshot = _snapshot
+    return len(snapshot["number"]) if snapshot else 0
+
+
+def last_refresh():
+    return _last_refresh
+
+
+def refresh_dataset(force=False):
+    """
+    Loads changes opened in the last DATASET_HISTORY_DAYS days. The first call
+    pulls everything; later calls only fetch changes updated since the previous load.
+    """
+    global _snapshot, _last_refresh, _refreshing
+    INSTANCE = Config.SERVICENOW_INSTANCE
+    USER = Config.SERVICENOW_USER
+    PASSWORD = Config.SERVICENOW_PASSWORD
+
+    if not all([INSTANCE, USER, PASSWORD]):
+        return
+
+    with _lock:
+        if _refreshing:
+            return
+        since = None if force else _last_refresh
+        _refreshing = True
+
+    try:
+        started = time.time()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        # Raw date values are UTC, so the window trimmed below is a UTC date too
+        history_start = now.date() - datetime.timedelta(days=Config.DATASET_HISTORY_DAYS)
+        # Relative to the instance's clock, so neither side's time zone matters
+        query = f"opened_at>=javascript:gs.daysAgoStart({Config.DATASET_HISTORY_DAYS})"
+        if since:
+            # Overlap by a few minutes; re-reading an unchanged change is harmless
+            minutes = int((now - since).total_seconds() // 60) + 5
+            query += f"^sys_updated_on>=javascript:gs.minutesAgoStart({minutes})"
+        query += "^ORDERBYsys_id"
+
+        url = f"{INSTANCE}/api/now/table/change_request"
+        records = []
+        offset = 0
+        while True:
+            params = {
+                "sysparm_query": query,
+                "sysparm_fields": ",".join(("number",) + CATEGORICAL_COLUMNS + TIME_COLUMNS),
+                "sysparm_display_value": "all",
+                "sysparm_exclude_reference_link": "true",
+                "sysparm_limit": PAGE_SIZE,
+                "sysparm_offset": offset
+            }
+            response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params,
+                                    headers={"Accept": "application/json"}, timeout=60)
+            if response.status_code != 200:
+                print(f"Change Dataset Refresh Error: Status {response.status_code}")
+                return
+            page = response.json().get('result', [])
+            records.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        fresh = build_snapshot(records)
+        current = _snapshot
+        if since and current is not None:
+            fresh = _merge(current, fresh)
+        # Drop rows that have aged out of the history window
+        in_window = fresh["opened_at"] >= np.datetime64(history_start, "s")
+        if not in_window.all():
+            fresh = select(fresh, in_window)
+
+        with _lock:
+            _snapshot = fresh
+            _last_refresh = now
+        print(f"Change dataset refreshed: {len(records)} change(s) fetched, {size()} loaded in {time.time() - started:.1f}s")
+    except Exception as e:
+        print(f"Change Dataset Refresh Error: {e}")
+    finally:
+        with _lock:
+            _refreshing = False
+
+
+def select(snapshot, mask):
+    """Returns a new snapshot holding only the rows where `mask` is True (labels are kept)."""
+    return {
+        "number": snapshot["number"][mask],
+        "codes": {column: codes[mask] for column, codes in snapshot["codes"].items()},
+        "labels": dict(snapshot["labels"]),
+        **{column: snapshot[column][mask] for column in TIME_COLUMNS},
+    }
+
+
+def filter_mask(snapshot, since=None, until=None, time_column="opened_at", **equals):
+    """
+    Boolean row mask. `since`/`until` bound `time_column` (dates or datetimes);
+    any other keyword filters a categorical column by one label or a list of labels,
+    e.g. filter_mask(snap, state="Closed", assignment_group=["Network", "Database"]).
+    """
+    mask = np.ones(len(snapshot["number"]), dtype=bool)
+    if since is not None:
+        mask &= snapshot[time_column] >= np.datetime64(since, "s")
+    if until is not None:
+        mask &= snapshot[time_column] < np.datetime64(until, "s")
+    for column, wanted in equals.items():
+        if column not in snapshot["codes"]:
+            raise KeyError(f"Unknown column: {column}")
+        wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+        labels = snapshot["labels"][column]
+        wanted_codes = [i for i, label in enumerate(labels) if label in wanted]
+        mask &= np.isin(snapshot["codes"][column], wanted_codes)
+    return mask
+
+
+def value_counts(snapshot, column, mask=None):
+    """Counts per label of a categorical column, largest first, as {"labels", "data"}."""
+    codes = snapshot["codes"][column]
+    if mask is not None:
+        codes = codes[mask]
+    counts = np.bincount(codes, minlength=len(snapshot["labels"][column]))
+    order = np.argsort(-counts, kind="stable")
+    order = order[counts[order] > 0]
+    return {"labels": [snapshot["labels"][column][i] for i in order], "data": counts[order].tolist()}
+
+
+def duration_histogram(snapshot, edges_days, start="opened_at", end="closed_at", mask=None):
+    """
+    Histogram of (end - start) in days. `edges_days` are the upper bounds of
+    each bucket; one extra bucket collects everything above the last edge.
+    Rows missing either timestamp are ignored.
+    """
+    valid = ~np.isnat(snapshot[start]) & ~np.isnat(snapshot[end])
+    if mask is not None:
+        valid &= mask
+    elapsed = (snapshot[end][valid] - snapshot[start][valid]).astype(np.int64) / 86400.0
+    buckets = np.searchsorted(np.asarray(edges_days, dtype=float), elapsed, side="right")
+    return np.bincount(buckets, minlength=len(edges_days) + 1).tolist()
+
+
+def monthly_counts(snapshot, since, until, time_column="opened_at", mask=None):
+    """Rows per calendar month of `time_column` in [since, until), as {"labels", "data"}."""
+    first = np.datetime64(since, "M")
+    last = (np.datetime64(until, "s") - np.timedelta64(1, "s")).astype("datetime64[M]")
+    months = np.arange(first, last + 1)
+    stamps = snapshot[time_column]
+    valid = ~np.isnat(stamps) & (stamps >= np.datetime64(since, "s")) & (stamps < np.datetime64(until, "s"))
+    if mask is not None:
+        valid &= mask
+    offsets = (stamps[valid].astype("datetime64[M]") - first).astype(np.int64)
+    counts = np.bincount(offsets, minlength=len(months))[:len(months)]
+    labels = [m.astype(datetime.date).strftime("%b %Y") for m in months]
+    return {"labels": labels, "data": counts.tolist()}
+
+
+def crosstab(snapshot, row_column, col_column, mask=None):
+    """
+    Counts for every (row label, column label) pair.
+    Returns (row_labels, col_labels, matrix) with matrix[i][j] as an int.
+    """
+    rows = snapshot["codes"][row_column]
+    cols = snapshot["codes"][col_column]
+    if mask is not None:
+        rows, cols = rows[mask], cols[mask]
+    n_rows = len(snapshot["labels"][row_column])
+    n_cols = len(snapshot["labels"][col_column])
+    matrix = np.bincount(rows.astype(np.int64) * n_cols + cols, minlength=n_rows * n_cols).reshape(n_rows, n_cols)
+    return snapshot["labels"][row_column], snapshot["labels"][col_column], matrix
+
+
+def approval_rate_by(snapshot, column, mask=None):
+    """Share of decided changes that were approved, per label of `column` (percent, 1 decimal)."""
+    row_labels, approval_labels, matrix = crosstab(snapshot, column, "approval", mask)
+    approved = matrix[:, [i for i, label in enumerate(approval_labels) if label == "Approved"]].sum(axis=1)
+    decided = matrix[:, [i for i, label in enumerate(approval_labels) if label in ("Approved", "Rejected")]].sum(axis=1)
+    has_decisions = decided > 0
+    rates = np.round(100.0 * approved[has_decisions] / decided[has_decisions], 1)
+    labels = [label for label, keep in zip(row_labels, has_decisions) if keep]
+    return {"labels": labels, "data": rates.tolist()}
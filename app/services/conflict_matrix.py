@@ -0,0 +1,146 @@
+"""
+Overlap matrix for every planned change in a release window (CAB preparation).
+
+All changes in the window are loaded once, then a sweep line over their start
+times finds every overlapping pair in O(n log n + pairs). Pairs are tagged
+with whether they share a configuration item or an assignment group and are
+grouped by both.
+"""
+import heapq
+import datetime
+from collections import defaultdict
+from flask import jsonify
+from requests.auth import HTTPBasicAuth
+from app.config import Config
+import app.services.single_flight as single_flight
+import app.services.schedule_index as schedule_index
+from app.services.export_service import stream_csv_export
+
+PAGE_SIZE = 1000
+CSV_FIELDS = ["change_a", "change_b", "overlap_start", "overlap_end", "overlap_hours",
+              "same_ci", "same_group", "ci_a", "ci_b", "group_a", "group_b", "risk_a", "risk_b"]
+
+
+def _mock_changes(start):
+    day = start.strftime("%Y-%m-%d")
+    return [
+        {"number": "CHG0040001", "short_description": "Core switch firmware upgrade", "risk": "High", "state": "Scheduled",
+         "start_date": f"{day} 01:00:00", "end_date": f"{day} 05:00:00", "cmdb_ci": "Core-Switch-01", "assignment_group": "Network Team"},
+        {"number": "CHG0040002", "short_description": "Firewall rule cleanup", "risk": "Moderate", "state": "Scheduled",
+         "start_date": f"{day} 03:00:00", "end_date": f"{day} 04:00:00", "cmdb_ci": "FW-Edge-02", "assignment_group": "Network Team"},
+        {"number": "CHG0040003", "short_description": "VLAN re-tagging on core", "risk": "Low", "state": "Scheduled",
+         "start_date": f"{day} 04:30:00", "end_date": f"{day} 06:00:00", "cmdb_ci": "Core-Switch-01", "assignment_group": "Infrastructure"},
+        {"number": "CHG0040004", "short_description": "Oracle quarterly patch", "risk": "High", "state": "Scheduled",
+         "start_date": f"{day} 22:00:00", "end_date": f"{day} 23:30:00", "cmdb_ci": "Oracle-DB-Prod-01", "assignment_group": "Database Team"},
+    ]
+
+
+def load_window_changes(start, end):
+    """Every active change whose planned window overlaps [start, end], as schedule-index intervals."""
+    if not all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD]):
+        records = _mock_changes(start)
+    else:
+        url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/change_request"
+        query = (f"start_date<=javascript:gs.dateGenerate('{end:%Y-%m-%d}','{end:%H:%M:%S}')"
+                 f"^end_date>=javascript:gs.dateGenerate('{start:%Y-%m-%d}','{start:%H:%M:%S}')"
+                 f"^stateIN{','.join(sorted(schedule_index.ACTIVE_STATES))}^ORDERBYsys_id")
+        records = []
+        offset = 0
+        while True:
+            params = {
+                "sysparm_query": query,
+                "sysparm_fields": "number,short_description,start_date,end_date,state,risk,cmdb_ci,assignment_group",
+                "sysparm_display_value": "all",
+                "sysparm_exclude_reference_link": "true",
+                "sysparm_limit": PAGE_SIZE,
+                "sysparm_offset": offset
+            }
+            response = single_flight.get(url, auth=HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD),
+                                         params=params, headers={"Accept": "application/json"}, timeout=30)
+            if response.status_code != 200:
+                raise Exception(f"ServiceNow API Error: Status {response.status_code}")
+            page = response.json().get('result', [])
+            records.extend(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+    intervals = [schedule_index.change_interval(r) for r in records]
+    return [i for i in intervals if i and i["start"] <= end and i["end"] >= start]
+
+
+def overlap_pairs(intervals):
+    """
+    Sweep line: visit intervals by start; a min-heap of active intervals keyed
+    by end drops everything that finished before the current start, and the
+    rest of the heap overlaps the current interval.
+    """
+    ordered = sorted(intervals, key=lambda i: (i["start"], i["end"]))
+    active = []     # (end, position, interval)
+    pairs = []
+    for pos, current in enumerate(ordered):
+        while active and active[0][0] < current["start"]:
+            heapq.heappop(active)
+        for _, _, other in active:
+            pairs.append((other, current))
+        heapq.heappush(active, (current["end"], pos, current))
+    return pairs
+
+
+def _pair_row(a, b):
+    overlap_start = max(a["start"], b["start"])
+    overlap_end = min(a["end"], b["end"])
+    return {
+        "change_a": a["number"],
+        "change_b": b["number"],
+        "overlap_start": overlap_start.strftime("%Y-%m-%d %H:%M:%S"),
+        "overlap_end": overlap_end.strftime("%Y-%m-%d %H:%M:%S"),
+        "overlap_hours": round((overlap_end - overlap_start).total_seconds() / 3600, 2),
+        "same_ci": bool(a.get("ci")) and a.get("ci") == b.get("ci"),
+        "same_group": bool(a.get("group")) and a.get("group") == b.get("group"),
+        "ci_a": a.get("ci_name", ""),
+        "ci_b": b.get("ci_name", ""),
+        "group_a": a.get("group_name", ""),
+        "group_b": b.get("group_name", ""),
+        "risk_a": a.get("risk", ""),
+        "risk_b": b.get("risk", ""),
+    }
+
+
+def build_matrix(intervals):
+    """Pair rows (same-CI first, then same-group), a sparse adjacency matrix, and groupings by CI and group."""
+    rows = [_pair_row(a, b) for a, b in overlap_pairs(intervals)]
+    rows.sort(key=lambda r: (not r["same_ci"], not r["same_group"], r["overlap_start"]))
+
+    matrix = defaultdict(list)
+    by_ci = defaultdict(list)
+    by_group = defaultdict(list)
+    for row in rows:
+        matrix[row["change_a"]].append(row["change_b"])
+        matrix[row["change_b"]].append(row["change_a"])
+        if row["same_ci"]:
+            by_ci[row["ci_a"]].append([row["change_a"], row["change_b"]])
+        if row["same_group"]:
+            by_group[row["group_a"]].append([row["change_a"], row["change_b"]])
+    return {"pairs": rows, "matrix": dict(matrix), "by_ci": dict(by_ci), "by_group": dict(by_group)}
+
+
+def get_conflict_matrix(start, end, as_csv=False, compress=False):
+    """Overlap matrix for [start, end] as JSON, or the pair list as a streamed CSV download."""
+    try:
+        intervals = load_window_changes(start, end)
+    except Exception as e:
+        print(f"Conflict Matrix Error: {e}")
+        return jsonify({"error": f"Could not load changes: {e}"}), 502
+
+    result = build_matrix(intervals)
+    if as_csv:
+        filename = f"conflict_matrix_{start:%Y%m%d}_{end:%Y%m%d}.csv"
+        return stream_csv_export([result["pairs"]], CSV_FIELDS, filename, compress)
+
+    return jsonify({
+        "window": {"start": start.strftime("%Y-%m-%d %H:%M:%S"), "end": end.strftime("%Y-%m-%d %H:%M:%S")},
+        "changes": len(intervals),
+        "overlapping_pairs": len(result["pairs"]),
+        **result
+    })
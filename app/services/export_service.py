@@ -1,6 +1,7 @@
 import csv
 import io
-from flask import Response
+import zlib
+from flask import Response, stream_with_context
 
 def generate_csv_export(data, filename="export.csv"):
     """
@@ -32,3 +33,56 @@ def generate_csv_export(data, filename="export.csv"):
         mimetype="text/csv",
         headers={"Content-disposition": f"attachment; filename={filename}"}
     )
+
+def stream_csv_export(pages, fieldnames, filename="export.csv", compress=False):
+    """
+    Stream a CSV export page by page instead of building it in memory.
+    
+    Args:
+        pages (iterable): Iterable of row lists (dictionaries keyed by fieldnames).
+            Each page is written and flushed to the client as soon as it is produced.
+            If it raises, the headers are already sent, so the file ends with a
+            "# export truncated: <error>" line instead of looking complete.
+        fieldnames (list): Column headers, in order.
+        filename (str): Name of the file for download.
+        compress (bool): Gzip the body (sent with Content-Encoding: gzip).
+        
+    Returns:
+        Response: Streaming Flask response object with CSV data.
+    """
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames, extrasaction="ignore")
+        # wbits=31 -> gzip container
+        compressor = zlib.compressobj(wbits=31) if compress else None
+
+        def drain(final=False):
+            data = buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate(0)
+            if not compressor:
+                return data
+            # Sync-flush after each page so the client receives it now, not when the export ends
+            return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+        writer.writeheader()
+        yield drain()
+        try:
+            for page in pages:
+                writer.writerows(page)
+                chunk = drain()
+                if chunk:
+                    yield chunk
+        except Exception as e:
+            print(f"Export Error: {e}")
+            buffer.write(f"# export truncated: {e}\r\n")
+        chunk = drain(final=True)
+        if chunk:
+            yield chunk
+
+    headers = {"Content-disposition": f"attachment; filename={filename}"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+
+    return Response(stream_with_context(generate()), mimetype="text/csv", headers=headers)
@@ -0,0 +1,40 @@
+"""
+Exclusive lock on a file, shared by every process that opens it.
+
+gunicorn workers are separate processes, so a threading.Lock cannot keep them
+from racing on a shared file (log rotation, index builds). fcntl.flock is used
+on POSIX and msvcrt.locking on Windows; both locks go away when the file is
+closed, so a holder that crashes never leaves the lock behind.
+"""
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Holds an exclusive lock on `path` (created if missing) while the block runs."""
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after about 10 seconds; keep waiting, as flock does
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
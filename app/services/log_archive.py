@@ -0,0 +1,195 @@
+"""
+Daily, gzip-compressed partitions for log rows that have left the hot window.
+
+The log store keeps the last LOG_HOT_DAYS days in SQLite. Older rows are moved
+out one day at a time into <LOG_ARCHIVE_DIR>/<table>/<YYYY-MM-DD>.csv.gz, so the
+database stays small however long the app has been running. Partitions older
+than LOG_RETENTION_DAYS are deleted (0 keeps them forever).
+
+query()/count()/export_rows() accept a date range and open only the partition
+files for days inside it: a "last 7 days" read never touches the archive.
+The dashboard's write-time counters are lifetime totals and are not affected
+by archiving or retention.
+"""
+import os
+import csv
+import gzip
+import heapq
+import datetime
+import itertools
+import threading
+import time
+from app.config import Config
+import app.services.log_store as log_store
+
+SUFFIX = ".csv.gz"
+
+_archiver_started = False
+
+
+def _reset_after_fork():
+    # The archiver thread does not survive a fork; let the worker start its own
+    global _archiver_started
+    _archiver_started = False
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _table_dir(table):
+    return os.path.join(Config.LOG_ARCHIVE_DIR, table)
+
+
+def partition_path(table, day):
+    return os.path.join(_table_dir(table), f"{day}{SUFFIX}")
+
+
+def partition_days(table, start=None, end=None):
+    """Archived days of one table within [start, end], oldest first (pruning is by file name only)."""
+    try:
+        names = os.listdir(_table_dir(table))
+    except FileNotFoundError:
+        return []
+    days = sorted(n[:-len(SUFFIX)] for n in names if n.endswith(SUFFIX))
+    # Timestamps start with the day, so comparing the first 10 characters prunes whole files
+    return [d for d in days if (not start or d >= start[:10]) and (not end or d <= end[:10])]
+
+
+def _read_partition(table, day):
+    with gzip.open(partition_path(table, day), mode="rt", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _write_partition(table, day, rows):
+    os.makedirs(_table_dir(table), exist_ok=True)
+    path = partition_path(table, day)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp, mode="wt", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["id"] + log_store.TABLES[table])
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp, path)
+
+
+def _archive_day(conn, table, day):
+    """Moves one day of rows into its partition. Runs under the store's write lock, so workers cannot race."""
+    with log_store.transaction():
+        rows = list(log_store.rows(table, start=day, end=f"{day} 23:59:59", newest_first=False, with_id=True))
+        if not rows:
+            return 0
+        if os.path.exists(partition_path(table, day)):
+            # Late rows for an already archived day (or a retry after a crash): merge by id
+            existing = {str(r["id"]): r for r in _read_partition(table, day)}
+            existing.update((str(r["id"]), r) for r in rows)
+            merged = sorted(existing.values(), key=lambda r: (r["Timestamp"], int(r["id"])))
+        else:
+            merged = rows
+        _write_partition(table, day, merged)
+        conn.execute(f"DELETE FROM {table} WHERE timestamp >= ? AND timestamp <= ?", (day, f"{day} 23:59:59"))
+    return len(rows)
+
+
+def archive_old_rows(today=None):
+    """Moves every day older than the hot window out of SQLite. Returns {table: rows moved}."""
+    today = today or datetime.date.today()
+    cutoff = (today - datetime.timedelta(days=Config.LOG_HOT_DAYS)).isoformat()
+    conn = log_store.connection()
+    moved = {}
+    for table in log_store.TABLES:
+        days = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT substr(timestamp, 1, 10) FROM {table} WHERE timestamp < ?", (cutoff,))]
+        moved[table] = sum(_archive_day(conn, table, day) for day in days)
+    return moved
+
+
+def apply_retention(today=None):
+    """Deletes partitions older than LOG_RETENTION_DAYS. Returns the number of files removed."""
+    if Config.LOG_RETENTION_DAYS <= 0:
+        return 0
+    today = today or datetime.date.today()
+    oldest_kept = (today - datetime.timedelta(days=Config.LOG_RETENTION_DAYS)).isoformat()
+    removed = 0
+    for table in log_store.TABLES:
+        for day in partition_days(table, end=oldest_kept):
+            if day < oldest_kept:
+                try:
+                    os.remove(partition_path(table, day))
+                    removed += 1
+                except FileNotFoundError:
+                    pass    # another worker got there first
+    return removed
+
+
+def run_maintenance():
+    try:
+        moved = archive_old_rows()
+        removed = apply_retention()
+        if any(moved.values()) or removed:
+            print(f"Log archive: moved {moved}, removed {removed} expired partitions")
+    except Exception as e:
+        print(f"Log archive error: {e}")
+
+
+def start_log_archiver():
+    """Background thread that archives and applies retention every LOG_ARCHIVE_INTERVAL seconds."""
+    global _archiver_started
+    if _archiver_started:
+        return
+    _archiver_started = True
+
+    def loop():
+        while True:
+            run_maintenance()
+            time.sleep(Config.LOG_ARCHIVE_INTERVAL)
+
+    threading.Thread(target=loop, name="log-archiver", daemon=True).start()
+
+
+# --- Range reads across the database and the archive ---
+
+def _archived_rows(table, start, end, status, newest_first):
+    days = partition_days(table, start, end)
+    for day in (reversed(days) if newest_first else days):
+        rows = _read_partition(table, day)
+        if newest_first:
+            rows.reverse()
+        for row in rows:
+            if start and row["Timestamp"] < start:
+                continue
+            if end and row["Timestamp"] > end:
+                continue
+            if status and row.get("Status") != status:
+                continue
+            row["id"] = int(row["id"])
+            yield row
+
+
+def iter_rows(table, start=None, end=None, status=None, newest_first=True, with_id=False):
+    """Rows in [start, end] from the database and the partitions for those days, in (timestamp, id) order."""
+    status = status if table == "interactions" else None
+    hot = log_store.rows(table, start, end, status, newest_first, with_id=True)
+    cold = _archived_rows(table, start, end, status, newest_first)
+    merged = heapq.merge(hot, cold, key=lambda r: (r["Timestamp"], r["id"]), reverse=newest_first)
+    for row in merged:
+        if not with_id:
+            del row["id"]
+        yield row
+
+
+def query(table, start=None, end=None, status=None, limit=None, newest_first=True, with_id=False):
+    return list(itertools.islice(iter_rows(table, start, end, status, newest_first, with_id), limit))
+
+
+def count(table, start=None, end=None, status=None):
+    archived = sum(1 for _ in _archived_rows(table, start, end, status if table == "interactions" else None, False))
+    return log_store.count(table, start, end, status) + archived
+
+
+def export_rows(table, start=None, end=None, page_size=5000):
+    """Oldest-first pages of rows for a streamed CSV export."""
+    rows = iter_rows(table, start, end, newest_first=False)
+    while True:
+        page = list(itertools.islice(rows, page_size))
+        if not page:
+            break
+        yield page
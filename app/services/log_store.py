@@ -0,0 +1,278 @@
+"""
+SQLite log store for chat interactions, feedback and escalations.
+
+The database runs in WAL mode, so several gunicorn workers can append while
+the dashboard reads. Every row is indexed by timestamp (and interactions by
+status), so time-range and status queries never scan the whole log. The
+dashboard counters (see analytics_aggregates) live in the same database and are
+bumped in the same transaction as the row they count.
+
+The CSV logs of earlier versions are imported once, the first time the store
+is opened. Days older than the hot window are moved out to compressed daily
+partitions by log_archive.
+"""
+import os
+import csv
+import sqlite3
+import itertools
+import threading
+from app.config import Config
+
+TABLES = {
+    "interactions": ["Timestamp", "Question", "Status"],
+    "feedback": ["Timestamp", "Type", "Message_Snippet"],
+    "escalations": ["Timestamp", "Reason", "User_Query", "Bot_Response"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    question TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_timestamp ON interactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_interactions_status ON interactions(status, timestamp);
+
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    type TEXT NOT NULL,
+    message_snippet TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp);
+
+CREATE TABLE IF NOT EXISTS escalations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    reason TEXT,
+    user_query TEXT,
+    bot_response TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_escalations_timestamp ON escalations(timestamp);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (name, key)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS question_embeddings (
+    model TEXT NOT NULL,
+    question TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, question)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS profiles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    request_id TEXT,
+    intent TEXT,
+    duration_ms REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    interval_ms INTEGER NOT NULL,
+    folded TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    received_at TEXT NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_webhook_events_received ON webhook_events(received_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _reset_after_fork():
+    # A connection must never be used on both sides of a fork: the child opens its own
+    global _local, _init_lock
+    _local = threading.local()
+    _init_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _open():
+    conn = sqlite3.connect(Config.LOG_DB_FILE, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: durable across application crashes, one fsync per checkpoint instead of per commit
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def connection():
+    """Per-thread connection (sqlite3 connections must not be shared between threads)."""
+    global _initialized
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _open()
+        _local.conn = conn
+    if not _initialized:
+        with _init_lock:
+            if not _initialized:
+                conn.executescript(SCHEMA)
+                _import_csv_logs(conn)
+                _initialized = True
+    return conn
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT / ROLLBACK; takes the write lock up front so concurrent writers queue instead of failing."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def transaction():
+    return _Transaction(connection())
+
+
+# --- Writes ---
+
+def _bump(conn, counts):
+    conn.executemany(
+        "INSERT INTO counters(name, key, count) VALUES (?, ?, ?) "
+        "ON CONFLICT(name, key) DO UPDATE SET count = count + excluded.count",
+        [(name, key, n) for (name, key), n in counts.items()]
+    )
+
+
+def _insert(conn, table, row, counts):
+    if table == "interactions":
+        conn.execute("INSERT INTO interactions(timestamp, question, status) VALUES (?, ?, ?)",
+                     (row["Timestamp"], row["Question"], row["Status"]))
+    elif table == "feedback":
+        conn.execute("INSERT INTO feedback(timestamp, type, message_snippet) VALUES (?, ?, ?)",
+                     (row["Timestamp"], row["Type"], row["Message_Snippet"]))
+    else:
+        conn.execute("INSERT INTO escalations(timestamp, reason, user_query, bot_response) VALUES (?, ?, ?, ?)",
+                     (row["Timestamp"], row["Reason"], row["User_Query"], row["Bot_Response"]))
+
+    # Counter updates are imported lazily to avoid a circular import at module load
+    from app.services.analytics_aggregates import counter_updates
+    for key, n in counter_updates(table, row).items():
+        counts[key] = counts.get(key, 0) + n
+
+
+def write_rows(records):
+    """
+    Inserts (table, row) records and their counter updates in a single transaction.
+    Rows are dicts keyed by the TABLES column names.
+    """
+    counts = {}
+    with transaction() as conn:
+        for table, row in records:
+            _insert(conn, table, row, counts)
+        _bump(conn, counts)
+
+
+def add(table, row):
+    write_rows([(table, row)])
+
+
+# --- CSV import / export ---
+
+def _import_csv_logs(conn):
+    """One-time import of the legacy CSV logs into an empty store."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_imported'").fetchone():
+        return
+    sources = {"interactions": Config.LOG_FILE, "feedback": Config.FEEDBACK_FILE, "escalations": Config.ESCALATION_FILE}
+    counts = {}
+    imported = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Another worker may have finished the import while we waited for the write lock
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'csv_imported'").fetchone():
+            conn.execute("ROLLBACK")
+            return
+        for table, path in sources.items():
+            if not os.path.exists(path):
+                continue
+            with open(path, mode='r', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    row = {field: (row.get(field) or "") for field in TABLES[table]}
+                    if not row["Timestamp"]:
+                        continue
+                    _insert(conn, table, row, counts)
+                    imported += 1
+        _bump(conn, counts)
+        conn.execute("INSERT INTO meta(key, value) VALUES ('csv_imported', datetime('now'))")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if imported:
+        print(f"Log store: imported {imported} rows from CSV logs into {Config.LOG_DB_FILE}")
+
+
+def _where(start=None, end=None, status=None):
+    clauses, params = [], []
+    if start:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end:
+        clauses.append("timestamp <= ?")
+        params.append(end)
+    if status:
+        clauses.append("status = ?")
+        params.append(status)
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def rows(table, start=None, end=None, status=None, newest_first=True, with_id=False):
+    """
+    Lazily iterates one table as dicts keyed by the CSV column names (plus "id" if with_id).
+    start/end are "YYYY-MM-DD[ HH:MM:SS]" strings (inclusive); status only applies to interactions.
+    """
+    columns = (["id"] if with_id else []) + TABLES[table]
+    where, params = _where(start, end, status if table == "interactions" else None)
+    order = "DESC" if newest_first else "ASC"
+    cursor = connection().execute(
+        f"SELECT {', '.join(c.lower() for c in columns)} FROM {table}{where} ORDER BY timestamp {order}, id {order}", params)
+    for r in cursor:
+        yield dict(zip(columns, r))
+
+
+def query(table, start=None, end=None, status=None, limit=None, newest_first=True):
+    """Rows of one table still in the database (see log_archive.query for ranges that reach archived days)."""
+    return list(itertools.islice(rows(table, start, end, status, newest_first), limit))
+
+
+def count(table, start=None, end=None, status=None):
+    where, params = _where(start, end, status if table == "interactions" else None)
+    return connection().execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+
+
+def counters(name, first_key=None, last_key=None):
+    """Counters of one kind as {key: count}, optionally only keys in [first_key, last_key] (a primary-key range scan)."""
+    sql, params = "SELECT key, count FROM counters WHERE name = ?", [name]
+    if first_key:
+        sql += " AND key >= ?"
+        params.append(first_key)
+    if last_key:
+        sql += " AND key <= ?"
+        params.append(last_key)
+    return {key: n for key, n in connection().execute(sql, params)}
+
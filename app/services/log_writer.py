@@ -0,0 +1,122 @@
+"""
+Background writer that takes log rows off the request path.
+
+submit() only puts the row on a bounded in-memory queue. A daemon thread per
+process drains the queue and writes whatever has accumulated, up to
+LOG_BATCH_SIZE rows, in one log_store transaction (group commit). SQLite's
+write lock keeps batches from several gunicorn workers from interleaving.
+
+If the queue is full (the writer has fallen behind), the caller writes its row
+synchronously instead of dropping it. A batch whose transaction fails is
+retried one row per transaction, so only the rows that fail again are lost.
+Rows still queued at interpreter exit are flushed by an atexit hook.
+"""
+import os
+import queue
+import atexit
+import threading
+from app.config import Config
+import app.services.log_store as log_store
+
+_queue = None
+_thread = None
+_pid = None
+_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"queued": 0, "written": 0, "batches": 0, "sync_fallbacks": 0, "errors": 0, "dropped": 0}
+
+
+def _count(**increments):
+    # Bumped from request threads and the writer thread alike
+    with _stats_lock:
+        for name, n in increments.items():
+            _stats[name] += n
+
+
+def _ensure_started():
+    """Starts the writer thread once per process (a forked worker gets its own queue and thread)."""
+    global _queue, _thread, _pid
+    if _pid == os.getpid() and _thread and _thread.is_alive():
+        return
+    with _lock:
+        if _pid == os.getpid() and _thread and _thread.is_alive():
+            return
+        _queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_run, args=(_queue,), name="log-writer", daemon=True)
+        _thread.start()
+
+
+def _write(batch):
+    try:
+        log_store.write_rows(batch)
+        _count(written=len(batch), batches=1)
+        return
+    except Exception as e:
+        _count(errors=1)
+        if len(batch) == 1:
+            _count(dropped=1)
+            print(f"Log writer error (1 {batch[0][0]} row lost): {e}")
+            return
+        print(f"Log writer error, retrying {len(batch)} rows one by one: {e}")
+    # One bad row must not take the rest of the batch with it
+    for record in batch:
+        _write([record])
+
+
+def _drain(q, batch):
+    while len(batch) < Config.LOG_BATCH_SIZE:
+        try:
+            batch.append(q.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+def _run(q):
+    while True:
+        # Block for the first row, then take whatever else is already waiting
+        batch = _drain(q, [q.get()])
+        _write(batch)
+        for _ in batch:
+            q.task_done()
+
+
+def submit(table, row):
+    """Queues one log row; writes it synchronously if the queue is full."""
+    _ensure_started()
+    try:
+        _queue.put_nowait((table, row))
+        _count(queued=1)
+    except queue.Full:
+        _count(sync_fallbacks=1)
+        _write([(table, row)])
+
+
+def flush(timeout=None):
+    """Blocks until every queued row has been written (used at shutdown and in tests)."""
+    if _queue is None or _pid != os.getpid():
+        return
+    if _thread and _thread.is_alive():
+        if timeout is None:
+            _queue.join()
+            return
+        done = threading.Event()
+        threading.Thread(target=lambda: (_queue.join(), done.set()), daemon=True).start()
+        if done.wait(timeout):
+            return
+    # Writer thread gone or stuck: write the remainder here
+    batch = _drain(_queue, [])
+    while batch:
+        _write(batch)
+        for _ in batch:
+            _queue.task_done()
+        batch = _drain(_queue, [])
+
+
+def stats():
+    with _stats_lock:
+        return {**_stats, "pending": _queue.qsize() if _queue else 0}
+
+
+atexit.register(flush, 5)
@@ -1,7 +1,7 @@
-import os
-import csv
 import datetime
 from app.config import Config
+import app.services.log_writer as log_writer
+import app.services.question_clusters as question_clusters
 
 def log_interaction(question, answer):
     # Define triggers for unanswered queries
@@ -25,64 +25,46 @@ def log_interaction(question, answer):
         print(f"DEBUG: Status set to Answered (No trigger match)")
     
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    file_exists = os.path.isfile(Config.LOG_FILE)
     try:
-        # Ensure file ends with newline before appending
-        if file_exists:
-            with open(Config.LOG_FILE, mode='rb+') as f:
-                f.seek(0, 2) # Go to end
-                if f.tell() > 0:
-                    f.seek(-1, 1)
-                    if f.read(1) != b'\n':
-                        f.write(b'\n')
-
-        with open(Config.LOG_FILE, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Question", "Status"])
-            writer.writerow([timestamp, question, status])
+        log_writer.submit("interactions", {"Timestamp": timestamp, "Question": question, "Status": status})
+        if status == "Unanswered":
+            question_clusters.add_question(question, timestamp)
     except Exception as e:
         print(f"Logging error: {e}")
 
+FEEDBACK_TYPES = ("thumbs_up", "thumbs_down")
+
 def log_feedback(feedback_type, message_content):
+    if feedback_type not in FEEDBACK_TYPES:
+        raise ValueError(f"Unknown feedback type: {feedback_type}")
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    file_exists = os.path.isfile(Config.FEEDBACK_FILE)
     try:
-        with open(Config.FEEDBACK_FILE, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Type", "Message_Snippet"])
-            writer.writerow([timestamp, feedback_type, message_content[:100]])
+        snippet = message_content if isinstance(message_content, str) else ""
+        log_writer.submit("feedback", {"Timestamp": timestamp, "Type": feedback_type, "Message_Snippet": snippet[:100]})
     except Exception as e:
         print(f"Feedback logging error: {e}")
 
 def log_escalation(chat_history, reason="User Request"):
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    file_exists = os.path.isfile(Config.ESCALATION_FILE)
     try:
-        with open(Config.ESCALATION_FILE, mode='a', newline='', encoding='utf-8') as file:
-            writer = csv.writer(file)
-            if not file_exists:
-                writer.writerow(["Timestamp", "Reason", "User_Query", "Bot_Response"])
-            
-            # Extract last user query and bot response from chat history
-            user_query = "N/A"
-            bot_response = "N/A"
-            
-            if chat_history and isinstance(chat_history, list):
-                # Find the last human message and AI message
-                for msg in reversed(chat_history):
-                    if isinstance(msg, dict):
-                        if msg.get('type') == 'human' and user_query == "N/A":
-                            user_query = msg.get('content', 'N/A')[:200]  # Limit to 200 chars
-                        elif msg.get('type') == 'ai' and bot_response == "N/A":
-                            bot_response = msg.get('content', 'N/A')[:200]  # Limit to 200 chars
-                    
-                    # Stop once we have both
-                    if user_query != "N/A" and bot_response != "N/A":
-                        break
-            
-            writer.writerow([timestamp, reason, user_query, bot_response])
-            print(f"*** ESCALATION ALERT ***\nReason: {reason}\nTimestamp: {timestamp}\nSee {Config.ESCALATION_FILE} for details.\n************************")
+        # Extract last user query and bot response from chat history
+        user_query = "N/A"
+        bot_response = "N/A"
+        
+        if chat_history and isinstance(chat_history, list):
+            # Find the last human message and AI message
+            for msg in reversed(chat_history):
+                if isinstance(msg, dict):
+                    if msg.get('type') == 'human' and user_query == "N/A":
+                        user_query = msg.get('content', 'N/A')[:200]  # Limit to 200 chars
+                    elif msg.get('type') == 'ai' and bot_response == "N/A":
+                        bot_response = msg.get('content', 'N/A')[:200]  # Limit to 200 chars
+                
+                # Stop once we have both
+                if user_query != "N/A" and bot_response != "N/A":
+                    break
+        
+        log_writer.submit("escalations", {"Timestamp": timestamp, "Reason": reason, "User_Query": user_query, "Bot_Response": bot_response})
+        print(f"*** ESCALATION ALERT ***\nReason: {reason}\nTimestamp: {timestamp}\nSee {Config.LOG_DB_FILE} (escalations) for details.\n************************")
     except Exception as e:
         print(f"Escalation logging error: {e}")
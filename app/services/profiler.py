@@ -0,0 +1,233 @@
+"""
+Sampled on-demand profiler for live /ask requests.
+
+An admin switches it on from the analytics page and picks a sample rate (1 in
+N requests). The switch lives in the log store's meta table, so every worker
+follows it within PROFILE_SETTINGS_TTL seconds, without a restart. For a
+sampled request a per-process sampler thread reads the request thread's stack
+from sys._current_frames() every PROFILE_INTERVAL_MS and counts identical
+stacks; the request itself runs unmodified, so the overhead is the sampler's
+wake-ups, not per-call hooks.
+
+Each profile is stored with its request ID, intent and duration as folded
+stacks ("frame;frame;frame count" lines), which flamegraph.pl, speedscope and
+similar tools read directly; to_flamegraph_svg() renders the same data as a
+self-contained SVG flame graph. Only the newest PROFILE_KEEP profiles are kept.
+"""
+import os
+import sys
+import json
+import time
+import random
+import datetime
+import functools
+import threading
+import zlib
+from html import escape
+from app.config import Config
+import app.services.log_store as log_store
+import app.services.tracing as tracing
+
+_lock = threading.Lock()
+_active = {}            # thread id -> {"stacks": {folded: count}, "samples": n}
+_wakeup = threading.Event()
+_sampler_pid = None
+_settings = None
+_settings_read = 0.0
+
+
+# --- Switch (shared by all workers through the log store) ---
+
+def settings():
+    """{"enabled": bool, "sample_every": N}, re-read from the log store at most every PROFILE_SETTINGS_TTL seconds."""
+    global _settings, _settings_read
+    now = time.monotonic()
+    if _settings is None or now - _settings_read > Config.PROFILE_SETTINGS_TTL:
+        current = {"enabled": Config.PROFILE_SAMPLE_EVERY > 0, "sample_every": max(Config.PROFILE_SAMPLE_EVERY, 1)}
+        try:
+            row = log_store.connection().execute("SELECT value FROM meta WHERE key = 'profiler'").fetchone()
+            if row:
+                current.update(json.loads(row["value"]))
+        except Exception as e:
+            print(f"Profiler settings error: {e}")
+        _settings, _settings_read = current, now
+    return _settings
+
+
+def configure(enabled, sample_every):
+    """Turns sampling on/off for every worker. Raises ValueError for a bad sample rate."""
+    global _settings
+    sample_every = int(sample_every)
+    if sample_every < 1:
+        raise ValueError("sample_every must be at least 1")
+    value = {"enabled": bool(enabled), "sample_every": sample_every}
+    with log_store.transaction() as tx:
+        tx.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('profiler', ?)", (json.dumps(value),))
+    _settings = None
+    return settings()
+
+
+# --- Sampling ---
+
+def _frame_name(code):
+    path = code.co_filename.replace("\\", "/").split("/")
+    # Last two path components tell app/services/x.py apart from site-packages/x.py
+    name = f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+    return name.replace(";", ",")
+
+
+def _folded(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample_loop():
+    interval = Config.PROFILE_INTERVAL_MS / 1000
+    while True:
+        if not _active:
+            _wakeup.wait()
+            _wakeup.clear()
+            continue
+        frames = sys._current_frames()
+        with _lock:
+            for thread_id, profile in _active.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = _folded(frame)
+                    profile["stacks"][stack] = profile["stacks"].get(stack, 0) + 1
+                    profile["samples"] += 1
+        del frames
+        time.sleep(interval)
+
+
+def _ensure_sampler():
+    global _sampler_pid
+    # Threads do not survive fork, so each worker starts its own sampler
+    if _sampler_pid != os.getpid():
+        with _lock:
+            if _sampler_pid != os.getpid():
+                threading.Thread(target=_sample_loop, name="request-profiler", daemon=True).start()
+                _sampler_pid = os.getpid()
+
+
+def _should_sample():
+    current = settings()
+    return current["enabled"] and random.random() < 1 / current["sample_every"]
+
+
+def profiled(view):
+    """
+    View decorator: profiles a sample of requests. Place it under
+    tracing.traced_request so the profile picks up the request ID and intent.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _should_sample():
+            return view(*args, **kwargs)
+        _ensure_sampler()
+        thread_id = threading.get_ident()
+        profile = {"stacks": {}, "samples": 0}
+        with _lock:
+            _active[thread_id] = profile
+        _wakeup.set()
+        started = time.perf_counter()
+        try:
+            return view(*args, **kwargs)
+        finally:
+            duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            with _lock:
+                del _active[thread_id]
+            root = tracing.current_span()
+            attributes = root.trace.root.attributes if root else {}
+            _save(profile, duration_ms, attributes.get("request.id"), attributes.get("intent"))
+    return wrapper
+
+
+# --- Storage ---
+
+def _save(profile, duration_ms, request_id, intent):
+    if not profile["samples"]:
+        return  # finished before the first sample
+    folded = "\n".join(f"{stack} {n}" for stack, n in sorted(profile["stacks"].items()))
+    try:
+        with log_store.transaction() as tx:
+            tx.execute(
+                "INSERT INTO profiles(timestamp, request_id, intent, duration_ms, samples, interval_ms, folded) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"), request_id, intent, duration_ms,
+                 profile["samples"], Config.PROFILE_INTERVAL_MS, folded))
+            tx.execute("DELETE FROM profiles WHERE id <= (SELECT id FROM profiles ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                       (Config.PROFILE_KEEP,))
+    except Exception as e:
+        print(f"Profile save error: {e}")
+
+
+def recent_profiles(limit=50):
+    """Newest profiles first, without their stacks."""
+    rows = log_store.connection().execute(
+        "SELECT id, timestamp, request_id, intent, duration_ms, samples, interval_ms FROM profiles "
+        "ORDER BY id DESC LIMIT ?", (limit,))
+    return [dict(row) for row in rows]
+
+
+def get_profile(profile_id):
+    row = log_store.connection().execute("SELECT * FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+    return dict(row) if row else None
+
+
+# --- Flame graph ---
+
+FRAME_HEIGHT = 16
+SVG_WIDTH = 1200
+
+
+def _tree(folded):
+    root = {"name": "all", "count": 0, "children": {}}
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        count = int(count)
+        root["count"] += count
+        node = root
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"name": name, "count": 0, "children": {}})
+            node["count"] += count
+    return root
+
+
+def _depth(node):
+    return 1 + max((_depth(child) for child in node["children"].values()), default=0)
+
+
+def to_flamegraph_svg(folded, title="Flame graph"):
+    """Self-contained SVG flame graph (root at the bottom, width = share of samples, hover for details)."""
+    root = _tree(folded)
+    total = max(root["count"], 1)
+    height = (_depth(root) + 2) * FRAME_HEIGHT
+    rects = []
+
+    def draw(node, x, depth):
+        width = node["count"] / total * SVG_WIDTH
+        if width < 0.5:
+            return
+        y = height - (depth + 1) * FRAME_HEIGHT
+        hue = zlib.crc32(node["name"].encode()) % 40
+        label = escape(node["name"])
+        text = escape(node["name"][:int(width / 7)]) if width > 21 else ""
+        rects.append(
+            f'<g><title>{label} ({node["count"]} samples, {node["count"] / total * 100:.1f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{width:.1f}" height="{FRAME_HEIGHT - 1}" fill="hsl({hue + 10},85%,60%)" rx="2"/>'
+            f'<text x="{x + 3:.1f}" y="{y + FRAME_HEIGHT - 4}">{text}</text></g>')
+        for child in sorted(node["children"].values(), key=lambda c: c["name"]):
+            draw(child, x, depth + 1)
+            x += child["count"] / total * SVG_WIDTH
+
+    draw(root, 0.0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" height="{height}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="{SVG_WIDTH / 2}" y="{FRAME_HEIGHT - 3}" text-anchor="middle" font-size="13">{escape(title)}</text>'
+            + "".join(rects) + "</svg>")
@@ -0,0 +1,241 @@
+"""
+Semantic clusters of unanswered questions ("knowledge gaps") for the dashboard.
+
+Questions are embedded once and the vectors cached in the log store, shared by
+every worker. A new unanswered question is embedded off the request path and
+assigned to the nearest centroid (the centroid moves by a running mean), or
+starts a new cluster when nothing is close enough. A background thread
+re-clusters the recent unanswered questions every QUESTION_CLUSTER_INTERVAL
+seconds, which also merges in questions logged by other workers; thanks to the
+cache that pass only embeds questions it has never seen.
+
+Embeddings come from the RAG chain's embedding model. When that is not
+initialized (no docs / no API access) hashed token vectors are used instead,
+so clustering still groups questions that share wording.
+"""
+import os
+import re
+import time
+import zlib
+import datetime
+import itertools
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from app.config import Config
+import app.services.log_store as log_store
+import app.services.log_archive as log_archive
+
+HASH_DIMENSIONS = 512
+HASH_MODEL = f"hashed-tokens-{HASH_DIMENSIONS}"
+# Hashed bag-of-words vectors are much sparser than model embeddings, so they need a lower bar
+HASH_THRESHOLD = 0.5
+EMBED_BATCH = 100
+EXAMPLES = 3
+STOP_WORDS = {'what', 'is', 'the', 'how', 'to', 'a', 'an', 'of', 'in', 'for', 'does', 'can', 'i', 'give', 'me',
+              'show', 'do', 'we', 'are', 'and', 'or', 'on', 'with', 'about', 'please', 'tell', 'my', 'it'}
+
+_lock = threading.Lock()
+_clusters = []          # [{"centroid", "count", "questions": {text: count}, "last_seen"}]
+_model = None
+_last_recluster = None
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-clusters")
+_started = False
+
+
+def _reset_after_fork():
+    # Threads do not survive a fork: a forked worker needs its own executor and re-clusterer
+    global _executor, _started
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-clusters")
+    _started = False
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def normalize(question):
+    return re.sub(r"\s+", " ", (question or "").strip().lower())
+
+
+def _embedding_model():
+    """(model name, embed_documents callable)."""
+    try:
+        import app.services.rag_service as rag_service
+        embeddings = rag_service.embeddings
+    except ImportError:
+        embeddings = None
+    if embeddings is not None:
+        return getattr(embeddings, "model", "rag-embeddings"), embeddings.embed_documents
+    return HASH_MODEL, _hash_embed
+
+
+def _hash_embed(texts):
+    vectors = []
+    for text in texts:
+        vector = np.zeros(HASH_DIMENSIONS, dtype=np.float32)
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            if token not in STOP_WORDS and len(token) > 1:
+                vector[zlib.crc32(token.encode()) % HASH_DIMENSIONS] += 1.0
+        vectors.append(vector)
+    return vectors
+
+
+def _threshold(model):
+    return HASH_THRESHOLD if model == HASH_MODEL else Config.QUESTION_CLUSTER_THRESHOLD
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed(questions):
+    """{normalized question: unit vector}, embedding only questions missing from the cache."""
+    model, embed_documents = _embedding_model()
+    questions = sorted(set(questions))
+    conn = log_store.connection()
+    vectors = {}
+    for i in range(0, len(questions), 500):
+        chunk = questions[i:i + 500]
+        rows = conn.execute(
+            f"SELECT question, vector FROM question_embeddings WHERE model = ? AND question IN ({','.join('?' * len(chunk))})",
+            [model] + chunk)
+        vectors.update((q, np.frombuffer(blob, dtype=np.float32)) for q, blob in rows)
+
+    missing = [q for q in questions if q not in vectors]
+    for i in range(0, len(missing), EMBED_BATCH):
+        batch = missing[i:i + EMBED_BATCH]
+        fresh = [_unit(v) for v in embed_documents(batch)]
+        with log_store.transaction() as tx:
+            tx.executemany("INSERT OR REPLACE INTO question_embeddings(model, question, vector) VALUES (?, ?, ?)",
+                           [(model, q, v.tobytes()) for q, v in zip(batch, fresh)])
+        vectors.update(zip(batch, fresh))
+    return model, vectors
+
+
+def _new_cluster(vector, question, count, timestamp):
+    return {"centroid": vector.copy(), "count": count, "questions": {question: count}, "last_seen": timestamp}
+
+
+def _assign(clusters, vector, question, count, timestamp, threshold):
+    """Adds a question to its nearest cluster (running-mean centroid) or opens a new one."""
+    if clusters:
+        centroids = np.stack([c["centroid"] for c in clusters])
+        sims = centroids @ vector / np.maximum(np.linalg.norm(centroids, axis=1), 1e-9)
+        best = int(np.argmax(sims))
+        if sims[best] >= threshold:
+            cluster = clusters[best]
+            cluster["centroid"] += (vector - cluster["centroid"]) * (count / (cluster["count"] + count))
+            cluster["count"] += count
+            cluster["questions"][question] = cluster["questions"].get(question, 0) + count
+            cluster["last_seen"] = max(cluster["last_seen"], timestamp)
+            return
+    clusters.append(_new_cluster(vector, question, count, timestamp))
+
+
+def build_clusters(questions, vectors, threshold):
+    """
+    questions: {normalized question: (count, last timestamp)}.
+    Leader clustering in descending frequency, then one reassignment pass against the
+    settled centroids so early, drifting assignments are corrected.
+    """
+    # Questions made only of stop words have no direction to cluster on
+    order = sorted((q for q in questions if np.any(vectors[q])), key=lambda q: -questions[q][0])
+    clusters = []
+    for q in order:
+        _assign(clusters, vectors[q], q, questions[q][0], questions[q][1], threshold)
+    if not clusters:
+        return []
+
+    centroids = np.stack([_unit(c["centroid"]) for c in clusters])
+    settled = [_new_cluster(centroids[i], next(iter(c["questions"])), 0, "") for i, c in enumerate(clusters)]
+    for cluster in settled:
+        cluster["questions"] = {}
+    for q in order:
+        count, timestamp = questions[q]
+        best = int(np.argmax(centroids @ vectors[q]))
+        cluster = settled[best]
+        cluster["count"] += count
+        cluster["questions"][q] = count
+        cluster["last_seen"] = max(cluster["last_seen"], timestamp)
+    settled = [c for c in settled if c["count"]]
+    for cluster in settled:
+        members = np.stack([vectors[q] * n for q, n in cluster["questions"].items()])
+        cluster["centroid"] = members.sum(axis=0) / cluster["count"]
+    return settled
+
+
+def recluster():
+    """Rebuilds the clusters from the most recent QUESTION_CLUSTER_WINDOW unanswered questions."""
+    global _clusters, _model, _last_recluster
+    questions = {}
+    rows = log_archive.iter_rows("interactions", status="Unanswered")
+    for row in itertools.islice(rows, Config.QUESTION_CLUSTER_WINDOW):
+        q = normalize(row["Question"])
+        if q:
+            # Newest first, so the first occurrence is the most recent one
+            count, last = questions.get(q, (0, row["Timestamp"]))
+            questions[q] = (count + 1, last)
+    model, vectors = embed(list(questions))
+    clusters = build_clusters(questions, vectors, _threshold(model))
+    with _lock:
+        _clusters = clusters
+        _model = model
+        _last_recluster = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return len(clusters)
+
+
+def _add(question, timestamp):
+    q = normalize(question)
+    if not q:
+        return
+    model, vectors = embed([q])
+    with _lock:
+        if _model not in (None, model):
+            return  # embedding backend changed; the next re-cluster picks the question up
+        _assign(_clusters, vectors[q], q, 1, timestamp, _threshold(model))
+
+
+def add_question(question, timestamp):
+    """Queues a new unanswered question for embedding and assignment (never blocks the caller)."""
+    _executor.submit(_safe, _add, question, timestamp)
+
+
+def _safe(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        print(f"Question clustering error: {e}")
+
+
+def top_gaps(limit=10):
+    """Largest clusters: a representative question, size, example questions and last occurrence."""
+    with _lock:
+        clusters = sorted(_clusters, key=lambda c: -c["count"])[:limit]
+        gaps = []
+        for c in clusters:
+            examples = sorted(c["questions"].items(), key=lambda kv: -kv[1])
+            gaps.append({
+                "label": examples[0][0],
+                "count": c["count"],
+                "distinct_questions": len(c["questions"]),
+                "examples": [q for q, _ in examples[:EXAMPLES]],
+                "last_seen": c["last_seen"],
+            })
+    return {"gaps": gaps, "model": _model, "clustered_at": _last_recluster}
+
+
+def start_reclusterer():
+    """Initial clustering plus a periodic re-cluster, in the background."""
+    global _started
+    if _started:
+        return
+    _started = True
+
+    def loop():
+        while True:
+            _safe(recluster)
+            time.sleep(Config.QUESTION_CLUSTER_INTERVAL)
+
+    threading.Thread(target=loop, name="question-reclusterer", daemon=True).start()
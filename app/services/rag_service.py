@@ -1,119 +1,199 @@
 import os
+import glob
+import threading
 from flask import jsonify
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
-from langchain_community.document_loaders import PyPDFDirectoryLoader, CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain.chains import create_retrieval_chain, create_history_aware_retriever
-from langchain.chains.combine_documents import create_stuff_documents_chain
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from app.config import Config
 from app.services.data_service import get_recent_changes_by_keyword
+import app.services.tracing as tracing
 
 # Global State
 rag_chain = None
 llm = None
 retriever = None
 template_retriever = None
+embeddings = None
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 150
+
+_indexes = None            # {"kb", "templates"}: vector_index.VectorIndex
+_init_lock = threading.Lock()
+_init_state = "pending"     # pending | done
 
 def initialize_rag_chain():
-    global rag_chain, llm, retriever, template_retriever
+    global _indexes
     try:
         print("Initializing RAG Chain...")
+        # LangChain and the Gemini client take seconds to import, so they are
+        # only loaded here (and by the helpers below, which need an initialized llm)
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        from langchain_community.document_loaders import PyPDFDirectoryLoader, CSVLoader
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        import app.services.vector_index as vector_index
         
-        # --- 1. Load PDFs for Knowledge Base ---
-        loader = PyPDFDirectoryLoader("docs")
-        documents = loader.load()
-        if not documents:
+        # --- 1. PDFs for the Knowledge Base ---
+        pdf_paths = sorted(glob.glob(os.path.join("docs", "**", "[!.]*.pdf"), recursive=True))
+        if not pdf_paths:
             print("Warning: No PDF documents found in 'docs/' folder.")
             return
 
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=150)
-        docs = text_splitter.split_documents(documents)
-        print(f"Processed {len(docs)} document chunks.")
+        # The loaders only run when the shared index has to be rebuilt
+        def load_knowledge_base():
+            documents = PyPDFDirectoryLoader("docs").load()
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+            docs = text_splitter.split_documents(documents)
+            print(f"Processed {len(docs)} document chunks.")
+            return docs
 
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-        vectorstore = Chroma.from_documents(documents=docs, embedding=embeddings, collection_name="kb_collection")
-        retriever = vectorstore.as_retriever()
+        collections = {"kb": load_knowledge_base}
+        sources = list(pdf_paths)
         
-        # --- 2. Load CSV for Templates ---
+        # --- 2. CSV for Templates (a separate collection) ---
         csv_path = os.path.join("docs", "change_templates.csv")
         if os.path.exists(csv_path):
-            print("Loading Template CSV...")
-            csv_loader = CSVLoader(file_path=csv_path, encoding="utf-8-sig")
-            template_docs = csv_loader.load()
-            
-            # Create a separate vector store for templates
-            template_vectorstore = Chroma.from_documents(
-                documents=template_docs, 
-                embedding=embeddings,
-                collection_name="template_collection"
-            )
-            # Increase k to retrieve more potential matches (user requested "all relevant")
-            template_retriever = template_vectorstore.as_retriever(search_kwargs={"k": 15})
-            print(f"Processed {len(template_docs)} template rows.")
+            def load_templates():
+                print("Loading Template CSV...")
+                template_docs = CSVLoader(file_path=csv_path, encoding="utf-8-sig").load()
+                print(f"Processed {len(template_docs)} template rows.")
+                return template_docs
+
+            collections["templates"] = load_templates
+            sources.append(csv_path)
         else:
             print("Warning: Template CSV not found.")
-        
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", temperature=0.3)
-
-        contextualize_q_system_prompt = (
-            "Given a chat history and the latest user question "
-            "which might reference context in the chat history, "
-            "formulate a standalone question which can be understood "
-            "without the chat history. Do NOT answer the question, "
-            "just reformulate it if needed and otherwise return it as is."
-        )
-        contextualize_q_prompt = ChatPromptTemplate.from_messages([
-            ("system", contextualize_q_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ])
-        
-        history_aware_retriever = create_history_aware_retriever(
-            llm, retriever, contextualize_q_prompt
-        )
 
-        qa_system_prompt = (
-            "You are the 'Change Management Assistant', a professional AI chatbot. "
-            "Your purpose is to answer questions about change management based on the provided context. "
-            "Your knowledge base consists of multiple documents (SOPs, Policies, KB Articles).\n\n"
-            
-            "--- PERSONALITY & TONE ---\n"
-            "{persona}\n"
-            "{emotion_context}\n\n"
-
-            "--- MULTI-LANGUAGE RULES (CRITICAL) ---\n"
-            "1. **Detect Language:** Automatically detect the language of the user's question.\n"
-            "2. **Respond in Kind:** You MUST answer in the EXACT SAME language as the user's question. (e.g., If user asks in Hindi, answer in Hindi).\n"
-            "3. **Context Translation:** The provided context is in English. You must translate the relevant information from the context into the user's language to answer.\n\n"
-
-            "--- BEHAVIORAL RULES ---\n"
-            "1. **Greeting:** Respond naturally to greetings in the user's language.\n"
-            "2. **Identity:** If asked who you are, introduce yourself as 'Change Management Assistant' (translated if needed).\n"
-            "3. **Knowledge-Based Questions:** Answer based ONLY on the provided context below. Do not make up information.\n"
-            "4. **No Context:** If the answer is not in the context, apologize and state you don't have information, BUT translate this refusal message into the user's language.\n"
-            "5. **Formatting:** Use **Bold**, *Bullets*, and **Tables** for readability.\n"
-            "6. **Source Citation:** At the end, mention the source document: *(Source: Document Name)*.\n"
-            "7. **Conflict Handling:** If you find conflicting information, mention both.\n\n"
-
-            "--- PROVIDED CONTEXT ---\n"
-            "<context>\n{context}\n</context>"
-        )
-        
-        qa_prompt = ChatPromptTemplate.from_messages([
-            ("system", qa_system_prompt),
-            MessagesPlaceholder("chat_history"),
-            ("human", "{input}"),
-        ])
-
-        question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
-        rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+        # --- 3. Memory-mapped vector index shared by all workers (embedded once per change in docs/) ---
+        version = vector_index.fingerprint(sources, model=EMBEDDING_MODEL, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        _indexes = vector_index.open_indexes(collections, GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL), version)
+
+        _connect_chain()
         print("RAG Chain Ready!")
 
     except Exception as e:
         print(f"Error during initialization: {e}")
 
+def _connect_chain():
+    """
+    Gemini clients, retrievers over the mapped index and the chain itself. Kept apart from
+    the index so a worker forked from a preloaded master can build its own (reconnect_after_fork).
+    """
+    global rag_chain, llm, retriever, template_retriever, embeddings
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
+    from langchain.chains import create_retrieval_chain, create_history_aware_retriever
+    from langchain.chains.combine_documents import create_stuff_documents_chain
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+    import app.services.vector_index as vector_index
+
+    embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL)
+    retriever = vector_index.MappedRetriever(index=_indexes["kb"], embeddings=embeddings)
+    template_retriever = None
+    if "templates" in _indexes:
+        # Increase k to retrieve more potential matches (user requested "all relevant")
+        template_retriever = vector_index.MappedRetriever(index=_indexes["templates"], embeddings=embeddings, k=15)
+
+    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", temperature=0.3)
+
+    contextualize_q_system_prompt = (
+        "Given a chat history and the latest user question "
+        "which might reference context in the chat history, "
+        "formulate a standalone question which can be understood "
+        "without the chat history. Do NOT answer the question, "
+        "just reformulate it if needed and otherwise return it as is."
+    )
+    contextualize_q_prompt = ChatPromptTemplate.from_messages([
+        ("system", contextualize_q_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+    
+    history_aware_retriever = create_history_aware_retriever(
+        llm, retriever, contextualize_q_prompt
+    )
+
+    qa_system_prompt = (
+        "You are the 'Change Management Assistant', a professional AI chatbot. "
+        "Your purpose is to answer questions about change management based on the provided context. "
+        "Your knowledge base consists of multiple documents (SOPs, Policies, KB Articles).\n\n"
+        
+        "--- PERSONALITY & TONE ---\n"
+        "{persona}\n"
+        "{emotion_context}\n\n"
+
+        "--- MULTI-LANGUAGE RULES (CRITICAL) ---\n"
+        "1. **Detect Language:** Automatically detect the language of the user's question.\n"
+        "2. **Respond in Kind:** You MUST answer in the EXACT SAME language as the user's question. (e.g., If user asks in Hindi, answer in Hindi).\n"
+        "3. **Context Translation:** The provided context is in English. You must translate the relevant information from the context into the user's language to answer.\n\n"
+
+        "--- BEHAVIORAL RULES ---\n"
+        "1. **Greeting:** Respond naturally to greetings in the user's language.\n"
+        "2. **Identity:** If asked who you are, introduce yourself as 'Change Management Assistant' (translated if needed).\n"
+        "3. **Knowledge-Based Questions:** Answer based ONLY on the provided context below. Do not make up information.\n"
+        "4. **No Context:** If the answer is not in the context, apologize and state you don't have information, BUT translate this refusal message into the user's language.\n"
+        "5. **Formatting:** Use **Bold**, *Bullets*, and **Tables** for readability.\n"
+        "6. **Source Citation:** At the end, mention the source document: *(Source: Document Name)*.\n"
+        "7. **Conflict Handling:** If you find conflicting information, mention both.\n\n"
+
+        "--- PROVIDED CONTEXT ---\n"
+        "<context>\n{context}\n</context>"
+    )
+    
+    qa_prompt = ChatPromptTemplate.from_messages([
+        ("system", qa_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{input}"),
+    ])
+
+    question_answer_chain = create_stuff_documents_chain(llm, qa_prompt)
+    rag_chain = create_retrieval_chain(history_aware_retriever, question_answer_chain)
+
+def reconnect_after_fork():
+    """
+    For a gunicorn worker forked from a preloaded master: the mapped index and the
+    imported modules are inherited copy-on-write, but the Gemini clients' gRPC
+    channels belong to the master, so the clients and the chain holding them are rebuilt.
+    """
+    if _indexes is None:
+        return
+    try:
+        _connect_chain()
+    except Exception as e:
+        print(f"Error reconnecting RAG clients after fork: {e}")
+
+def _initialize_once():
+    global _init_state
+    with _init_lock:
+        if _init_state == "done":
+            return
+        try:
+            initialize_rag_chain()
+        finally:
+            _init_state = "done"
+
+def start_rag_init(mode=None):
+    """
+    Builds the RAG chain as `mode` (default Config.RAG_INIT_MODE) says: "eager" (now, before
+    the app serves), "background" (in a thread, the app serves at once) or "lazy" (on the first question).
+    """
+    mode = mode or Config.RAG_INIT_MODE
+    if mode == "background":
+        threading.Thread(target=_initialize_once, name="rag-init", daemon=True).start()
+    elif mode != "lazy":
+        _initialize_once()
+
+def ensure_initialized():
+    """
+    True once the RAG chain is ready. In lazy mode the first caller builds it
+    (concurrent callers wait for that build).
+    """
+    if rag_chain is None and Config.RAG_INIT_MODE == "lazy":
+        _initialize_once()
+    return rag_chain is not None
+
+def initializing():
+    """True while the chain has not been built yet (background build still running, or lazy and not yet used)."""
+    return _init_state != "done"
+
 def detect_emotion(query):
     """
     Detects frustration or negative emotion in the user's query.
@@ -128,6 +208,61 @@ def detect_emotion(query):
         return "⚠️ USER SEEMS FRUSTRATED. Be empathetic, patient, and reassuring. Start by acknowledging their difficulty."
     return ""
 
+class _TracingSpans:
+    """Turns the retrieval and generation steps inside a LangChain run into child spans of the current trace."""
+
+    def __init__(self):
+        self.spans = {}
+
+    def _start(self, run_id, name, **attributes):
+        span = tracing.start_span(name, **attributes)
+        if span:
+            self.spans[run_id] = span
+
+    def _end(self, run_id, error=None, **attributes):
+        span = self.spans.pop(run_id, None)
+        if span:
+            for key, value in attributes.items():
+                span.set(key, value)
+            span.end(error)
+
+    def on_retriever_start(self, serialized, query, *, run_id, **kwargs):
+        self._start(run_id, "rag.retrieve", query=query[:200])
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._start(run_id, "llm.generate", model=(serialized or {}).get("kwargs", {}).get("model", ""))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._start(run_id, "llm.generate", model=(serialized or {}).get("kwargs", {}).get("model", ""))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("usage_metadata") or {}
+        self._end(run_id, **{f"llm.{k}": v for k, v in usage.items() if isinstance(v, int)})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error)
+
+
+_tracing_callbacks_class = None
+
+def _trace_config():
+    """LangChain run config that reports retrieval/generation spans (empty outside a trace)."""
+    global _tracing_callbacks_class
+    if not tracing.current_span():
+        return {}
+    if _tracing_callbacks_class is None:
+        # Built on first use so importing this module does not import LangChain
+        from langchain_core.callbacks import BaseCallbackHandler
+        _tracing_callbacks_class = type("_TracingCallbacks", (_TracingSpans, BaseCallbackHandler), {})
+    return {"callbacks": [_tracing_callbacks_class()]}
+
+@tracing.traced("rag.answer_question")
 def answer_question(question, chat_history, user_role="User"):
     """
     Invokes the RAG chain with dynamic personality and emotion context.
@@ -159,12 +294,13 @@ def answer_question(question, chat_history, user_role="User"):
             "chat_history": chat_history,
             "persona": persona,
             "emotion_context": emotion_context
-        })
+        }, config=_trace_config())
         return response
     except Exception as e:
         print(f"RAG Invoke Error: {e}")
         return {"answer": "I encountered an error processing your request."}
 
+@tracing.traced("rag.search_templates")
 def search_templates_with_rag(query):
     """
     Searches for templates using RAG (Semantic Search).
@@ -211,6 +347,7 @@ def search_templates_with_rag(query):
         print(f"Template RAG Search Error: {e}")
         return []
 
+@tracing.traced("llm.analyze_risk")
 def analyze_risk_score(plan_text):
     if not llm or not retriever:
         return jsonify({"answer": "Risk analysis unavailable. System not initialized."})
@@ -243,6 +380,7 @@ def analyze_risk_score(plan_text):
     except Exception as e:
         return jsonify({"answer": f"Error during risk analysis: {str(e)}"})
 
+@tracing.traced("llm.translate")
 def translate_text(text, target_language):
     """
     Translates the given text to the target language using the LLM.
@@ -268,6 +406,7 @@ def translate_text(text, target_language):
         print(f"Translation Error: {e}")
         return text # Fallback to original text on error
 
+@tracing.traced("llm.contextualize_query")
 def contextualize_query(query, chat_history):
     """
     Reformulates the user's query based on chat history to make it standalone.
@@ -290,6 +429,7 @@ def contextualize_query(query, chat_history):
         "Output ONLY the reformulated question. Do NOT answer the question. Do NOT provide a list of templates."
     )
     
+    from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         MessagesPlaceholder("chat_history"),
@@ -304,6 +444,7 @@ def contextualize_query(query, chat_history):
         print(f"Contextualization Error: {e}")
         return query
 
+@tracing.traced("llm.classify_intent")
 def classify_intent(query, chat_history=None):
     """
     Classifies the user's query into a specific intent using the LLM.
@@ -326,7 +467,7 @@ def classify_intent(query, chat_history=None):
         "4. PENDING_TASKS: User asks about their assigned tasks, work, or catalog tasks (e.g., 'Show my pending tasks', 'What tasks are assigned to me?', 'My tasks').\n"
         "5. DRAFT_EMAIL: User wants to draft an email, communication, or notification.\n"
         "6. RISK_ANALYSIS: User asks to analyze the risk of a plan or implementation steps.\n"
-        "7. SCHEDULE_QUERY: User asks about the schedule, calendar, upcoming changes, planned maintenance, OR checks availability for a specific date (e.g., 'Can I schedule on Dec 25?', 'Is December 15 available?', 'Check conflicts for 2025-01-01').\n"
+        "7. SCHEDULE_QUERY: User asks about the schedule, calendar, upcoming changes, planned maintenance, OR checks availability for a specific date, OR asks for the earliest free window (e.g., 'Can I schedule on Dec 25?', 'Is December 15 available?', 'Check conflicts for 2025-01-01', 'Find the earliest 4-hour window after December 20').\n"
         "8. SHOW_STATS: User asks for charts, statistics, metrics, trends, or breakdowns.\n"
         "9. AUDIT_EMERGENCY: User wants to audit or analyze emergency changes for compliance.\n"
         "10. VALIDATE_EMERGENCY: User wants to validate if a change qualifies as emergency.\n"
@@ -338,6 +479,7 @@ def classify_intent(query, chat_history=None):
         "OUTPUT RULE: Return ONLY the category name (e.g., 'TICKET_STATUS'). Do not add any explanation."
     )
     
+    from langchain_core.prompts import ChatPromptTemplate
     prompt = ChatPromptTemplate.from_messages([
         ("system", system_prompt),
         ("human", "{input}"),
@@ -366,6 +508,7 @@ def classify_intent(query, chat_history=None):
         print(f"Intent Classification Error: {e}")
         return "GENERAL_QUERY"
 
+@tracing.traced("llm.recommend_template")
 def recommend_template(query, templates, keywords=None):
     """
     Uses LLM to recommend the best template from a list of options.
@@ -515,6 +658,7 @@ def recommend_template(query, templates, keywords=None):
         print(f"Template Recommendation Error: {e}")
         return {"answer": "I encountered an error analyzing the templates."}
 
+@tracing.traced("llm.extract_template_keywords")
 def extract_template_keywords(query):
     """
     Uses LLM to extract specific search keywords for ServiceNow templates from a natural language query.
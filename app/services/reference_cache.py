@@ -0,0 +1,136 @@
+"""
+TTL cache for ServiceNow reference lookups (name/number -> sys_id).
+
+User, change and group sys_ids almost never change, yet several flows resolve
+them on every request. Lookups go through here so the common path skips the
+extra round-trip. Only hits are cached; a miss is looked up again next time.
+"""
+import threading
+import requests
+from cachetools import TTLCache
+from requests.auth import HTTPBasicAuth
+from app.config import Config
+
+# kind -> (table, key field)
+REFERENCE_TABLES = {
+    "user": ("sys_user", "user_name"),
+    "change": ("change_request", "number"),
+    "group": ("sys_user_group", "name"),
+}
+WARM_UP_BATCH = 100
+
+_lock = threading.Lock()
+_caches = {kind: TTLCache(maxsize=Config.REFERENCE_CACHE_SIZE, ttl=Config.REFERENCE_CACHE_TTL) for kind in REFERENCE_TABLES}
+_stats = {"hits": 0, "misses": 0}
+
+
+def _auth():
+    return HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD)
+
+
+def remember(kind, key, sys_id):
+    """Stores a sys_id learned elsewhere (e.g. from a create response)."""
+    if key and sys_id:
+        with _lock:
+            _caches[kind][key] = sys_id
+
+
+def resolve(kind, key):
+    """Returns the sys_id for `key`, or None if ServiceNow has no such record."""
+    if not key:
+        return None
+    with _lock:
+        sys_id = _caches[kind].get(key)
+        if sys_id:
+            _stats["hits"] += 1
+            return sys_id
+        _stats["misses"] += 1
+
+    table, field = REFERENCE_TABLES[kind]
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/{table}"
+    params = {"sysparm_query": f"{field}={key}", "sysparm_fields": "sys_id", "sysparm_limit": 1}
+    try:
+        response = requests.get(url, auth=_auth(), params=params, headers={"Accept": "application/json"}, timeout=10)
+        if response.status_code != 200:
+            print(f"Reference Lookup Error ({kind} {key}): Status {response.status_code}")
+            return None
+        results = response.json().get('result', [])
+    except Exception as e:
+        print(f"Reference Lookup Error ({kind} {key}): {e}")
+        return None
+
+    if not results:
+        return None
+    remember(kind, key, results[0]['sys_id'])
+    return results[0]['sys_id']
+
+
+def resolve_user(user_name):
+    return resolve("user", user_name)
+
+
+def resolve_change(number):
+    return resolve("change", number)
+
+
+def resolve_group(name):
+    return resolve("group", name)
+
+
+def warm_up(kind, keys=None):
+    """
+    Loads sys_ids in bulk with one IN query per batch of keys. With keys=None,
+    loads every active record of the kind (meant for small tables such as groups).
+    Returns the number of entries cached.
+    """
+    table, field = REFERENCE_TABLES[kind]
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/{table}"
+    if keys is None:
+        queries = ["active=true"]
+    else:
+        keys = [k for k in dict.fromkeys(keys) if k]
+        queries = [f"{field}IN{','.join(keys[i:i + WARM_UP_BATCH])}" for i in range(0, len(keys), WARM_UP_BATCH)]
+
+    loaded = 0
+    for query in queries:
+        params = {
+            "sysparm_query": query,
+            "sysparm_fields": f"sys_id,{field}",
+            "sysparm_limit": Config.REFERENCE_CACHE_SIZE
+        }
+        try:
+            response = requests.get(url, auth=_auth(), params=params, headers={"Accept": "application/json"}, timeout=30)
+            if response.status_code != 200:
+                print(f"Reference Warm-up Error ({kind}): Status {response.status_code}")
+                continue
+            for record in response.json().get('result', []):
+                remember(kind, record.get(field), record.get('sys_id'))
+                loaded += 1
+        except Exception as e:
+            print(f"Reference Warm-up Error ({kind}): {e}")
+    return loaded
+
+
+def warm_up_defaults():
+    """Preloads the lookups every session needs: the integration/approver users and all groups."""
+    if not all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD]):
+        return
+    users = warm_up("user", [Config.SERVICENOW_USER, Config.APPROVALS_USER])
+    groups = warm_up("group")
+    print(f"Reference cache warmed: {users} user(s), {groups} group(s)")
+
+
+def invalidate(kind=None, key=None):
+    """Drops one entry, one kind, or (no arguments) everything."""
+    with _lock:
+        kinds = [kind] if kind else list(_caches)
+        for k in kinds:
+            if key is None:
+                _caches[k].clear()
+            else:
+                _caches[k].pop(key, None)
+
+
+def cache_stats():
+    with _lock:
+        return dict(_stats, **{f"{kind}_entries": len(cache) for kind, cache in _caches.items()})
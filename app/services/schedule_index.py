@@ -0,0 +1,365 @@
+"""
+In-memory interval index of freeze/blackout periods and planned change windows.
+
+Freezes come from change_calendar.csv (re-read only when the file changes) and
+planned changes from ServiceNow (loaded once, then refreshed incrementally by
+sys_updated_on). Overlap checks run against the index instead of a capped live
+query plus a CSV re-parse per call.
+"""
+import os
+import csv
+import bisect
+import datetime
+import threading
+from requests.auth import HTTPBasicAuth
+from app.config import Config
+import app.services.single_flight as single_flight
+
+PAGE_SIZE = 1000
+# change_request.state values that still hold a planned window (New .. Review)
+ACTIVE_STATES = {"-5", "-4", "-3", "-2", "-1", "0"}
+DATE_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+# ServiceNow risk values, riskiest first (unknown values rank after Low)
+RISK_RANK = {"Very High": 0, "High": 1, "Moderate": 2, "Medium": 2, "Low": 3}
+
+
+class IntervalIndex:
+    """
+    Static interval index: intervals sorted by start plus a max-end segment tree
+    over that order. A query binary-searches the candidates that start before the
+    window ends and descends only into subtrees whose max end reaches the window,
+    so it costs O(log n + k) for k overlaps (k log n in the worst case).
+    Rebuild (O(n log n)) whenever the underlying intervals change.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals, key=lambda i: (i["start"], i["end"]))
+        self._starts = [i["start"] for i in self.intervals]
+        self._size = 1
+        while self._size < max(len(self.intervals), 1):
+            self._size *= 2
+        self._max_end = [datetime.datetime.min] * (2 * self._size)
+        for pos, interval in enumerate(self.intervals):
+            self._max_end[self._size + pos] = interval["end"]
+        for node in range(self._size - 1, 0, -1):
+            self._max_end[node] = max(self._max_end[2 * node], self._max_end[2 * node + 1])
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end, predicate=None):
+        """Intervals with start <= `end` and end >= `start` (inclusive bounds), in start order."""
+        limit = bisect.bisect_right(self._starts, end)
+        found = []
+        if limit:
+            self._collect(1, 0, self._size, limit, start, found)
+        if predicate:
+            found = [i for i in found if predicate(i)]
+        return found
+
+    def _collect(self, node, lo, hi, limit, start, found):
+        if lo >= limit or self._max_end[node] < start:
+            return
+        if hi - lo == 1:
+            found.append(self.intervals[lo])
+            return
+        mid = (lo + hi) // 2
+        self._collect(2 * node, lo, mid, limit, start, found)
+        self._collect(2 * node + 1, mid, hi, limit, start, found)
+
+    def overlapping_many(self, windows, predicate=None):
+        """Overlaps for each (start, end) window, in the order given."""
+        return [self.overlapping(start, end, predicate) for start, end in windows]
+
+
+_lock = threading.Lock()
+_freezes = []           # intervals from the calendar CSV
+_freeze_mtime = None
+_changes = {}           # number -> interval for planned changes from ServiceNow
+_index = IntervalIndex()
+_by_ci = {}             # cmdb_ci sys_id -> IntervalIndex of planned changes on that CI
+_by_group = {}          # assignment_group sys_id -> IntervalIndex of that group's planned changes
+_last_refresh = None
+_refreshing = False
+
+
+def parse_datetime(value):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.strip(), fmt)
+        except (ValueError, AttributeError):
+            continue
+    return None
+
+
+def day_window(day):
+    """Inclusive window covering one calendar day."""
+    start = datetime.datetime.combine(day if isinstance(day, datetime.date) else day.date(), datetime.time.min)
+    return start, start + datetime.timedelta(days=1) - datetime.timedelta(seconds=1)
+
+
+def _load_freezes():
+    """Re-reads the calendar CSV when its modification time changes. Returns True if reloaded."""
+    global _freezes, _freeze_mtime
+    if not os.path.exists(Config.CALENDAR_FILE):
+        changed = bool(_freezes)
+        _freezes, _freeze_mtime = [], None
+        return changed
+    mtime = os.path.getmtime(Config.CALENDAR_FILE)
+    if mtime == _freeze_mtime:
+        return False
+
+    freezes = []
+    with open(Config.CALENDAR_FILE, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            start = parse_datetime(row.get('start_date', ''))
+            end = parse_datetime(row.get('end_date', ''))
+            if not start or not end:
+                print(f"CSV parsing error: bad dates in {row.get('event_name')}")
+                continue
+            # Periods spanning New Year are sometimes entered with the old year on the end date
+            while end < start:
+                end = end.replace(year=end.year + 1)
+            freezes.append({
+                "kind": "calendar",
+                "event": row.get('event_name', 'Calendar Event'),
+                "type": row.get('event_type', 'freeze'),
+                "start": start,
+                "end": day_window(end)[1],
+                "description": row.get('description', ''),
+            })
+    _freezes, _freeze_mtime = freezes, mtime
+    return True
+
+
+def _field(record, name, key="display_value"):
+    value = record.get(name, "")
+    if isinstance(value, dict):
+        return value.get(key) or ""
+    return value or ""
+
+
+def change_interval(record):
+    # Display values, so windows compare in the same local time users type and see
+    start = parse_datetime(_field(record, "start_date"))
+    end = parse_datetime(_field(record, "end_date")) or start
+    if not start:
+        return None
+    desc = _field(record, "short_description")
+    risk = _field(record, "risk")
+    return {
+        "kind": "change",
+        "event": desc or "Scheduled Change",
+        "number": _field(record, "number"),
+        "start": start,
+        "end": max(start, end),
+        "state": _field(record, "state"),
+        "risk": risk,
+        "ci": _field(record, "cmdb_ci", "value"),
+        "ci_name": _field(record, "cmdb_ci"),
+        "group": _field(record, "assignment_group", "value"),
+        "group_name": _field(record, "assignment_group"),
+        # Freeze/blackout changes and High or Very High risk work block a window
+        "blocking": "freeze" in desc.lower() or "blackout" in desc.lower() or RISK_RANK.get(risk, 4) <= RISK_RANK["High"],
+    }
+
+
+def _fetch_changes(since):
+    INSTANCE = Config.SERVICENOW_INSTANCE
+    horizon_start = datetime.date.today() - datetime.timedelta(days=30)
+    horizon_end = datetime.date.today() + datetime.timedelta(days=Config.SCHEDULE_INDEX_HORIZON_DAYS)
+    query = (f"end_date>=javascript:gs.dateGenerate('{horizon_start:%Y-%m-%d}','00:00:00')"
+             f"^start_date<=javascript:gs.dateGenerate('{horizon_end:%Y-%m-%d}','23:59:59')")
+    if since:
+        # Relative to the instance's clock, so neither side's time zone matters.
+        # Overlap by a few minutes; re-reading an unchanged change is harmless
+        minutes = int((datetime.datetime.now() - since).total_seconds() // 60) + 5
+        query += f"^sys_updated_on>=javascript:gs.minutesAgoStart({minutes})"
+    else:
+        query += f"^stateIN{','.join(sorted(ACTIVE_STATES))}"
+    query += "^ORDERBYsys_id"
+
+    url = f"{INSTANCE}/api/now/table/change_request"
+    records = []
+    offset = 0
+    while True:
+        params = {
+            "sysparm_query": query,
+            "sysparm_fields": "number,short_description,start_date,end_date,state,risk,cmdb_ci,assignment_group",
+            "sysparm_display_value": "all",
+            "sysparm_exclude_reference_link": "true",
+            "sysparm_limit": PAGE_SIZE,
+            "sysparm_offset": offset
+        }
+        response = single_flight.get(url, auth=HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD),
+                                     params=params, headers={"Accept": "application/json"}, timeout=30)
+        if response.status_code != 200:
+            raise Exception(f"Status {response.status_code}")
+        page = response.json().get('result', [])
+        records.extend(page)
+        if len(page) < PAGE_SIZE:
+            return records
+        offset += PAGE_SIZE
+
+
+def _keyed_indexes(field):
+    buckets = {}
+    for interval in _changes.values():
+        if interval.get(field):
+            buckets.setdefault(interval[field], []).append(interval)
+    return {key: IntervalIndex(intervals) for key, intervals in buckets.items()}
+
+
+def refresh_index(force=False):
+    """
+    Reloads the calendar CSV if it changed and pulls changes updated since the
+    previous refresh, then rebuilds the interval index. `force` skips the
+    refresh-interval check (e.g. when a webhook reports a change).
+    """
+    global _index, _by_ci, _by_group, _last_refresh, _refreshing
+    with _lock:
+        if _refreshing:
+            return
+        now = datetime.datetime.now()
+        if not force and _last_refresh and (now - _last_refresh).total_seconds() < Config.SCHEDULE_INDEX_REFRESH_SECONDS:
+            return
+        since = _last_refresh
+        _refreshing = True
+
+    try:
+        rebuild = _load_freezes()
+        if all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD]):
+            try:
+                records = _fetch_changes(since)
+                if since is None:
+                    _changes.clear()
+                for record in records:
+                    number = _field(record, "number")
+                    interval = change_interval(record) if _field(record, "state", "value") in ACTIVE_STATES else None
+                    if interval:
+                        _changes[number] = interval
+                    else:
+                        _changes.pop(number, None)
+                rebuild = rebuild or bool(records) or since is None
+            except Exception as e:
+                print(f"Schedule Index Refresh Error: {e}")
+
+        if rebuild:
+            index = IntervalIndex(_freezes + list(_changes.values()))
+            by_ci = _keyed_indexes("ci")
+            by_group = _keyed_indexes("group")
+            with _lock:
+                _index, _by_ci, _by_group = index, by_ci, by_group
+        with _lock:
+            _last_refresh = now
+    except Exception as e:
+        print(f"Schedule Index Refresh Error: {e}")
+    finally:
+        with _lock:
+            _refreshing = False
+
+
+def ensure_fresh():
+    """
+    Starts a background refresh when the index was never loaded or is older than
+    the refresh interval. Never blocks: until the first load finishes, the
+    lookups below report that the schedule is still loading (None).
+    """
+    with _lock:
+        empty = _last_refresh is None
+        stale = not empty and (datetime.datetime.now() - _last_refresh).total_seconds() >= Config.SCHEDULE_INDEX_REFRESH_SECONDS
+        busy = _refreshing
+
+    if (empty or stale) and not busy:
+        threading.Thread(target=refresh_index, name="schedule-index-refresh", daemon=True).start()
+
+
+def start_warm_up():
+    """Loads the calendar and planned changes in the background so the first schedule question does not wait for them."""
+    ensure_fresh()
+
+
+def get_index():
+    ensure_fresh()
+    return _index
+
+
+def is_ready():
+    """True once the first refresh has finished, so an empty result really means no conflicts."""
+    return _last_refresh is not None
+
+
+def is_conflict(interval):
+    """Calendar events always conflict; ServiceNow changes only when they block the window."""
+    return interval["kind"] == "calendar" or interval.get("blocking")
+
+
+def find_conflicts(windows):
+    """Conflicting calendar events and changes for each (start, end) window, or None while the index is loading."""
+    index = get_index()
+    if not is_ready():
+        return None
+    return index.overlapping_many(windows, predicate=is_conflict)
+
+
+def _next_hour(moment):
+    """Rounds up to the next full hour (freezes end at 23:59:59, so the next slot starts at midnight)."""
+    rounded = moment.replace(minute=0, second=0, microsecond=0)
+    return rounded if rounded == moment else rounded + datetime.timedelta(hours=1)
+
+
+def find_free_windows(duration, range_start, range_end, count=3):
+    """
+    Earliest `count` non-overlapping windows of length `duration` inside
+    [range_start, range_end] that touch no conflicting interval. Sweeps the
+    conflicting intervals in start order, tracking the end of the busy period
+    so far; every gap long enough yields back-to-back hour-aligned slots.
+    Returns None while the index is loading.
+    """
+    index = get_index()
+    if not is_ready():
+        return None
+    busy = index.overlapping(range_start, range_end, predicate=is_conflict)
+    windows = []
+    cursor = _next_hour(range_start)
+    for interval in busy + [{"start": range_end + datetime.timedelta(seconds=1), "end": range_end}]:
+        gap_end = interval["start"] - datetime.timedelta(seconds=1)
+        while len(windows) < count and cursor + duration - datetime.timedelta(seconds=1) <= gap_end:
+            windows.append((cursor, cursor + duration))
+            cursor += duration
+        if len(windows) >= count:
+            break
+        cursor = max(cursor, _next_hour(interval["end"] + datetime.timedelta(seconds=1)))
+    return windows
+
+
+def is_loaded():
+    """True once planned changes have been loaded from ServiceNow."""
+    return _last_refresh is not None and all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD])
+
+
+def find_change_conflicts(number, start, end, ci=None, group=None, limit=10):
+    """
+    Planned changes overlapping [start, end], excluding `number` itself.
+    Returns (reason, interval) pairs: same-CI overlaps first, then same
+    assignment group, then any other overlap; ties ranked by risk, then start.
+    """
+    get_index()
+    not_self = lambda interval: interval["kind"] == "change" and interval.get("number") != number
+    tiers = [
+        ("same CI", _by_ci.get(ci) if ci else None),
+        ("same group", _by_group.get(group) if group else None),
+        ("overlap", _index),
+    ]
+    seen = set()
+    ranked = []
+    for tier, (reason, index) in enumerate(tiers):
+        if index is None:
+            continue
+        for interval in index.overlapping(start, end, predicate=not_self):
+            if interval["number"] in seen:
+                continue
+            seen.add(interval["number"])
+            ranked.append(((tier, RISK_RANK.get(interval.get("risk"), 4), interval["start"]), reason, interval))
+    ranked.sort(key=lambda item: item[0])
+    return [(reason, interval) for _, reason, interval in ranked[:limit]]
@@ -1,11 +1,17 @@
 import os
-import requests
+import json
+import base64
+import app.services.single_flight as single_flight
+import app.services.tracing as tracing
 import datetime
 from flask import jsonify, Response
 from requests.auth import HTTPBasicAuth
 from app.config import Config
 import urllib.parse
-from app.services.export_service import generate_csv_export
+import html
+from app.services.export_service import stream_csv_export
+
+CURSOR_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 
 def parse_time_period(query):
@@ -199,74 +205,132 @@ def extract_keywords(query):
     return keywords
 
 
-def export_scheduled_changes(query):
-    """
-    Export scheduled changes to CSV based on query.
+def _resolve_period(query, keywords):
     """
-    print(f"DEBUG: Exporting scheduled changes for query: {query}")
-    # Reuse the same logic to get the data
-    INSTANCE = Config.SERVICENOW_INSTANCE
-    USER = Config.SERVICENOW_USER
-    PASSWORD = Config.SERVICENOW_PASSWORD
+    Parse the time period and widen it for keyword searches without an explicit date.
     
+    Returns:
+        tuple: (start_date, end_date, period_name, is_past)
+    """
     start_date, end_date, period_name, is_past = parse_time_period(query)
-    keywords = extract_keywords(query)
     
-    # Smart Date Range: If user searches for keywords but doesn't specify a date, widen the range.
+    # Smart Date Range: If user searches for keywords (e.g., "firewall") but doesn't specify a date,
+    # default to a wide range (Past Year + Future) instead of just "Next 7 Days".
     if period_name == "Upcoming (Next 7 Days)" and keywords:
         now = datetime.datetime.now()
         today = now.date()
         start_date = datetime.datetime.combine(today - datetime.timedelta(days=365), datetime.time(0, 0, 0))
         end_date = datetime.datetime.combine(today + datetime.timedelta(days=90), datetime.time(23, 59, 59))
         period_name = "All Changes (Keyword Search)"
-        is_past = True
-
-    changes = []
+        is_past = True # Enable past search logic
     
-    # Mock data if ServiceNow is not configured
-    if not all([INSTANCE, USER, PASSWORD]):
-        # Get raw mock data (we need to bypass the HTML formatting of _get_mock_scheduled_changes)
-        # So we'll call a helper that returns list instead of HTML
-        changes = _get_raw_mock_data(is_past)
-    else:
-        # Real API call (simplified version of get_scheduled_changes)
-        try:
-            url = f"{INSTANCE}/api/now/table/change_request"
-            start_d, start_t = start_date.strftime("%Y-%m-%d"), start_date.strftime("%H:%M:%S")
-            end_d, end_t = end_date.strftime("%Y-%m-%d"), end_date.strftime("%H:%M:%S")
-            
-            if is_past and ("completed" in query.lower() or "closed" in query.lower()):
-                sysparm_query = f"start_dateBETWEENjavascript:gs.dateGenerate('{start_d}','{start_t}')@javascript:gs.dateGenerate('{end_d}','{end_t}')^stateIN3,4,7"
-            else:
-                sysparm_query = f"start_dateBETWEENjavascript:gs.dateGenerate('{start_d}','{start_t}')@javascript:gs.dateGenerate('{end_d}','{end_t}')"
-            
-            params = {
-                "sysparm_query": sysparm_query,
-                "sysparm_display_value": "true",
-                "sysparm_fields": "number,short_description,state,priority,risk,start_date,end_date,assigned_to",
-                "sysparm_limit": 100
-            }
-            
-            response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params, timeout=10)
-            if response.status_code == 200:
-                changes = response.json().get('result', [])
-        except Exception as e:
-            print(f"Export Error: {e}. Falling back to mock data.")
-            changes = _get_raw_mock_data(is_past)
+    return start_date, end_date, period_name, is_past
 
-    # Filter by keywords
+
+def _build_sysparm_query(query, start_date, end_date, is_past, keywords=None):
+    """Build the encoded ServiceNow query for a period, with a stable order for offset paging."""
+    # Format dates for ServiceNow query
+    start_d, start_t = start_date.strftime("%Y-%m-%d"), start_date.strftime("%H:%M:%S")
+    end_d, end_t = end_date.strftime("%Y-%m-%d"), end_date.strftime("%H:%M:%S")
+    
+    # Build query based on whether we want past or future changes
+    # Only filter by "Closed/Completed" state if explicitly requested
+    if is_past and ("completed" in query.lower() or "closed" in query.lower()):
+        sysparm_query = f"start_dateBETWEENjavascript:gs.dateGenerate('{start_d}','{start_t}')@javascript:gs.dateGenerate('{end_d}','{end_t}')^stateIN3,4,7"
+    else:
+        sysparm_query = f"start_dateBETWEENjavascript:gs.dateGenerate('{start_d}','{start_t}')@javascript:gs.dateGenerate('{end_d}','{end_t}')"
+    
+    # Add keyword search if keywords are present
     if keywords:
-        filtered = []
-        for change in changes:
-            text = (change.get('short_description', '') + " " + change.get('number', '')).lower()
-            if any(k in text for k in keywords):
-                filtered.append(change)
-        changes = filtered
+        # Use LIKE query on short_description and description for more specific results
+        # 123TEXTQUERY321 can be too broad or unreliable depending on instance config
+        keyword_conditions = []
+        for keyword in keywords:
+            # Check both short_description AND description for the keyword
+            keyword_conditions.append(f"short_descriptionLIKE{keyword}^ORdescriptionLIKE{keyword}")
         
-    # Prepare data for CSV
-    export_data = []
+        # Combine all keyword conditions with AND (must match all keywords)
+        # But for a single keyword, it's just one condition
+        search_query = "^".join(keyword_conditions)
+        sysparm_query += f"^{search_query}"
+    
+    # Offsets are only stable with a total order, so break start_date ties by number
+    return sysparm_query + "^ORDERBYstart_date^ORDERBYnumber"
+
+
+def _fetch_changes_page(sysparm_query, offset=0, limit=None):
+    """
+    Fetch one page of change requests.
+    
+    Returns:
+        tuple: (changes, total) where total is the full match count reported by ServiceNow.
+    
+    Raises:
+        Exception: if ServiceNow does not answer with 200.
+    """
+    INSTANCE = Config.SERVICENOW_INSTANCE
+    USER = Config.SERVICENOW_USER
+    PASSWORD = Config.SERVICENOW_PASSWORD
+    limit = limit or Config.SCHEDULE_PAGE_SIZE
+    
+    url = f"{INSTANCE}/api/now/table/change_request"
+    params = {
+        "sysparm_query": sysparm_query,
+        "sysparm_display_value": "true",
+        "sysparm_fields": "number,short_description,state,priority,risk,start_date,end_date,assigned_to",
+        "sysparm_limit": limit,
+        "sysparm_offset": offset
+    }
+    
+    response = single_flight.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params, timeout=10)
+    if response.status_code != 200:
+        raise Exception(f"ServiceNow API Error: Status {response.status_code}")
+    
+    changes = response.json().get('result', [])
+    # X-Total-Count carries the size of the whole result set, not just this page
+    total = int(response.headers.get('X-Total-Count', offset + len(changes)))
+    return changes, total
+
+
+def _next_cursor(offset, page_len, total, start_date, end_date, is_past):
+    """
+    Opaque cursor for the next page, or None when the listing is complete.
+    It carries the resolved period, so later pages use the same window as the
+    first one even when the query is relative ("this week") and the clock moved on.
+    """
+    next_offset = offset + page_len
+    if not page_len or next_offset >= total:
+        return None
+    raw = json.dumps([next_offset, start_date.strftime(CURSOR_DATE_FORMAT), end_date.strftime(CURSOR_DATE_FORMAT), is_past])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _parse_cursor(cursor):
+    """(offset, start_date, end_date, is_past) from a cursor; raises ValueError when it is not one of ours."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset, start, end, is_past = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (max(int(offset), 0), datetime.datetime.strptime(start, CURSOR_DATE_FORMAT),
+                datetime.datetime.strptime(end, CURSOR_DATE_FORMAT), bool(is_past))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+EXPORT_FIELDS = ["Number", "Description", "State", "Priority", "Risk", "Start Date", "End Date", "Assigned To"]
+
+
+def _export_rows(changes, keywords):
+    """Filter a page of changes by keywords and map it to export columns."""
+    rows = []
     for change in changes:
-        export_data.append({
+        if keywords:
+            text = (change.get('short_description', '') + " " + change.get('number', '')).lower()
+            if not any(k in text for k in keywords):
+                continue
+        assigned = change.get('assigned_to', '')
+        if isinstance(assigned, dict):
+            assigned = assigned.get('display_value', '')
+        rows.append({
             "Number": change.get('number', ''),
             "Description": change.get('short_description', ''),
             "State": change.get('state', ''),
@@ -274,16 +338,62 @@ def export_scheduled_changes(query):
             "Risk": change.get('risk', ''),
             "Start Date": change.get('start_date', ''),
             "End Date": change.get('end_date', ''),
-            "Assigned To": change.get('assigned_to', '')
+            "Assigned To": assigned
         })
-        
+    return rows
+
+
+def export_scheduled_changes(query, compress=False):
+    """
+    Export scheduled changes to CSV based on query.
+    The CSV is streamed: each ServiceNow page is written out as soon as it arrives,
+    so memory use stays flat regardless of the number of changes.
+    """
+    print(f"DEBUG: Exporting scheduled changes for query: {query}")
+    # Reuse the same logic to get the data
+    INSTANCE = Config.SERVICENOW_INSTANCE
+    USER = Config.SERVICENOW_USER
+    PASSWORD = Config.SERVICENOW_PASSWORD
+    
+    keywords = extract_keywords(query)
+    start_date, end_date, period_name, is_past = _resolve_period(query, keywords)
     filename = f"changes_{period_name.replace(' ', '_')}.csv"
-    return generate_csv_export(export_data, filename)
+    
+    # Mock data if ServiceNow is not configured
+    if not all([INSTANCE, USER, PASSWORD]):
+        # Get raw mock data (we need to bypass the HTML formatting of _get_mock_scheduled_changes)
+        # So we'll call a helper that returns list instead of HTML
+        return stream_csv_export([_export_rows(_get_raw_mock_data(is_past), keywords)], EXPORT_FIELDS, filename, compress)
+    
+    # Fetch the first page up front so a ServiceNow failure can still fall back to mock data
+    sysparm_query = _build_sysparm_query(query, start_date, end_date, is_past)
+    try:
+        first_page, total = _fetch_changes_page(sysparm_query, 0, Config.EXPORT_PAGE_SIZE)
+    except Exception as e:
+        print(f"Export Error: {e}. Falling back to mock data.")
+        return stream_csv_export([_export_rows(_get_raw_mock_data(is_past), keywords)], EXPORT_FIELDS, filename, compress)
+    
+    def pages():
+        page, offset = first_page, 0
+        while True:
+            yield _export_rows(page, keywords)
+            offset += len(page)
+            if not page or offset >= total:
+                return
+            try:
+                page, _ = _fetch_changes_page(sysparm_query, offset, Config.EXPORT_PAGE_SIZE)
+            except Exception as e:
+                # Headers are already sent; stream_csv_export ends the file with a truncation line
+                raise Exception(f"at offset {offset}: {e}")
+    
+    return stream_csv_export(pages(), EXPORT_FIELDS, filename, compress)
 
 
+@tracing.traced("servicenow.scheduled_changes")
 def get_scheduled_changes(query):
     """
     Fetch scheduled or completed changes from ServiceNow based on time period in query.
+    Only the first page is fetched; the table carries a cursor for loading more.
     Falls back to mock data if ServiceNow is not configured.
     
     Args:
@@ -297,18 +407,8 @@ def get_scheduled_changes(query):
     PASSWORD = Config.SERVICENOW_PASSWORD
     
     # Parse time period
-    start_date, end_date, period_name, is_past = parse_time_period(query)
     keywords = extract_keywords(query)
-    
-    # Smart Date Range: If user searches for keywords (e.g., "firewall") but doesn't specify a date,
-    # default to a wide range (Past Year + Future) instead of just "Next 7 Days".
-    if period_name == "Upcoming (Next 7 Days)" and keywords:
-        now = datetime.datetime.now()
-        today = now.date()
-        start_date = datetime.datetime.combine(today - datetime.timedelta(days=365), datetime.time(0, 0, 0))
-        end_date = datetime.datetime.combine(today + datetime.timedelta(days=90), datetime.time(23, 59, 59))
-        period_name = "All Changes (Keyword Search)"
-        is_past = True # Enable past search logic
+    start_date, end_date, period_name, is_past = _resolve_period(query, keywords)
     
     # Mock data if ServiceNow is not configured
     if not all([INSTANCE, USER, PASSWORD]):
@@ -316,63 +416,63 @@ def get_scheduled_changes(query):
     
     # Real ServiceNow API call
     try:
-        url = f"{INSTANCE}/api/now/table/change_request"
-        
-        # Format dates for ServiceNow query
-        start_d, start_t = start_date.strftime("%Y-%m-%d"), start_date.strftime("%H:%M:%S")
-        end_d, end_t = end_date.strftime("%Y-%m-%d"), end_date.strftime("%H:%M:%S")
-        
-        # Build query based on whether we want past or future changes
-        # Only filter by "Closed/Completed" state if explicitly requested
-        if is_past and ("completed" in query.lower() or "closed" in query.lower()):
-            sysparm_query = f"start_dateBETWEENjavascript:gs.dateGenerate('{start_d}','{start_t}')@javascript:gs.dateGenerate('{end_d}','{end_t}')^stateIN3,4,7"
-        else:
-            sysparm_query = f"start_dateBETWEENjavascript:gs.dateGenerate('{start_d}','{start_t}')@javascript:gs.dateGenerate('{end_d}','{end_t}')"
-        
-        # Add keyword search if keywords are present
-        if keywords:
-            # Use LIKE query on short_description and description for more specific results
-            # 123TEXTQUERY321 can be too broad or unreliable depending on instance config
-            keyword_conditions = []
-            for keyword in keywords:
-                # Check both short_description AND description for the keyword
-                keyword_conditions.append(f"short_descriptionLIKE{keyword}^ORdescriptionLIKE{keyword}")
-            
-            # Combine all keyword conditions with AND (must match all keywords)
-            # But for a single keyword, it's just one condition
-            search_query = "^".join(keyword_conditions)
-            sysparm_query += f"^{search_query}"
-            
-        params = {
-            "sysparm_query": sysparm_query,
-            "sysparm_display_value": "true",
-            "sysparm_fields": "number,short_description,state,priority,risk,start_date,end_date,assigned_to",
-            "sysparm_limit": 50,
-            "sysparm_order_by": "start_date"
-        }
-        
-        response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params, timeout=10)
+        sysparm_query = _build_sysparm_query(query, start_date, end_date, is_past, keywords)
+        changes, total = _fetch_changes_page(sysparm_query, 0)
         
-        if response.status_code == 200:
-            data = response.json()
-            changes = data.get('result', [])
-            
-            if not changes:
-                msg = f"✅ No changes found for **{period_name}**"
-                if keywords:
-                    msg += f" matching keywords: **{', '.join(keywords)}**"
-                return jsonify({"answer": msg + "."})
+        if not changes:
+            msg = f"✅ No changes found for **{period_name}**"
+            if keywords:
+                msg += f" matching keywords: **{', '.join(keywords)}**"
+            return jsonify({"answer": msg + "."})
 
-            return _format_changes_table(changes, period_name, is_past, query, is_mock=False)
-        else:
-            print(f"ServiceNow API Error: Status {response.status_code}")
-            return _get_mock_scheduled_changes(period_name, is_past)
+        return _format_changes_table(changes, period_name, is_past, query, is_mock=False,
+                                     total=total, next_cursor=_next_cursor(0, len(changes), total, start_date, end_date, is_past))
             
     except Exception as e:
         print(f"Error fetching scheduled changes: {e}")
         return _get_mock_scheduled_changes(period_name, is_past)
 
 
+def get_more_scheduled_changes(query, cursor):
+    """
+    Fetch the next page of a scheduled changes listing.
+    
+    Args:
+        query (str): The original natural language query
+        cursor (str): Cursor returned with the previous page
+        
+    Returns:
+        flask.Response: JSON with the table rows HTML, the next cursor and counts
+    """
+    INSTANCE = Config.SERVICENOW_INSTANCE
+    USER = Config.SERVICENOW_USER
+    PASSWORD = Config.SERVICENOW_PASSWORD
+    
+    if not all([INSTANCE, USER, PASSWORD]):
+        return jsonify({"rows_html": "", "next_cursor": None, "shown": 0, "total": 0})
+    
+    try:
+        offset, start_date, end_date, is_past = _parse_cursor(cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # The period comes from the cursor, not from re-reading the query against today's date
+    keywords = extract_keywords(query)
+    
+    try:
+        sysparm_query = _build_sysparm_query(query, start_date, end_date, is_past, keywords)
+        changes, total = _fetch_changes_page(sysparm_query, offset)
+    except Exception as e:
+        print(f"Error fetching more scheduled changes: {e}")
+        return jsonify({"error": "Failed to load more changes."}), 502
+    
+    return jsonify({
+        "rows_html": "".join(_format_change_row(change) for change in changes),
+        "next_cursor": _next_cursor(offset, len(changes), total, start_date, end_date, is_past),
+        "shown": offset + len(changes),
+        "total": total
+    })
+
+
 def _get_raw_mock_data(is_past):
     """Helper to get raw mock data list"""
     now = datetime.datetime.now()
@@ -454,8 +554,48 @@ def _get_mock_scheduled_changes(period_name, is_past, keywords=None):
     return _format_changes_table(mock_changes, period_name, is_past, f"changes {period_name}", is_mock=True)
 
 
-def _format_changes_table(changes, period_name, is_past, query_text, is_mock=False):
-    """Format changes data as HTML table"""
+def _format_change_row(change):
+    """Format a single change as an HTML table row"""
+    number = change.get('number', 'N/A')
+    desc = change.get('short_description', 'No description')
+    state = change.get('state', 'N/A')
+    priority = change.get('priority', 'N/A')
+    start = change.get('start_date', 'N/A')
+    end = change.get('end_date', 'N/A')
+    assigned = change.get('assigned_to', 'Unassigned')
+    
+    # Handle case where assigned_to is a dictionary (ServiceNow reference object)
+    if isinstance(assigned, dict):
+        assigned = assigned.get('display_value', assigned.get('name', 'Unassigned'))
+    
+    # Determine state badge color
+    state_class = "state-scheduled"
+    if "closed" in str(state).lower() or "complete" in str(state).lower():
+        state_class = "state-closed"
+    elif "implement" in str(state).lower():
+        state_class = "state-implement"
+    elif "authorize" in str(state).lower():
+        state_class = "state-authorize"
+    
+    # Determine priority badge
+    priority_num = str(priority).split()[0] if priority != 'N/A' else '4'
+    priority_class = f"priority-{priority_num}"
+    
+    return f'''
+                <tr>
+                    <td><strong>{number}</strong></td>
+                    <td>{desc[:80]}{'...' if len(desc) > 80 else ''}</td>
+                    <td><span class="state-badge {state_class}">{state}</span></td>
+                    <td><span class="priority-badge {priority_class}">{priority}</span></td>
+                    <td>{start}</td>
+                    <td>{end}</td>
+                    <td>{assigned}</td>
+                </tr>
+        '''
+
+
+def _format_changes_table(changes, period_name, is_past, query_text, is_mock=False, total=None, next_cursor=None):
+    """Format changes data as HTML table, with a Load More button when more pages exist"""
     
     if "completed" in query_text.lower() or "closed" in query_text.lower():
         status_text = "Completed"
@@ -471,11 +611,17 @@ def _format_changes_table(changes, period_name, is_past, query_text, is_mock=Fal
     encoded_query = urllib.parse.quote(query_text)
     export_link = f"/export_changes?query={encoded_query}"
     
+    total = total if total is not None else len(changes)
+    if total > len(changes):
+        count_html = f'Showing <strong class="changes-shown">{len(changes)}</strong> of <strong>{total}</strong> change request(s)'
+    else:
+        count_html = f'Found <strong>{len(changes)}</strong> change request(s)'
+    
     table_html = f'''<div class="changes-container">
         <div style="display: flex; justify-content: space-between; align_items: center; margin-bottom: 10px;">
             <h3 style="margin: 0;">📅 {status_text} Changes for {period_name}{mock_note}</h3>
         </div>
-        <p style="color: #666; margin-bottom: 15px;">Found <strong>{len(changes)}</strong> change request(s)</p>
+        <p class="changes-count" style="color: #666; margin-bottom: 15px;">{count_html}</p>
         <div class="table-responsive">
             <table class="changes-table">
                 <thead>
@@ -493,48 +639,18 @@ def _format_changes_table(changes, period_name, is_past, query_text, is_mock=Fal
     '''
     
     for change in changes:
-        number = change.get('number', 'N/A')
-        desc = change.get('short_description', 'No description')
-        state = change.get('state', 'N/A')
-        priority = change.get('priority', 'N/A')
-        start = change.get('start_date', 'N/A')
-        end = change.get('end_date', 'N/A')
-        assigned = change.get('assigned_to', 'Unassigned')
-        
-        # Handle case where assigned_to is a dictionary (ServiceNow reference object)
-        if isinstance(assigned, dict):
-            assigned = assigned.get('display_value', assigned.get('name', 'Unassigned'))
-        
-        # Determine state badge color
-        state_class = "state-scheduled"
-        if "closed" in str(state).lower() or "complete" in str(state).lower():
-            state_class = "state-closed"
-        elif "implement" in str(state).lower():
-            state_class = "state-implement"
-        elif "authorize" in str(state).lower():
-            state_class = "state-authorize"
-        
-        # Determine priority badge
-        priority_num = str(priority).split()[0] if priority != 'N/A' else '4'
-        priority_class = f"priority-{priority_num}"
-        
-        table_html += f'''
-                <tr>
-                    <td><strong>{number}</strong></td>
-                    <td>{desc[:80]}{'...' if len(desc) > 80 else ''}</td>
-                    <td><span class="state-badge {state_class}">{state}</span></td>
-                    <td><span class="priority-badge {priority_class}">{priority}</span></td>
-                    <td>{start}</td>
-                    <td>{end}</td>
-                    <td>{assigned}</td>
-                </tr>
-        '''
+        table_html += _format_change_row(change)
+    
+    load_more_html = ""
+    if next_cursor:
+        load_more_html = f'''<button class="load-more-btn" data-query="{html.escape(query_text, quote=True)}" data-cursor="{next_cursor}" onclick="loadMoreChanges(this)">⬇️ Load more</button>'''
     
     table_html += f'''
                 </tbody>
             </table>
         </div>
-        <div style="margin-top: 15px;">
+        <div style="margin-top: 15px; display: flex; gap: 10px;">
+            {load_more_html}
             <a href="{export_link}" target="_blank" class="export-btn">📊 Export to Excel</a>
         </div>
     </div>
@@ -573,6 +689,8 @@ def _format_changes_table(changes, period_name, is_past, query_text, is_mock=Fal
             transition: background-color 0.2s;
         }
         .export-btn:hover { background-color: #218838; }
+        .load-more-btn { background-color: #031f4a; color: white; border: none; padding: 8px 15px; border-radius: 5px; font-weight: bold; font-size: 0.9rem; cursor: pointer; }
+        .load-more-btn:disabled { opacity: 0.6; cursor: wait; }
     </style>
     '''
     
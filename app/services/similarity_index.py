@@ -0,0 +1,213 @@
+"""
+Local TF-IDF similarity index over closed change requests.
+
+The index is loaded once from ServiceNow in the background at startup and then
+refreshed incrementally (only changes updated since the last refresh are
+fetched), so a lookup is a single in-process operation instead of a chain of
+LIKE queries.
+"""
+import re
+import math
+import heapq
+import datetime
+import threading
+import requests
+from collections import Counter, defaultdict
+from requests.auth import HTTPBasicAuth
+from app.config import Config
+
+STOP_WORDS = {
+    'i', 'need', 'to', 'a', 'an', 'the', 'for', 'of', 'in', 'on', 'at', 'with', 'and', 'or', 'is', 'are',
+    'be', 'by', 'from', 'this', 'that', 'it', 'my', 'we', 'our', 'create', 'change', 'changes', 'request',
+    'ticket', 'please', 'update', 'upgrade', 'fix', 'issue', 'find', 'similar', 'search', 'sample', 'show', 'me'
+}
+PAGE_SIZE = 500
+MIN_SCORE = 0.05
+
+_lock = threading.RLock()
+_documents = {}                # number -> change record
+_term_freqs = {}               # number -> Counter of terms
+_postings = defaultdict(set)   # term -> numbers containing it
+_norms = {}                    # number -> TF-IDF vector norm (recomputed lazily)
+_norms_dirty = True
+_last_refresh = None           # UTC
+_refreshing = False
+
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens without stop words."""
+    return [t for t in re.findall(r"[a-z0-9]+", (text or "").lower()) if t not in STOP_WORDS and len(t) > 1]
+
+
+def _document_terms(change):
+    # The short description is what people search by, so it counts twice
+    short_desc = change.get('short_description', '')
+    return Counter(tokenize(short_desc) * 2 + tokenize(change.get('description', '')))
+
+
+def _idf(term):
+    return math.log((1 + len(_documents)) / (1 + len(_postings.get(term, ())))) + 1
+
+
+def _remove(number):
+    for term in _term_freqs.pop(number, {}):
+        _postings[term].discard(number)
+        if not _postings[term]:
+            del _postings[term]
+    _documents.pop(number, None)
+
+
+def add_changes(changes):
+    """Adds or replaces changes in the index, keyed by change number."""
+    global _norms_dirty
+    with _lock:
+        for change in changes:
+            number = change.get('number')
+            if not number:
+                continue
+            _remove(number)
+            terms = _document_terms(change)
+            if not terms:
+                continue
+            _documents[number] = change
+            _term_freqs[number] = terms
+            for term in terms:
+                _postings[term].add(number)
+        _norms_dirty = True
+
+
+def remove_change(number):
+    """Drops a change from the index (e.g. when it is reopened or deleted)."""
+    global _norms_dirty
+    with _lock:
+        _remove(number)
+        _norms_dirty = True
+
+
+def _ensure_norms():
+    global _norms_dirty
+    if not _norms_dirty:
+        return
+    idf = {term: _idf(term) for term in _postings}
+    _norms.clear()
+    for number, terms in _term_freqs.items():
+        _norms[number] = math.sqrt(sum((tf * idf[term]) ** 2 for term, tf in terms.items()))
+    _norms_dirty = False
+
+
+def search(text, top_k=3):
+    """
+    Returns up to `top_k` (score, change) pairs ranked by cosine similarity of
+    TF-IDF vectors. Scores are between 0 and 1.
+    """
+    query_terms = Counter(tokenize(text))
+    with _lock:
+        _ensure_norms()
+        query_weights = {term: tf * _idf(term) for term, tf in query_terms.items() if term in _postings}
+        if not query_weights:
+            return []
+        query_norm = math.sqrt(sum(w * w for w in query_weights.values()))
+
+        scores = defaultdict(float)
+        for term, q_weight in query_weights.items():
+            idf = _idf(term)
+            for number in _postings[term]:
+                scores[number] += q_weight * _term_freqs[number][term] * idf
+
+        ranked = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        results = []
+        for number, dot in ranked:
+            score = dot / (query_norm * _norms[number]) if _norms.get(number) else 0.0
+            if score >= MIN_SCORE:
+                results.append((round(score, 3), _documents[number]))
+        return results
+
+
+def size():
+    with _lock:
+        return len(_documents)
+
+
+def refresh_index(force=False):
+    """
+    Pulls closed changes updated since the previous refresh from ServiceNow.
+    The first call loads the full history; later calls are incremental.
+    """
+    global _last_refresh, _refreshing
+    INSTANCE = Config.SERVICENOW_INSTANCE
+    USER = Config.SERVICENOW_USER
+    PASSWORD = Config.SERVICENOW_PASSWORD
+
+    if not all([INSTANCE, USER, PASSWORD]):
+        return
+
+    with _lock:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        if _refreshing:
+            return
+        if not force and _last_refresh and (now - _last_refresh).total_seconds() < Config.SIMILARITY_REFRESH_SECONDS:
+            return
+        since = _last_refresh
+        _refreshing = True
+
+    try:
+        url = f"{INSTANCE}/api/now/table/change_request"
+        query = "state=3"
+        if since:
+            # Relative to the instance's clock, so neither side's time zone matters.
+            # Overlap by a few minutes; re-adding an unchanged change is harmless
+            minutes = int((now - since).total_seconds() // 60) + 5
+            query += f"^sys_updated_on>=javascript:gs.minutesAgoStart({minutes})"
+        query += "^ORDERBYsys_updated_on"
+
+        offset = 0
+        fetched = 0
+        while True:
+            params = {
+                "sysparm_query": query,
+                "sysparm_fields": "number,short_description,description,risk,impact,type,close_code,priority,assignment_group",
+                "sysparm_display_value": "true",
+                "sysparm_limit": PAGE_SIZE,
+                "sysparm_offset": offset
+            }
+            response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params,
+                                    headers={"Accept": "application/json"}, timeout=30)
+            if response.status_code != 200:
+                print(f"Similarity Index Refresh Error: Status {response.status_code}")
+                return
+            page = response.json().get('result', [])
+            add_changes(page)
+            fetched += len(page)
+            if len(page) < PAGE_SIZE:
+                break
+            offset += PAGE_SIZE
+
+        with _lock:
+            _last_refresh = now
+        print(f"Similarity index refreshed: {fetched} change(s) fetched, {size()} indexed.")
+    except Exception as e:
+        print(f"Similarity Index Refresh Error: {e}")
+    finally:
+        with _lock:
+            _refreshing = False
+
+
+def ensure_fresh():
+    """
+    Starts a background refresh when the index was never loaded or is older than
+    the refresh interval. Never blocks: until the first load finishes, searches
+    simply find nothing.
+    """
+    with _lock:
+        empty = _last_refresh is None
+        stale = not empty and (datetime.datetime.now(datetime.timezone.utc) - _last_refresh).total_seconds() >= Config.SIMILARITY_REFRESH_SECONDS
+        busy = _refreshing
+
+    if (empty or stale) and not busy:
+        threading.Thread(target=refresh_index, name="similarity-refresh", daemon=True).start()
+
+
+def start_warm_up():
+    """Loads the closed-change history in the background so the first similar-change search does not wait for it."""
+    if all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD]):
+        ensure_fresh()
@@ -0,0 +1,74 @@
+"""
+Request coalescing for ServiceNow GETs.
+
+When several requests issue the same GET at the same time (same URL, query
+parameters and credentials), only the first one goes to ServiceNow; the others
+wait for it and receive the same response, or the same exception. Nothing is
+cached once the call completes.
+"""
+import threading
+import requests
+import app.services.tracing as tracing
+
+_lock = threading.Lock()
+_in_flight = {}     # key -> _Call
+_metrics = {"requests": 0, "executed": 0, "coalesced": 0, "errors": 0, "max_waiters": 0}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.response = None
+        self.error = None
+
+
+def _key(url, params, auth):
+    user = getattr(auth, "username", None)
+    items = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+    return url, items, user
+
+
+def get(url, params=None, auth=None, **kwargs):
+    """Drop-in replacement for requests.get that shares identical concurrent calls."""
+    key = _key(url, params, auth)
+    with _lock:
+        _metrics["requests"] += 1
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _Call()
+            _in_flight[key] = call
+            _metrics["executed"] += 1
+        else:
+            call.waiters += 1
+            _metrics["coalesced"] += 1
+            _metrics["max_waiters"] = max(_metrics["max_waiters"], call.waiters)
+
+    if not leader:
+        with tracing.span("servicenow.coalesced_wait", **{"servicenow.table": url.rstrip("/").rsplit("/", 1)[-1]}):
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.response
+
+    try:
+        call.response = requests.get(url, params=params, auth=auth, **kwargs)
+        # Read the body now so every waiter sees the same content
+        call.response.content
+        return call.response
+    except Exception as e:
+        call.error = e
+        with _lock:
+            _metrics["errors"] += 1
+        raise
+    finally:
+        with _lock:
+            _in_flight.pop(key, None)
+        call.done.set()
+
+
+def metrics():
+    """Counters since startup plus the number of calls currently in flight."""
+    with _lock:
+        return dict(_metrics, in_flight=len(_in_flight))
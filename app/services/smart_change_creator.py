@@ -4,95 +4,56 @@ from app.config import Config
 from datetime import datetime
 import requests
 from requests.auth import HTTPBasicAuth
-def find_similar_changes(description):
+import app.services.similarity_index as similarity_index
+import app.services.reference_cache as reference_cache
+
+# Closed changes used to seed the similarity index when ServiceNow is not configured
+MOCK_CLOSED_CHANGES = [
+    {
+        "number": "CR-1024",
+        "short_description": "Database Migration to AWS",
+        "description": "Full migration of the legacy Oracle database to AWS RDS.",
+        "risk": "High",
+        "impact": "2 - Medium",
+        "type": "Normal",
+        "close_code": "Successful"
+    },
+    {
+        "number": "CHG0030001",
+        "short_description": "Core Switch Upgrade",
+        "description": "Upgrading firmware on the core switch stack.",
+        "risk": "Very High",
+        "impact": "1 - High",
+        "type": "Normal",
+        "close_code": "Successful"
+    }
+]
+
+def find_similar_changes(description, top_k=None):
     """
     Searches for successful closed changes that match the description.
-    Returns the best match as a dictionary or None.
+    Returns up to `top_k` matches ranked by similarity, best first. Each match is the
+    change dictionary with an added 'similarity' score between 0 and 1.
     """
     INSTANCE = Config.SERVICENOW_INSTANCE
     USER = Config.SERVICENOW_USER
     PASSWORD = Config.SERVICENOW_PASSWORD
+    top_k = top_k or Config.SIMILARITY_TOP_K
 
-    # --- MOCK MODE ---
-    if not all([INSTANCE, USER, PASSWORD]):
-        # Mock logic for testing without credentials
-        if "database" in description.lower():
-            return {
-                "number": "CR-1024",
-                "short_description": "Database Migration to AWS",
-                "description": "Full migration of the legacy Oracle database to AWS RDS.",
-                "risk": "High",
-                "impact": "2 - Medium",
-                "type": "Normal",
-                "close_code": "Successful"
-            }
-        elif "switch" in description.lower():
-             return {
-                "number": "CHG0030001",
-                "short_description": "Core Switch Upgrade",
-                "description": "Upgrading firmware on the core switch stack.",
-                "risk": "Very High",
-                "impact": "1 - High",
-                "type": "Normal",
-                "close_code": "Successful"
-            }
-        return None
-
-    # --- REAL SERVICENOW MODE ---
     try:
-        url = f"{INSTANCE}/api/now/table/change_request"
-        
-        # Improve keyword extraction
-        import re
-        # Remove special chars and lowercase
-        clean_desc = re.sub(r'[^a-zA-Z0-9\s]', '', description.lower())
-        words = clean_desc.split()
-        
-        stop_words = {'i', 'need', 'to', 'a', 'an', 'the', 'for', 'of', 'in', 'on', 'at', 'with', 'create', 'change', 'request', 'ticket', 'please', 'update', 'upgrade', 'fix', 'issue'}
-        keywords = [w for w in words if w not in stop_words]
-        
-        # If no keywords left (e.g. "create a change"), fallback to original or empty
-        if not keywords:
-            keywords = words[:3]
-            
-        # Sort keywords by length (descending) to prioritize specific terms like "firewall" over "new"
-        keywords.sort(key=len, reverse=True)
-        
-        # Take top 3 keywords (most specific)
-        search_terms = keywords[:3]
-        
-        if not search_terms:
-            return None
-            
-        # Iterate through keywords until we find a match
-        for term in search_terms:
-            # Search for the current keyword
-            keyword_query = f"short_descriptionLIKE{term}"
-            
-            # Relaxed query: Search for ANY change matching the keyword, prioritizing recent ones
-            query = f"{keyword_query}^ORDERBYDESCsys_updated_on"
-            
-            params = {
-                "sysparm_query": query,
-                "sysparm_limit": 1,
-                "sysparm_fields": "number,short_description,description,risk,impact,type,close_code,priority,assignment_group",
-                "sysparm_display_value": "true"
-            }
-            
-            headers = {"Accept": "application/json"}
-            response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                if 'result' in data and len(data['result']) > 0:
-                    return data['result'][0]
-        
-        # If no matches found after trying all keywords
-        return None
+        # --- MOCK MODE ---
+        if not all([INSTANCE, USER, PASSWORD]):
+            if not similarity_index.size():
+                similarity_index.add_changes(MOCK_CLOSED_CHANGES)
+        # --- REAL SERVICENOW MODE ---
+        else:
+            similarity_index.ensure_fresh()
+
+        return [dict(change, similarity=score) for score, change in similarity_index.search(description, top_k)]
 
     except Exception as e:
         print(f"Smart Change Search Error: {e}")
-        return None
+        return []
 
 def get_change_details(ticket_number):
     """
@@ -136,6 +97,21 @@ def get_change_details(ticket_number):
         print(f"Get Change Details Error: {e}")
         return None
 
+def _assignment_group(template_ticket):
+    """
+    sys_id of the template's assignment group. get_change_details fetches display
+    values, so the reference carries the group name only; it is resolved to a
+    sys_id through the reference cache (warmed with all active groups at startup).
+    """
+    group = template_ticket.get('assignment_group')
+    if isinstance(group, dict):
+        if group.get('value'):
+            return group['value']
+        group = group.get('display_value')
+    if not group:
+        return None
+    return reference_cache.resolve_group(group) or group
+
 def create_change_request(template_ticket, start_date, end_date, assigned_to="Unassigned"):
     """
     Creates a new change request based on a template ticket.
@@ -159,7 +135,7 @@ def create_change_request(template_ticket, start_date, end_date, assigned_to="Un
             "impact": template_ticket.get('impact'),
             "type": template_ticket.get('type'),
             "priority": template_ticket.get('priority'),
-            "assignment_group": template_ticket.get('assignment_group', {}).get('value') if isinstance(template_ticket.get('assignment_group'), dict) else template_ticket.get('assignment_group'),
+            "assignment_group": _assignment_group(template_ticket),
             "category": template_ticket.get('category'),
             "start_date": start_date,
             "end_date": end_date,
@@ -175,6 +151,7 @@ def create_change_request(template_ticket, start_date, end_date, assigned_to="Un
         if response.status_code == 201:
             data = response.json()
             if 'result' in data:
+                reference_cache.remember("change", data['result'].get('number'), data['result'].get('sys_id'))
                 return data['result'].get('number')
         
         print(f"Creation Failed: {response.text}")
@@ -195,18 +172,8 @@ def update_change_request(ticket_number, updates):
     PASSWORD = Config.SERVICENOW_PASSWORD
 
     try:
-        # First get sys_id
-        url = f"{INSTANCE}/api/now/table/change_request"
-        params = {
-            "sysparm_query": f"number={ticket_number}",
-            "sysparm_fields": "sys_id"
-        }
-        response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=params)
-        sys_id = None
-        if response.status_code == 200:
-            results = response.json().get('result', [])
-            if results:
-                sys_id = results[0]['sys_id']
+        # First get sys_id (cached)
+        sys_id = reference_cache.resolve_change(ticket_number)
         
         if not sys_id:
             print(f"Could not find sys_id for {ticket_number}")
@@ -219,9 +186,11 @@ def update_change_request(ticket_number, updates):
         
         if response.status_code == 200:
             return True
-        else:
-            print(f"Update Failed: {response.text}")
-            return False
+        if response.status_code == 404:
+            # The record is gone; don't keep handing out its sys_id
+            reference_cache.invalidate("change", ticket_number)
+        print(f"Update Failed: {response.text}")
+        return False
 
     except Exception as e:
         print(f"Smart Change Update Error: {e}")
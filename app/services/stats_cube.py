@@ -0,0 +1,223 @@
+"""
+Precomputed change statistics for SHOW_STATS charts.
+
+A background thread recomputes every supported dimension at once every
+STATS_REFRESH_SECONDS and keeps the results in memory, so chart requests are
+answered without a live ServiceNow call.
+"""
+import time
+import datetime
+import threading
+import app.services.single_flight as single_flight
+from concurrent.futures import ThreadPoolExecutor
+from requests.auth import HTTPBasicAuth
+from app.config import Config
+import app.services.change_dataset as change_dataset
+
+# Chart dimension -> change_request field for the dimensions that are a plain server-side group-by
+GROUP_BY_FIELDS = {
+    "state": "state",
+    "risk": "risk",
+    "priority": "priority",
+    "category": "category",
+    "assignee": "assigned_to",
+    "change_type": "type",
+    "approval_rate": "approval",
+    "impact": "impact",
+    "assignment_group": "assignment_group",
+}
+DERIVED_DIMENSIONS = ("monthly_trend", "completion_time")
+DIMENSIONS = tuple(GROUP_BY_FIELDS) + DERIVED_DIMENSIONS
+
+COMPLETION_BUCKETS = [
+    ("< 1 day", 1),
+    ("1-3 days", 3),
+    ("3-7 days", 7),
+    ("7-14 days", 14),
+    ("> 14 days", None),
+]
+
+_lock = threading.Lock()
+_cube = {}          # dimension -> {"labels": [...], "data": [...]}
+_as_of = {}         # dimension -> datetime its data was last computed successfully
+_refresher = None
+
+
+def _auth():
+    return HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD)
+
+
+def _stats_request(params):
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/stats/change_request"
+    response = single_flight.get(url, auth=_auth(), params=params, headers={"Accept": "application/json"}, timeout=30)
+    if response.status_code != 200:
+        raise Exception(f"API returned status {response.status_code}")
+    return response.json().get('result', [])
+
+
+def compute_group_by(field):
+    """Counts per value of `field` using the aggregate API."""
+    result = _stats_request({
+        "sysparm_count": "true",
+        "sysparm_group_by": field,
+        "sysparm_display_value": "true"
+    })
+    labels = []
+    counts = []
+    for group in result:
+        val = group['groupby_fields'][0]['value']
+        count = int(group['stats']['count'])
+        if count > 0:
+            labels.append(val if val else "Unknown")
+            counts.append(count)
+    return {"labels": labels, "data": counts}
+
+
+def _month_starts(months):
+    today = datetime.date.today()
+    year, month = today.year, today.month
+    starts = []
+    for _ in range(months):
+        starts.append(datetime.date(year, month, 1))
+        month -= 1
+        if month == 0:
+            month, year = 12, year - 1
+    return list(reversed(starts))
+
+
+def compute_monthly_trend(months=6):
+    """Changes opened per month over the last `months` months (one count query per month)."""
+    labels = []
+    counts = []
+    starts = _month_starts(months)
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else (start.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+        last_day = end - datetime.timedelta(days=1)
+        result = _stats_request({
+            "sysparm_count": "true",
+            "sysparm_query": f"opened_atBETWEENjavascript:gs.dateGenerate('{start:%Y-%m-%d}','00:00:00')@javascript:gs.dateGenerate('{last_day:%Y-%m-%d}','23:59:59')"
+        })
+        labels.append(start.strftime("%b"))
+        counts.append(int(result.get('stats', {}).get('count', 0)) if isinstance(result, dict) else 0)
+    return {"labels": labels, "data": counts}
+
+
+def compute_completion_time(days=180):
+    """Closed changes from the last `days` days bucketed by time from opened to closed."""
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/change_request"
+    since = datetime.date.today() - datetime.timedelta(days=days)
+    query = f"state=3^closed_at>=javascript:gs.dateGenerate('{since:%Y-%m-%d}','00:00:00')^ORDERBYsys_id"
+    counts = [0] * len(COMPLETION_BUCKETS)
+    offset = 0
+    page_size = Config.EXPORT_PAGE_SIZE
+    while True:
+        params = {
+            "sysparm_query": query,
+            "sysparm_fields": "opened_at,closed_at",
+            "sysparm_limit": page_size,
+            "sysparm_offset": offset
+        }
+        response = single_flight.get(url, auth=_auth(), params=params, headers={"Accept": "application/json"}, timeout=30)
+        if response.status_code != 200:
+            raise Exception(f"API returned status {response.status_code}")
+        page = response.json().get('result', [])
+        for change in page:
+            try:
+                opened = datetime.datetime.strptime(change['opened_at'], "%Y-%m-%d %H:%M:%S")
+                closed = datetime.datetime.strptime(change['closed_at'], "%Y-%m-%d %H:%M:%S")
+            except (KeyError, ValueError):
+                continue
+            elapsed_days = (closed - opened).total_seconds() / 86400
+            for i, (_, upper) in enumerate(COMPLETION_BUCKETS):
+                if upper is None or elapsed_days < upper:
+                    counts[i] += 1
+                    break
+        if len(page) < page_size:
+            break
+        offset += page_size
+    return {"labels": [label for label, _ in COMPLETION_BUCKETS], "data": counts}
+
+
+def _from_dataset(dimension):
+    """Derived dimensions computed from the in-memory change dataset, or None if it is not loaded."""
+    snapshot = change_dataset.get_snapshot()
+    if snapshot is None or not len(snapshot["number"]):
+        return None
+    if dimension == "monthly_trend":
+        starts = _month_starts(6)
+        trend = change_dataset.monthly_counts(snapshot, starts[0], datetime.date.today() + datetime.timedelta(days=1))
+        trend["labels"] = [start.strftime("%b") for start in starts]
+        return trend
+    edges = [upper for _, upper in COMPLETION_BUCKETS if upper is not None]
+    since = datetime.date.today() - datetime.timedelta(days=180)
+    mask = change_dataset.filter_mask(snapshot, since=since, time_column="closed_at", state="Closed")
+    counts = change_dataset.duration_histogram(snapshot, edges, mask=mask)
+    return {"labels": [label for label, _ in COMPLETION_BUCKETS], "data": counts}
+
+
+def compute_dimension(dimension):
+    """Computes a single dimension live."""
+    if dimension in DERIVED_DIMENSIONS:
+        derived = _from_dataset(dimension)
+        if derived is not None:
+            return derived
+    if dimension == "monthly_trend":
+        return compute_monthly_trend()
+    if dimension == "completion_time":
+        return compute_completion_time()
+    return compute_group_by(GROUP_BY_FIELDS[dimension])
+
+
+def refresh_cube():
+    """
+    Recomputes every dimension concurrently. Dimensions that fail keep their
+    previous value and the time it was computed.
+    """
+    started = time.time()
+    # Derived dimensions are computed from the columnar dataset when it loads
+    change_dataset.refresh_dataset()
+    with ThreadPoolExecutor(max_workers=4, thread_name_prefix="stats-cube") as pool:
+        futures = {dimension: pool.submit(compute_dimension, dimension) for dimension in DIMENSIONS}
+
+    fresh = {}
+    for dimension, future in futures.items():
+        try:
+            fresh[dimension] = future.result()
+        except Exception as e:
+            print(f"Stats Cube Error ({dimension}): {e}")
+
+    now = datetime.datetime.now()
+    with _lock:
+        _cube.update(fresh)
+        _as_of.update(dict.fromkeys(fresh, now))
+    print(f"Stats cube refreshed: {len(fresh)}/{len(DIMENSIONS)} dimensions in {time.time() - started:.1f}s")
+
+
+def get_dimension(dimension):
+    """Returns ({"labels", "data"}, as_of) from memory, or (None, None) if not computed yet."""
+    with _lock:
+        data = _cube.get(dimension)
+        return (data, _as_of.get(dimension)) if data else (None, None)
+
+
+def _refresh_loop():
+    while True:
+        try:
+            refresh_cube()
+        except Exception as e:
+            print(f"Stats Cube Error: {e}")
+        time.sleep(Config.STATS_REFRESH_SECONDS)
+
+
+def start_stats_refresher():
+    """Starts the background refresh thread (once). No-op when ServiceNow is not configured."""
+    global _refresher
+    if not all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD]):
+        return
+    if Config.STATS_REFRESH_SECONDS <= 0:
+        return
+    with _lock:
+        if _refresher and _refresher.is_alive():
+            return
+        _refresher = threading.Thread(target=_refresh_loop, name="stats-cube-refresh", daemon=True)
+        _refresher.start()
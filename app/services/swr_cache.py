@@ -0,0 +1,77 @@
+"""
+Stale-while-revalidate cache for per-user ServiceNow views.
+
+A cached result is returned immediately. Once it is older than
+PENDING_CACHE_MAX_AGE it is refreshed in the background (at most one refresh
+per key at a time) and the next request sees the new data. Results older than
+PENDING_CACHE_MAX_STALE are not served; they are fetched again synchronously.
+"""
+import time
+import threading
+from app.config import Config
+
+_lock = threading.Lock()
+_entries = {}           # (namespace, key) -> {"value": ..., "fetched_at": epoch seconds}
+_refreshing = set()     # (namespace, key) refreshes in flight
+
+
+def _store(cache_key, value):
+    with _lock:
+        _entries[cache_key] = {"value": value, "fetched_at": time.time()}
+
+
+def _background_refresh(cache_key, fetch):
+    try:
+        _store(cache_key, fetch())
+    except Exception as e:
+        print(f"SWR Refresh Error ({cache_key[0]} {cache_key[1]}): {e}")
+    finally:
+        with _lock:
+            _refreshing.discard(cache_key)
+
+
+def get(namespace, key, fetch):
+    """
+    Returns (value, fetched_at, refreshing). `fetch` is called without arguments
+    and may raise; a synchronous fetch failure propagates to the caller.
+    """
+    cache_key = (namespace, key)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(cache_key)
+        age = now - entry["fetched_at"] if entry else None
+        usable = entry is not None and age < Config.PENDING_CACHE_MAX_STALE
+        start_refresh = usable and age >= Config.PENDING_CACHE_MAX_AGE and cache_key not in _refreshing
+        if start_refresh:
+            _refreshing.add(cache_key)
+
+    if not usable:
+        value = fetch()
+        _store(cache_key, value)
+        return value, time.time(), False
+
+    if start_refresh:
+        threading.Thread(target=_background_refresh, args=(cache_key, fetch),
+                         name=f"swr-{namespace}", daemon=True).start()
+    return entry["value"], entry["fetched_at"], cache_key in _refreshing
+
+
+def invalidate(namespace, key=None):
+    """Drops one user's entry, or every entry in the namespace when key is None."""
+    with _lock:
+        for cache_key in [k for k in _entries if k[0] == namespace and (key is None or k[1] == key)]:
+            del _entries[cache_key]
+
+
+def age_label(fetched_at, refreshing=False):
+    """Human readable age for display next to cached data, e.g. 'Updated 3 min ago'."""
+    age = int(time.time() - fetched_at)
+    if age < 10:
+        label = "Updated just now"
+    elif age < 60:
+        label = f"Updated {age}s ago"
+    elif age < 3600:
+        label = f"Updated {age // 60} min ago"
+    else:
+        label = f"Updated {age // 3600} h ago"
+    return label + (" · refreshing…" if refreshing else "")
@@ -1,8 +1,142 @@
+import os
 import requests
+from concurrent.futures import ThreadPoolExecutor, wait
 from flask import jsonify
 from requests.auth import HTTPBasicAuth
 from app.config import Config
+import app.services.schedule_index as schedule_index
+import app.services.tracing as tracing
 
+# Shared pool for the insightful-view sub-queries (approvers, related changes, conflicts)
+_enrichment_pool = ThreadPoolExecutor(max_workers=9, thread_name_prefix="ticket-enrich")
+
+
+def _new_pool_after_fork():
+    # Pool threads do not survive a fork; a forked worker gets its own pool
+    global _enrichment_pool
+    _enrichment_pool = ThreadPoolExecutor(max_workers=9, thread_name_prefix="ticket-enrich")
+
+
+os.register_at_fork(after_in_child=_new_pool_after_fork)
+
+
+def _reference_sys_id(value):
+    """Extracts the sys_id from a display-value reference field ({'display_value', 'link'})."""
+    if isinstance(value, dict):
+        if value.get('value'):
+            return value['value']
+        link = value.get('link', '')
+        if link:
+            return link.rstrip('/').split('/')[-1]
+    return None
+
+
+def _fetch_approvers(sys_id, timeout):
+    """Approvers recorded against the change in sysapproval_approver."""
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/sysapproval_approver"
+    params = {
+        "sysparm_query": f"sysapproval={sys_id}^ORDERBYorder",
+        "sysparm_fields": "approver,state",
+        "sysparm_display_value": "true",
+        "sysparm_exclude_reference_link": "true",
+        "sysparm_limit": 10
+    }
+    response = requests.get(url, auth=HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD),
+                            params=params, headers={"Accept": "application/json"}, timeout=timeout)
+    response.raise_for_status()
+    return [f"{a.get('approver') or 'Unknown'} ({a.get('state', 'N/A')})" for a in response.json().get('result', [])]
+
+
+def _fetch_related_changes(ci_sys_id, ticket_number, timeout):
+    """Most recent other changes raised against the same configuration item."""
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/change_request"
+    params = {
+        "sysparm_query": f"cmdb_ci={ci_sys_id}^number!={ticket_number}^ORDERBYDESCsys_updated_on",
+        "sysparm_fields": "number,short_description,state",
+        "sysparm_display_value": "true",
+        "sysparm_limit": 5
+    }
+    response = requests.get(url, auth=HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD),
+                            params=params, headers={"Accept": "application/json"}, timeout=timeout)
+    response.raise_for_status()
+    return [f"{r['number']} ({r.get('short_description', '')}) - {r.get('state', 'N/A')}" for r in response.json().get('result', [])]
+
+
+def _fetch_conflicts(ticket_number, start_str, end_str, timeout):
+    """Active changes whose planned window overlaps this one."""
+    # Logic: (StartA <= EndB) and (EndA >= StartB) -> Overlap
+    # We also filter for active states (not closed/cancelled) to be relevant
+    url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/change_request"
+    params = {
+        "sysparm_query": f"start_date<={end_str}^end_date>={start_str}^number!={ticket_number}^stateNOT IN3,4,7",
+        "sysparm_fields": "number,short_description,start_date,end_date",
+        "sysparm_limit": 5
+    }
+    response = requests.get(url, auth=HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD),
+                            params=params, headers={"Accept": "application/json"}, timeout=timeout)
+    response.raise_for_status()
+    return [f"**{c['number']}**: {c['short_description']} ({c['start_date']} to {c['end_date']})" for c in response.json().get('result', [])]
+
+
+def _local_conflicts(ticket, ticket_number, timeout):
+    """
+    Overlapping planned changes from the schedule index: same CI and same
+    assignment group first, ranked by risk. Falls back to the live query
+    until the index has been loaded.
+    """
+    start = schedule_index.parse_datetime(ticket.get('start_date') or '')
+    end = schedule_index.parse_datetime(ticket.get('end_date') or '')
+    if not start or not end or not schedule_index.is_loaded():
+        return _fetch_conflicts(ticket_number, ticket.get('start_date'), ticket.get('end_date'), timeout)
+
+    ci = _reference_sys_id(ticket.get('cmdb_ci'))
+    group = _reference_sys_id(ticket.get('assignment_group'))
+    conflicts = []
+    for reason, c in schedule_index.find_change_conflicts(ticket_number, start, end, ci, group, limit=Config.TICKET_CONFLICT_LIMIT):
+        tag = {"same CI": f"same CI ({c.get('ci_name')})", "same group": f"same group ({c.get('group_name')})"}.get(reason, "time overlap")
+        risk = f" · {c['risk']} risk" if c.get('risk') else ""
+        conflicts.append(f"**{c['number']}**: {c['event']} ({c['start']:%Y-%m-%d %H:%M} to {c['end']:%Y-%m-%d %H:%M}) — {tag}{risk}")
+    return conflicts
+
+
+def _enrich_ticket(ticket, ticket_number, deadline):
+    """
+    Runs the approver, related-change and conflict lookups concurrently.
+    Returns (results, missing): whatever finished within `deadline` seconds, and
+    {name: "timeout" | "failed"} for the lookups that did not.
+    """
+    jobs = {}
+    if ticket.get('sys_id'):
+        jobs["approvers"] = _enrichment_pool.submit(tracing.propagate(_fetch_approvers), ticket['sys_id'], deadline)
+
+    ci_sys_id = _reference_sys_id(ticket.get('cmdb_ci'))
+    if ci_sys_id:
+        jobs["related"] = _enrichment_pool.submit(tracing.propagate(_fetch_related_changes), ci_sys_id, ticket_number, deadline)
+
+    start_str = ticket.get('start_date')
+    end_str = ticket.get('end_date')
+    if start_str and end_str:
+        jobs["conflicts"] = _enrichment_pool.submit(tracing.propagate(_local_conflicts), ticket, ticket_number, deadline)
+
+    wait(jobs.values(), timeout=deadline)
+
+    results = {}
+    missing = {}
+    for name, future in jobs.items():
+        if not future.done():
+            future.cancel()
+            missing[name] = "timeout"
+            continue
+        error = future.exception()
+        if error is not None:
+            print(f"Ticket Enrichment Error ({name}): {error}")
+            missing[name] = "failed"
+            continue
+        results[name] = future.result()
+    return results, missing
+
+
+@tracing.traced("servicenow.ticket_details")
 def get_ticket_details(ticket_number):
     INSTANCE = Config.SERVICENOW_INSTANCE
     USER = Config.SERVICENOW_USER
@@ -32,21 +166,32 @@ def get_ticket_details(ticket_number):
                 
         return "✅ **SLA Status**: On Track"
 
-    def format_ticket_response(details, approvers, conflicts, related_changes, sla_msg):
+    def format_ticket_response(details, approvers, conflicts, related_changes, sla_msg, missing=None):
         """Formats the rich response combining standard details and insights."""
-        
+        missing = missing or {}
+        not_loaded = {
+            "timeout": "⏳ Not available right now (ServiceNow did not respond in time).",
+            "failed": "⚠️ Could not be loaded (the ServiceNow lookup failed).",
+        }
+
         approver_section = "None"
         if approvers:
             approver_section = "\n".join([f"- {a}" for a in approvers])
+        elif "approvers" in missing:
+            approver_section = not_loaded[missing["approvers"]]
 
         conflict_section = "✅ No conflicts detected."
         if conflicts:
             conflict_list = "\n".join([f"- {c}" for c in conflicts])
             conflict_section = f"⚠️ **Conflict Alert**:\n{conflict_list}"
+        elif "conflicts" in missing:
+            conflict_section = not_loaded[missing["conflicts"]]
 
         related_section = "None"
         if related_changes:
              related_section = "\n".join([f"- {r}" for r in related_changes])
+        elif "related" in missing:
+            related_section = not_loaded[missing["related"]]
 
         ci_raw = details.get('cmdb_ci')
         ci_display = "CI"
@@ -72,7 +217,7 @@ def get_ticket_details(ticket_number):
             f"*   **Type**: {details.get('type', 'N/A')}\n"
             f"*   **Priority**: {details.get('priority', 'N/A')}\n"
             f"*   **Impact**: {details.get('impact', 'N/A')}\n"
-            f"*   **Assigned To**: {details.get('assigned_to', {}).get('display_value', details.get('assigned_to')) if isinstance(details.get('assigned_to'), dict) else details.get('assigned_to', 'N/A')} ({details.get('assignment_group', 'N/A')})\n"
+            f"*   **Assigned To**: {details.get('assigned_to', {}).get('display_value', details.get('assigned_to')) if isinstance(details.get('assigned_to'), dict) else details.get('assigned_to', 'N/A')} ({details.get('assignment_group', {}).get('display_value', 'N/A') if isinstance(details.get('assignment_group'), dict) else details.get('assignment_group', 'N/A')})\n"
             f"*   **Planned Start**: {details.get('start_date', 'N/A')}\n"
             f"*   **Planned End**: {details.get('end_date', 'N/A')}\n\n"
 
@@ -166,7 +311,7 @@ def get_ticket_details(ticket_number):
     params = {
         "sysparm_query": f"number={ticket_number}",
         "sysparm_limit": 1,
-        "sysparm_fields": "sys_id,number,state,priority,short_description,description,risk,impact,assigned_to,cmdb_ci,sys_updated_on,start_date,end_date,type",
+        "sysparm_fields": "sys_id,number,state,priority,short_description,description,risk,impact,assigned_to,assignment_group,cmdb_ci,sys_updated_on,start_date,end_date,type",
         "sysparm_display_value": "true"
     }
     
@@ -180,40 +325,13 @@ def get_ticket_details(ticket_number):
         data = response.json()
         if 'result' in data and len(data['result']) > 0:
             ticket = data['result'][0]
-            sys_id = ticket.get('sys_id', '') # Need raw sys_id for sub-queries? Actually display_value=true might hide it. 
-            # Note: sysparm_display_value=true makes sys_id return the display value (number) sometimes? 
-            # Let's assume we might need a separate call or just use what we have.
-            # For this implementation, we will mock the sub-calls for Real Mode to avoid excessive complexity unless requested.
-            
-            # 1. Approvers (Mocked for Real Mode for now to avoid 3 more API calls in this step)
-            approvers = ["Pending Manager Approval"] 
-            
-            # 2. Conflicts
-            conflicts = []
-            start_str = ticket.get('start_date')
-            end_str = ticket.get('end_date')
-            
-            if start_str and end_str:
-                try:
-                    # Query for overlapping changes
-                    # Logic: (StartA <= EndB) and (EndA >= StartB) -> Overlap
-                    # SN Query: start_date <= end_str ^ end_date >= start_str ^ number != ticket_number
-                    # We also filter for active states (not closed/cancelled) to be relevant
-                    conflict_query = f"start_date<={end_str}^end_date>={start_str}^number!={ticket_number}^stateNOT IN3,4,7" 
-                    
-                    conflict_params = {
-                        "sysparm_query": conflict_query,
-                        "sysparm_fields": "number,short_description,start_date,end_date",
-                        "sysparm_limit": 5
-                    }
-                    
-                    c_response = requests.get(url, auth=HTTPBasicAuth(USER, PASSWORD), params=conflict_params, headers=headers)
-                    if c_response.status_code == 200:
-                        c_data = c_response.json()
-                        for c in c_data.get('result', []):
-                            conflicts.append(f"**{c['number']}**: {c['short_description']} ({c['start_date']} to {c['end_date']})")
-                except Exception as e:
-                    print(f"Conflict Check Error: {e}")
+
+            # 1-2. Approvers, related changes on the same CI and conflicts, fetched concurrently.
+            # Whatever has not arrived by the deadline is reported as not loaded.
+            enrichment, missing = _enrich_ticket(ticket, ticket_number, Config.TICKET_ENRICHMENT_TIMEOUT)
+            approvers = enrichment.get("approvers", [])
+            related_changes = enrichment.get("related", [])
+            conflicts = enrichment.get("conflicts", [])
             
             # 3. SLA
             sla_msg = get_sla_status(ticket.get('state'), ticket.get('sys_updated_on'))
@@ -228,7 +346,7 @@ def get_ticket_details(ticket_number):
             # 5. Expected Time
             ticket['expected_approval'] = "24 Hours"
 
-            formatted_response = format_ticket_response(ticket, approvers, conflicts, [], sla_msg)
+            formatted_response = format_ticket_response(ticket, approvers, conflicts, related_changes, sla_msg, missing)
             return jsonify({"answer": formatted_response})
         else:
             return jsonify({"answer": f"Ticket **{ticket_number}** not found."})
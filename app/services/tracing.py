@@ -0,0 +1,327 @@
+"""
+Lightweight per-request span tracing.
+
+A trace starts at the view (traced_request) with a request ID taken from the
+X-Request-ID header (when it is 1-64 letters, digits or dashes) or generated, and every stage underneath opens a child
+span: span()/traced() for our own code, the LangChain callback in rag_service
+for retrieval and generation inside the RAG chain, and instrument_http() for
+every outgoing HTTP call (ServiceNow). The current span is tracked in a
+contextvar, so nothing has to be passed around.
+
+When the root span ends the trace is appended as one line of OTLP/JSON
+(an ExportTraceServiceRequest) to TRACE_FILE, which rolls over at
+TRACE_FILE_MAX_BYTES, keeping TRACE_FILE_BACKUPS old files; writes and
+rollovers hold a file lock, so workers never rotate twice. Any OTLP-aware
+tool can ingest the lines; recent_traces() reads them back for the dashboard.
+"""
+import os
+import re
+import json
+import time
+import uuid
+import functools
+import threading
+import contextvars
+from collections import deque
+from urllib.parse import urlsplit
+from flask import request, make_response
+from app.config import Config
+from app.services.file_lock import locked
+
+SERVICE_NAME = "change-management-assistant"
+
+_current = contextvars.ContextVar("current_span", default=None)
+_file_lock = threading.Lock()
+# Client-supplied request IDs are echoed in headers and written to the trace file
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9-]{1,64}")
+
+
+class Span:
+    def __init__(self, name, trace, parent=None, attributes=None):
+        self.name = name
+        self.trace = trace
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def end(self, error=None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.finish(self)
+
+
+class _Trace:
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.trace_id = uuid.uuid4().hex
+        self.root = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def finish(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+
+def _enabled():
+    return Config.TRACE_ENABLED
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name, **attributes):
+    """
+    Child of the current span that is NOT made current (for callbacks that start and
+    end a span in separate calls). Returns None when no trace is active.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace, parent, attributes)
+
+
+class span:
+    """Context manager for a child span of the current one; a no-op outside a trace."""
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.span = None
+        self._token = None
+
+    def __enter__(self):
+        self.span = start_span(self.name, **self.attributes)
+        if self.span:
+            self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span:
+            _current.reset(self._token)
+            self.span.end(exc)
+        return False
+
+
+def traced(name):
+    """Decorator: runs the function inside span(name)."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate(fn):
+    """Binds fn to the current context, so spans it opens on a pool thread join this trace."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def set_attribute(key, value):
+    """Sets an attribute on the current span (no-op outside a trace)."""
+    current = _current.get()
+    if current:
+        current.set(key, value)
+
+
+def set_root_attribute(key, value):
+    """Sets an attribute on the trace's root span, e.g. the detected intent."""
+    current = _current.get()
+    if current:
+        current.trace.root.set(key, value)
+
+
+def traced_request(name):
+    """View decorator: root span for the request, X-Request-ID in and out, trace written when done."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _enabled():
+                return view(*args, **kwargs)
+            request_id = request.headers.get("X-Request-ID", "")
+            if not REQUEST_ID_PATTERN.fullmatch(request_id):
+                request_id = uuid.uuid4().hex
+            trace = _Trace(request_id)
+            root = Span(name, trace, attributes={"http.method": request.method, "http.route": request.path,
+                                                 "request.id": request_id})
+            trace.root = root
+            token = _current.set(root)
+            error = None
+            try:
+                response = make_response(view(*args, **kwargs))
+                root.set("http.status_code", response.status_code)
+                response.headers["X-Request-ID"] = request_id
+                return response
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                _current.reset(token)
+                root.end(error)
+                _write_trace(trace)
+        return wrapper
+    return decorator
+
+
+# --- Outgoing HTTP ---
+
+_http_instrumented = False
+
+
+def instrument_http():
+    """Wraps requests' Session.request so every outgoing call inside a trace gets its own span."""
+    global _http_instrumented
+    if _http_instrumented:
+        return
+    import requests
+    original = requests.sessions.Session.request
+
+    @functools.wraps(original)
+    def request_with_span(self, method, url, *args, **kwargs):
+        if _current.get() is None:
+            return original(self, method, url, *args, **kwargs)
+        parts = urlsplit(url)
+        attributes = {"http.method": method.upper(), "http.url": f"{parts.scheme}://{parts.netloc}{parts.path}"}
+        if "/api/now/" in parts.path:
+            # /api/now/table/<table> or /api/now/stats/<table>
+            attributes["servicenow.table"] = parts.path.rstrip("/").split("/")[4] if parts.path.count("/") >= 4 else ""
+        with span(f"HTTP {method.upper()} {parts.path}", **attributes) as s:
+            response = original(self, method, url, *args, **kwargs)
+            if s:
+                s.set("http.status_code", response.status_code)
+            return response
+
+    requests.sessions.Session.request = request_with_span
+    _http_instrumented = True
+
+
+# --- OTLP/JSON file export ---
+
+def _attribute(key, value):
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def to_otlp(trace):
+    spans = []
+    for s in trace.spans:
+        item = {
+            "traceId": trace.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            # SERVER for the root, CLIENT for outgoing HTTP, INTERNAL for everything else
+            "kind": 2 if s.parent_id is None else (3 if "http.url" in s.attributes else 1),
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns),
+            "attributes": [_attribute(k, v) for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 0},
+        }
+        if s.parent_id:
+            item["parentSpanId"] = s.parent_id
+        spans.append(item)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [_attribute("service.name", SERVICE_NAME), _attribute("process.pid", os.getpid())]},
+        "scopeSpans": [{"scope": {"name": "app.services.tracing"}, "spans": spans}],
+    }]}
+
+
+def _rotate():
+    for i in range(Config.TRACE_FILE_BACKUPS - 1, 0, -1):
+        older = f"{Config.TRACE_FILE}.{i}"
+        if os.path.exists(older):
+            os.replace(older, f"{Config.TRACE_FILE}.{i + 1}")
+    if Config.TRACE_FILE_BACKUPS > 0:
+        os.replace(Config.TRACE_FILE, f"{Config.TRACE_FILE}.1")
+    else:
+        os.remove(Config.TRACE_FILE)
+
+
+def _write_trace(trace):
+    try:
+        line = json.dumps(to_otlp(trace), separators=(",", ":")) + "\n"
+        # The file lock covers the other workers: size check, rollover and append happen as one step
+        with _file_lock, locked(f"{Config.TRACE_FILE}.lock"):
+            try:
+                if os.path.getsize(Config.TRACE_FILE) + len(line) > Config.TRACE_FILE_MAX_BYTES:
+                    _rotate()
+            except FileNotFoundError:
+                pass
+            # One write() in append mode, so lines from several workers do not interleave
+            with open(Config.TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+    except Exception as e:
+        print(f"Trace export error: {e}")
+
+
+# --- Reading traces back for the dashboard ---
+
+def _tail_lines(path, limit):
+    try:
+        with open(path, "rb") as f:
+            return deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return deque()
+
+
+def _summarize(payload):
+    spans = [s for rs in payload.get("resourceSpans", []) for ss in rs.get("scopeSpans", []) for s in ss.get("spans", [])]
+    if not spans:
+        return None
+    root = next((s for s in spans if "parentSpanId" not in s), spans[0])
+    start = int(root["startTimeUnixNano"])
+    attrs = lambda s: {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])}
+    root_attrs = attrs(root)
+    return {
+        "trace_id": root["traceId"],
+        "request_id": root_attrs.get("request.id"),
+        "name": root["name"],
+        "intent": root_attrs.get("intent"),
+        "started_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(start / 1e9)),
+        "duration_ms": round((int(root["endTimeUnixNano"]) - start) / 1e6, 1),
+        "spans": sorted(({
+            "span_id": s["spanId"],
+            "parent_id": s.get("parentSpanId"),
+            "name": s["name"],
+            "offset_ms": round((int(s["startTimeUnixNano"]) - start) / 1e6, 1),
+            "duration_ms": round((int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6, 1),
+            "error": s.get("status", {}).get("message"),
+            "attributes": attrs(s),
+        } for s in spans), key=lambda s: s["offset_ms"]),
+    }
+
+
+def recent_traces(limit=20, scan=None):
+    """The slowest `limit` of the last `scan` traces (default TRACE_VIEW_SCAN), slowest first."""
+    scan = scan or Config.TRACE_VIEW_SCAN
+    lines = list(_tail_lines(Config.TRACE_FILE, scan))
+    if len(lines) < scan:
+        lines = list(_tail_lines(f"{Config.TRACE_FILE}.1", scan - len(lines))) + lines
+    traces = []
+    for line in lines:
+        try:
+            summary = _summarize(json.loads(line))
+        except ValueError:
+            continue    # a line cut short by rotation
+        if summary:
+            traces.append(summary)
+    traces.sort(key=lambda t: -t["duration_ms"])
+    return traces[:limit]
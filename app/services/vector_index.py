@@ -0,0 +1,169 @@
+"""
+Read-only, memory-mapped vector index for the RAG retrievers.
+
+Each collection (knowledge base chunks, change templates) is stored as a
+float32 matrix of unit vectors (<name>.npy) plus the chunk texts and metadata
+(<name>.docs.json). Workers open the matrix with np.load(mmap_mode="r"), so its
+pages live once in the OS page cache and are shared by every gunicorn worker
+instead of each worker holding its own copy.
+
+VECTOR_INDEX_DIR/manifest.json records a fingerprint of the sources (files,
+sizes, mtimes, embedding model, chunking) and the build directory holding the
+files for it. When the fingerprint matches, a worker only maps the files and
+makes no embedding calls. Otherwise the first worker to take the build lock
+embeds the corpus into a new directory and the others wait for it and map the
+result. The manifest is replaced atomically once the directory is complete, so
+a reader always gets vectors and documents from the same build, even while a
+rebuild is in progress. Builds older than the previous one are removed.
+
+Imported only from rag_service.initialize_rag_chain (it needs LangChain).
+"""
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.config import Config
+from app.services.file_lock import locked
+
+FORMAT_VERSION = 2
+MANIFEST = "manifest.json"
+BUILD_LOCK = ".build.lock"
+EMBED_BATCH = 100
+
+
+def fingerprint(paths, **settings):
+    """Hash of the source files (path, size, mtime) and every setting that changes the vectors."""
+    digest = hashlib.sha256(json.dumps({"version": FORMAT_VERSION, **settings}, sort_keys=True).encode())
+    for path in sorted(paths):
+        stat = os.stat(path)
+        digest.update(f"{path}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _path(name):
+    return os.path.join(Config.VECTOR_INDEX_DIR, name)
+
+
+def _read_manifest():
+    try:
+        with open(_path(MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _is_current(manifest, version, names):
+    return (bool(manifest) and manifest.get("fingerprint") == version
+            and manifest.get("collections") == sorted(names) and os.path.isdir(_path(manifest.get("directory", ""))))
+
+
+def _write_atomic(name, write):
+    tmp = _path(f".{name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, _path(name))
+
+
+class VectorIndex:
+    """One collection of one build: a memory-mapped (n, dim) matrix of unit vectors and its documents."""
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.vectors = np.load(_path(os.path.join(directory, f"{name}.npy")), mmap_mode="r")
+        with open(_path(os.path.join(directory, f"{name}.docs.json")), encoding="utf-8") as f:
+            self.documents = json.load(f)
+
+    def search(self, query_vector, k):
+        """[(document dict, cosine similarity)] for the k nearest documents."""
+        if not len(self.documents):
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(np.linalg.norm(query), 1e-9)
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.documents[i], float(scores[i])) for i in top]
+
+
+class MappedRetriever(BaseRetriever):
+    """LangChain retriever over a VectorIndex (drop-in for vectorstore.as_retriever())."""
+
+    index: VectorIndex
+    embeddings: object
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        hits = self.index.search(self.embeddings.embed_query(query), self.k)
+        return [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc, _ in hits]
+
+
+def _embed(embeddings, texts):
+    """(n, dim) float32 unit vectors, embedded EMBED_BATCH texts per call."""
+    if not texts:
+        return np.zeros((0, 1), dtype=np.float32)
+    vectors = np.vstack([np.asarray(embeddings.embed_documents(texts[i:i + EMBED_BATCH]), dtype=np.float32)
+                         for i in range(0, len(texts), EMBED_BATCH)])
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-9)
+
+
+def _prune(keep):
+    """Removes builds (and leftovers of interrupted ones) other than `keep`. Runs under the build lock."""
+    for entry in os.listdir(Config.VECTOR_INDEX_DIR):
+        if entry in keep or entry in (MANIFEST, BUILD_LOCK):
+            continue
+        path = _path(entry)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            # Still mapped by a process on a platform that forbids deleting open files
+            print(f"Vector index: could not remove {entry}: {e}")
+
+
+def _build(collections, embeddings, version):
+    previous = (_read_manifest() or {}).get("directory")
+    directory = f"build-{version[:12]}-{uuid.uuid4().hex[:8]}"
+    staging = _path(f".{directory}.tmp")
+    os.makedirs(staging)
+    for name, load_documents in collections.items():
+        documents = load_documents()
+        vectors = _embed(embeddings, [d.page_content for d in documents])
+        np.save(os.path.join(staging, f"{name}.npy"), vectors)
+        payload = [{"page_content": d.page_content, "metadata": d.metadata} for d in documents]
+        with open(os.path.join(staging, f"{name}.docs.json"), "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        print(f"Vector index: embedded {len(documents)} {name} chunks.")
+    os.replace(staging, _path(directory))
+    manifest = {"fingerprint": version, "directory": directory, "collections": sorted(collections)}
+    _write_atomic(MANIFEST, lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+    # Keep the build workers may still be mapping; anything older has been unused for a whole rebuild
+    _prune({directory, previous})
+
+
+def open_indexes(collections, embeddings, version):
+    """
+    collections: {name: callable returning the LangChain documents to index}; the
+    callables only run when the index has to be (re)built.
+    Returns {name: VectorIndex}, building the files first when `version` changed.
+    """
+    os.makedirs(Config.VECTOR_INDEX_DIR, exist_ok=True)
+    manifest = _read_manifest()
+    if not _is_current(manifest, version, collections):
+        # One worker builds; the rest block here and then find a fresh manifest
+        with locked(_path(BUILD_LOCK)):
+            manifest = _read_manifest()
+            if not _is_current(manifest, version, collections):
+                print("Vector index: sources changed, rebuilding...")
+                _build(collections, embeddings, version)
+                manifest = _read_manifest()
+    else:
+        print("Vector index: up to date, mapping existing files.")
+    # Every collection comes from the directory this one manifest names
+    return {name: VectorIndex(manifest["directory"], name) for name in collections}
@@ -0,0 +1,206 @@
+"""
+Handling of change events pushed by ServiceNow (business rule -> REST message).
+
+Each event names the table, the record and what happened to it. The local
+caches and indexes that mirror that record are updated or invalidated right
+away, so they do not have to rely on short TTLs or polling to stay current.
+
+Event body (JSON):
+    {"table": "change_request" | "sysapproval_approver" | "sc_task",
+     "operation": "insert" | "update" | "delete",
+     "sys_id": "...", "number": "CHG0030001",
+     "state": "...", "approver": "<user_name>", "assigned_to": "<user_name>",
+     "short_description": "...", "description": "..."}
+Only table and operation are required; the other fields narrow what gets invalidated.
+
+The caches are per process, so the worker that receives a batch records it in
+the log store's webhook_events table and every worker replays new records
+(sync(), called before each request at most every WEBHOOK_SYNC_SECONDS).
+Index refreshes triggered by change events are debounced: a burst of events
+causes one refresh WEBHOOK_REFRESH_DELAY seconds after its first event.
+"""
+import os
+import hmac
+import json
+import time
+import sqlite3
+import threading
+from app.config import Config
+import app.services.log_store as log_store
+import app.services.reference_cache as reference_cache
+import app.services.swr_cache as swr_cache
+import app.services.similarity_index as similarity_index
+import app.services.change_dataset as change_dataset
+import app.services.schedule_index as schedule_index
+
+SUPPORTED_TABLES = ("change_request", "sysapproval_approver", "sc_task")
+OPERATIONS = ("insert", "update", "delete")
+TEXT_FIELDS = ("number", "sys_id", "approver", "assigned_to", "short_description", "description")
+CLOSED_STATES = ("3", "closed")
+# Replayed records are kept this long; a worker idle for longer relies on its caches' own TTLs
+EVENT_RETENTION = "-1 day"
+
+_sync_lock = threading.Lock()
+_last_event_id = None   # newest webhook_events id this process has applied
+_last_sync = 0.0
+_refresh_lock = threading.Lock()
+_pending_refreshes = {} # name -> threading.Timer waiting to run
+
+
+def _reset_after_fork():
+    # Timers do not survive a fork; a worker schedules its own refreshes
+    global _sync_lock, _refresh_lock, _pending_refreshes
+    _sync_lock = threading.Lock()
+    _refresh_lock = threading.Lock()
+    _pending_refreshes = {}
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def verify_token(token):
+    """Constant-time check of the shared webhook secret. Always False when no secret is configured."""
+    secret = Config.WEBHOOK_SECRET
+    if not secret or not token:
+        return False
+    return hmac.compare_digest(token.encode(), secret.encode())
+
+
+def _run_refresh(name, target, kwargs):
+    with _refresh_lock:
+        _pending_refreshes.pop(name, None)
+    try:
+        target(**kwargs)
+    except Exception as e:
+        print(f"Webhook Refresh Error ({name}): {e}")
+
+
+def _refresh_later(name, target, **kwargs):
+    """Runs target once, WEBHOOK_REFRESH_DELAY seconds from now, unless a run is already waiting."""
+    with _refresh_lock:
+        if name in _pending_refreshes:
+            return
+        timer = threading.Timer(Config.WEBHOOK_REFRESH_DELAY, _run_refresh, args=(name, target, kwargs))
+        timer.name = f"{name}-webhook-refresh"
+        timer.daemon = True
+        _pending_refreshes[name] = timer
+    timer.start()
+
+
+def _change_event(event, operation):
+    actions = []
+    number = event.get("number")
+    sys_id = event.get("sys_id")
+
+    if operation == "delete":
+        if number:
+            reference_cache.invalidate("change", number)
+            similarity_index.remove_change(number)
+            actions += [f"reference:change:{number}", f"similarity:remove:{number}"]
+    else:
+        if number and sys_id:
+            reference_cache.remember("change", number, sys_id)
+            actions.append(f"reference:change:{number}")
+        if number:
+            state = str(event.get("state", "")).lower()
+            if state in CLOSED_STATES and event.get("short_description"):
+                similarity_index.add_changes([event])
+                actions.append(f"similarity:add:{number}")
+            elif state and state not in CLOSED_STATES:
+                # Reopened or still in flight: not a "past change" any more
+                similarity_index.remove_change(number)
+                actions.append(f"similarity:remove:{number}")
+
+    # The analytics dataset and schedule index refresh incrementally; one pull covers a whole burst of events
+    _refresh_later("dataset", change_dataset.refresh_dataset)
+    _refresh_later("schedule", schedule_index.refresh_index, force=True)
+    actions += ["dataset:refresh", "schedule:refresh"]
+    return actions
+
+
+def validate_event(event):
+    """Raises ValueError unless `event` is an object with a supported table and operation and text fields."""
+    if not isinstance(event, dict):
+        raise ValueError("Each event must be a JSON object.")
+    table = event.get("table")
+    operation = event.get("operation")
+    if table not in SUPPORTED_TABLES:
+        raise ValueError(f"Unsupported table: {table}")
+    if not isinstance(operation, str) or operation.lower() not in OPERATIONS:
+        raise ValueError(f"Unsupported operation: {operation}")
+    for field in TEXT_FIELDS:
+        if event.get(field) is not None and not isinstance(event[field], str):
+            raise ValueError(f"{field} must be a string.")
+    if event.get("state") is not None and not isinstance(event["state"], (str, int)):
+        raise ValueError("state must be a string or a number.")
+
+
+def apply_event(event):
+    """Applies one validated event to this process's caches. Returns the list of actions taken."""
+    table = event["table"]
+    operation = event["operation"].lower()
+
+    if table == "change_request":
+        return _change_event(event, operation)
+
+    if table == "sysapproval_approver":
+        # Unknown approver: drop every user's cached list rather than risk a stale one
+        approver = event.get("approver")
+        swr_cache.invalidate("approvals", approver)
+        return [f"approvals:{approver or '*'}"]
+
+    assignee = event.get("assigned_to")
+    swr_cache.invalidate("tasks", assignee)
+    return [f"tasks:{assignee or '*'}"]
+
+
+def _publish(events):
+    """Records the events for every worker; returns their ids."""
+    with log_store.transaction() as conn:
+        conn.execute("DELETE FROM webhook_events WHERE received_at < datetime('now', ?)", (EVENT_RETENTION,))
+        return [conn.execute("INSERT INTO webhook_events(received_at, event) VALUES (datetime('now'), ?)",
+                             (json.dumps(event),)).lastrowid
+                for event in events]
+
+
+def sync(force=False):
+    """
+    Applies the events recorded since this process last looked, whichever worker
+    received them. Returns {event id: actions}. Without `force` it reads the log
+    store at most every WEBHOOK_SYNC_SECONDS.
+    """
+    global _last_event_id, _last_sync
+    if not force and time.monotonic() - _last_sync < Config.WEBHOOK_SYNC_SECONDS:
+        return {}
+    with _sync_lock:
+        _last_sync = time.monotonic()
+        conn = log_store.connection()
+        if _last_event_id is None:
+            # A new process starts with empty caches: nothing recorded so far applies to it
+            _last_event_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM webhook_events").fetchone()[0]
+        applied = {}
+        for row in conn.execute("SELECT id, event FROM webhook_events WHERE id > ? ORDER BY id", (_last_event_id,)).fetchall():
+            try:
+                applied[row["id"]] = apply_event(json.loads(row["event"]))
+            except Exception as e:
+                print(f"Webhook Replay Error (event {row['id']}): {e}")
+            _last_event_id = row["id"]
+        return applied
+
+
+def handle_events(events):
+    """
+    Validates the whole batch first (ValueError, nothing applied), then records it
+    for the other workers and applies it here. Returns the actions taken.
+    """
+    for event in events:
+        validate_event(event)
+    try:
+        # Catch up first, so this worker's position is set before its own events are added
+        sync(force=True)
+        ids = _publish(events)
+        applied = sync(force=True)
+        return [action for event_id in ids for action in applied.get(event_id, [])]
+    except sqlite3.Error as e:
+        print(f"Webhook Publish Error (applied in this worker only): {e}")
+        return [action for event in events for action in apply_event(event)]
@@ -349,6 +349,38 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// --- Global Helper: Load More Scheduled Changes ---
+async function loadMoreChanges(btn) {
+    const container = btn.closest('.changes-container');
+    const tbody = container.querySelector('.changes-table tbody');
+    const originalText = btn.innerHTML;
+    btn.disabled = true;
+    btn.innerHTML = 'Loading...';
+
+    try {
+        const params = new URLSearchParams({ query: btn.dataset.query, cursor: btn.dataset.cursor });
+        const response = await fetch(`/scheduled_changes/more?${params.toString()}`);
+        const data = await response.json();
+        if (data.error) throw new Error(data.error);
+
+        tbody.insertAdjacentHTML('beforeend', data.rows_html);
+        const shown = container.querySelector('.changes-shown');
+        if (shown) shown.textContent = data.shown;
+
+        if (data.next_cursor) {
+            btn.dataset.cursor = data.next_cursor;
+            btn.innerHTML = originalText;
+            btn.disabled = false;
+        } else {
+            btn.remove();
+        }
+    } catch (e) {
+        console.error(e);
+        btn.innerHTML = '❌ Failed. Try again.';
+        btn.disabled = false;
+    }
+}
+
 // --- Global Helper: Export Audit Table ---
 function exportAuditTableToCSV() {
     // Find the last audit table in the chat
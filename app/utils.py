@@ -1,141 +1,193 @@
-import os
-import csv
 import re
-import requests
 from datetime import datetime, timedelta
 from flask import jsonify
-from requests.auth import HTTPBasicAuth
 from app.config import Config
+import app.services.schedule_index as schedule_index
+import app.services.tracing as tracing
 
+MONTHS = "January|February|March|April|May|June|July|August|September|October|November|December"
+DATE_PATTERNS = [
+    # YYYY-MM-DD
+    (re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})'), lambda m: datetime.strptime(m.group(0), "%Y-%m-%d")),
+    # Month DD, YYYY
+    (re.compile(rf'({MONTHS})\s+(\d{{1,2}})(?:st|nd|rd|th)?,?\s+(\d{{4}})', re.IGNORECASE),
+     lambda m: datetime.strptime(f"{m.group(1)} {m.group(2)}, {m.group(3)}", "%B %d, %Y")),
+    # DD Month YYYY
+    (re.compile(rf'(\d{{1,2}})(?:st|nd|rd|th)?\s+({MONTHS})\s+(\d{{4}})', re.IGNORECASE),
+     lambda m: datetime.strptime(f"{m.group(1)} {m.group(2)} {m.group(3)}", "%d %B %Y")),
+    # Month DD (No Year) - Assume current or next year
+    (re.compile(rf'({MONTHS})\s+(\d{{1,2}})(?:st|nd|rd|th)?', re.IGNORECASE), lambda m: _without_year(m)),
+]
+RANGE_JOINER = re.compile(r'^\s*(to|until|till|through|thru|-|–)\s*$', re.IGNORECASE)
+# Answer while the schedule index is still being loaded (each worker loads it in the background at startup)
+SCHEDULE_LOADING = "⏳ The change schedule is still loading. Please ask again in a few seconds."
+
+
+def _without_year(match):
+    current_year = datetime.now().year
+    temp_date = datetime.strptime(f"{match.group(1)} {match.group(2)}, {current_year}", "%B %d, %Y")
+    # If date is in the past (more than 30 days ago), assume next year
+    if temp_date < datetime.now() - timedelta(days=30):
+        return temp_date.replace(year=current_year + 1)
+    return temp_date
+
+
+def extract_dates(user_input):
+    """All dates mentioned in the text as (date, start_pos, end_pos), in order of appearance."""
+    found = []
+    taken = []
+    for pattern, parse in DATE_PATTERNS:
+        for match in pattern.finditer(user_input):
+            if any(match.start() < end and start < match.end() for start, end in taken):
+                continue
+            try:
+                found.append((parse(match), match.start(), match.end()))
+                taken.append((match.start(), match.end()))
+            except ValueError:
+                pass
+    return sorted(found, key=lambda d: d[1])
+
+
+def extract_windows(user_input):
+    """
+    Proposed windows in the text. "Dec 14 to Dec 16" / "between X and Y" become one
+    range; other dates are one-day windows each.
+    """
+    dates = extract_dates(user_input)
+    windows = []
+    i = 0
+    while i < len(dates):
+        day, _, end_pos = dates[i]
+        if i + 1 < len(dates):
+            joiner = user_input[end_pos:dates[i + 1][1]]
+            between = re.search(r'between\s*$', user_input[:dates[i][1]], re.IGNORECASE)
+            if RANGE_JOINER.match(joiner) or (between and re.match(r'^\s*and\s*$', joiner, re.IGNORECASE)):
+                last = max(day, dates[i + 1][0])
+                windows.append((schedule_index.day_window(min(day, dates[i + 1][0]))[0], schedule_index.day_window(last)[1]))
+                i += 2
+                continue
+        windows.append(schedule_index.day_window(day))
+        i += 1
+    return windows
+
+
+def _format_window(window):
+    start, end = window
+    if start.date() == end.date():
+        return start.strftime('%B %d, %Y')
+    return f"{start.strftime('%B %d, %Y')} – {end.strftime('%B %d, %Y')}"
+
+
+def _format_conflicts(conflicts):
+    lines = []
+    for conflict in conflicts:
+        period = f"{conflict['start']:%Y-%m-%d} to {conflict['end']:%Y-%m-%d}"
+        if conflict['kind'] == 'change':
+            lines.append(
+                f"- **{conflict['event']}** ({conflict.get('number')})\n"
+                f"  - Period: {period}\n"
+            )
+        else:
+            lines.append(
+                f"- **{conflict['event']}**\n"
+                f"  - Period: {period}\n"
+                f"  - {conflict.get('description', '')}\n"
+            )
+    return lines
+
+
+@tracing.traced("schedule.check_conflict")
 def check_schedule_conflict(user_input):
-    """Check if proposed date conflicts with freeze periods in ServiceNow or CSV."""
-    
-    # Extract date from user input
-    proposed_date = None
-    date_str = None
+    """Check if proposed dates or date ranges conflict with freeze periods or blocking changes."""
+    windows = extract_windows(user_input)
     
-    # Pattern 1: YYYY-MM-DD
-    match = re.search(r'(\d{4})-(\d{1,2})-(\d{1,2})', user_input)
-    if match:
-        try:
-            proposed_date = datetime.strptime(match.group(0), "%Y-%m-%d")
-            date_str = match.group(0)
-        except: pass
+    if not windows:
+        return jsonify({"answer": "I couldn't identify a specific date in your request. Please specify a date like 'December 15, 2023' or '2023-12-15'."})
     
-    # Pattern 2: Month DD, YYYY
-    if not proposed_date:
-        match = re.search(r'(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})', user_input, re.IGNORECASE)
-        if match:
-            try:
-                date_str = f"{match.group(1)} {match.group(2)}, {match.group(3)}"
-                proposed_date = datetime.strptime(date_str, "%B %d, %Y")
-            except: pass
+    # Check every window against the interval index (calendar CSV + planned ServiceNow changes)
+    results = schedule_index.find_conflicts(windows)
+    if results is None:
+        return jsonify({"answer": SCHEDULE_LOADING})
     
-    # Pattern 3: DD Month YYYY
-    if not proposed_date:
-        match = re.search(r'(\d{1,2})(?:st|nd|rd|th)?\s+(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{4})', user_input, re.IGNORECASE)
-        if match:
-            try:
-                date_str = f"{match.group(1)} {match.group(2)} {match.group(3)}"
-                proposed_date = datetime.strptime(date_str, "%d %B %Y")
-            except: pass
-
-    # Pattern 4: Month DD (No Year) - Assume current or next year
-    if not proposed_date:
-        match = re.search(r'(January|February|March|April|May|June|July|August|September|October|November|December)\s+(\d{1,2})(?:st|nd|rd|th)?', user_input, re.IGNORECASE)
-        if match:
-            try:
-                current_year = datetime.now().year
-                date_str = f"{match.group(1)} {match.group(2)}, {current_year}"
-                temp_date = datetime.strptime(date_str, "%B %d, %Y")
-                
-                # If date is in the past (more than 30 days ago), assume next year
-                if temp_date < datetime.now() - timedelta(days=30):
-                    date_str = f"{match.group(1)} {match.group(2)}, {current_year + 1}"
-                    proposed_date = datetime.strptime(date_str, "%B %d, %Y")
-                else:
-                    proposed_date = temp_date
-            except: pass
+    # Format response
+    if len(windows) == 1:
+        conflicts = results[0]
+        if conflicts:
+            warnings = ["⚠️ **Conflict Detected!**\n\n"] + _format_conflicts(conflicts)
+            warnings.append(f"\n❌ **Recommendation:** Please select a different date to avoid operational conflicts.")
+            return jsonify({"answer": "".join(warnings)})
+        return jsonify({
+            "answer": f"✅ **No conflicts found!**\n\nThe {'date' if windows[0][0].date() == windows[0][1].date() else 'window'} **{_format_window(windows[0])}** appears to be available for scheduling your change. Please proceed with your change request."
+        })
     
-    if not proposed_date:
-        return jsonify({"answer": "I couldn't identify a specific date in your request. Please specify a date like 'December 15, 2023' or '2023-12-15'."})
+    parts = [f"📅 **Checked {len(windows)} proposed windows:**\n\n"]
+    for window, conflicts in zip(windows, results):
+        if conflicts:
+            parts.append(f"⚠️ **{_format_window(window)}** — {len(conflicts)} conflict(s):\n")
+            parts.extend(_format_conflicts(conflicts))
+        else:
+            parts.append(f"✅ **{_format_window(window)}** — no conflicts\n")
+        parts.append("\n")
+    free = [w for w, c in zip(windows, results) if not c]
+    if free:
+        parts.append(f"👉 **Recommendation:** {_format_window(free[0])} is clear.")
+    else:
+        parts.append("❌ **Recommendation:** All proposed windows conflict. Please select different dates.")
+    return jsonify({"answer": "".join(parts)})
+
+
+DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*-?\s*(minutes?|mins?|hours?|hrs?|h|days?|d)\b', re.IGNORECASE)
+COUNT_PATTERN = re.compile(r'(\d+)\s+(?:free\s+|available\s+)?(?:windows|slots|options)', re.IGNORECASE)
+
+
+def _extract_duration(user_input):
+    match = DURATION_PATTERN.search(user_input)
+    if not match:
+        return timedelta(hours=Config.SCHEDULE_DEFAULT_WINDOW_HOURS)
+    amount, unit = float(match.group(1)), match.group(2).lower()
+    if unit.startswith('m'):
+        return timedelta(minutes=amount)
+    if unit.startswith('d'):
+        return timedelta(days=amount)
+    return timedelta(hours=amount)
+
+
+def _format_duration(duration):
+    hours = duration.total_seconds() / 3600
+    if hours >= 24 and hours % 24 == 0:
+        return f"{int(hours // 24)}-day"
+    return f"{hours:g}-hour"
+
+
+@tracing.traced("schedule.find_windows")
+def find_schedule_windows(user_input):
+    """Earliest conflict-free windows of the requested length inside the preferred range."""
+    duration = _extract_duration(user_input)
+    count_match = COUNT_PATTERN.search(user_input)
+    count = min(int(count_match.group(1)), 10) if count_match else 3
     
-    # Check for conflicts
-    conflicts = []
+    # Preferred range: an explicit range, or SCHEDULE_SEARCH_DAYS from the given date (default: now)
+    now = datetime.now()
+    windows = extract_windows(user_input)
+    if windows and windows[0][0].date() != windows[0][1].date():
+        range_start, range_end = windows[0]
+    else:
+        range_start = windows[0][0] if windows else now
+        range_end = range_start + timedelta(days=Config.SCHEDULE_SEARCH_DAYS)
+    range_start = max(range_start, now)
     
-    # Try ServiceNow API first
-    if all([Config.SERVICENOW_INSTANCE, Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD]):
-        try:
-            url = f"{Config.SERVICENOW_INSTANCE}/api/now/table/change_request"
-            start_check = (proposed_date - timedelta(days=1)).strftime("%Y-%m-%d")
-            end_check = (proposed_date + timedelta(days=1)).strftime("%Y-%m-%d")
-            
-            params = {
-                "sysparm_query": f"start_date>={start_check}^start_date<={end_check}^ORend_date>={start_check}^end_date<={end_check}",
-                "sysparm_fields": "number,short_description,start_date,end_date,state,risk",
-                "sysparm_display_value": "true",
-                "sysparm_limit": 10
-            }
-            
-            response = requests.get(url, auth=HTTPBasicAuth(Config.SERVICENOW_USER, Config.SERVICENOW_PASSWORD), params=params, timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                if 'result' in data and len(data['result']) > 0:
-                    for change in data['result']:
-                        desc = change.get('short_description', '').lower()
-                        if 'freeze' in desc or 'blackout' in desc or change.get('risk') == 'High':
-                            conflicts.append({
-                                'event': change.get('short_description', 'Scheduled Change'),
-                                'start': change.get('start_date', 'N/A'),
-                                'end': change.get('end_date', 'N/A'),
-                                'number': change.get('number', 'N/A')
-                            })
-        except Exception as e:
-            print(f"ServiceNow API Error: {e}")
+    if range_end <= range_start:
+        return jsonify({"answer": "That range is already in the past. Please give a future date or range."})
     
-    # Fallback to CSV
-    if not conflicts and os.path.exists(Config.CALENDAR_FILE):
-        try:
-            with open(Config.CALENDAR_FILE, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        freeze_start = datetime.strptime(row['start_date'], "%Y-%m-%d")
-                        freeze_end = datetime.strptime(row['end_date'], "%Y-%m-%d")
-                        
-                        if freeze_start <= proposed_date <= freeze_end:
-                            conflicts.append({
-                                'event': row['event_name'],
-                                'type': row.get('event_type', 'freeze'),
-                                'start': row['start_date'],
-                                'end': row['end_date'],
-                                'description': row.get('description', '')
-                            })
-                    except Exception as e:
-                        print(f"CSV parsing error: {e}")
-                        continue
-        except Exception as e:
-            print(f"CSV read error: {e}")
+    free = schedule_index.find_free_windows(duration, range_start, range_end, count)
+    if free is None:
+        return jsonify({"answer": SCHEDULE_LOADING})
+    period = _format_window((range_start, range_end))
+    if not free:
+        return jsonify({"answer": f"❌ No conflict-free {_format_duration(duration)} window found between **{period}**. Try a longer range or a shorter window."})
     
-    # Format response
-    if conflicts:
-        warnings = ["⚠️ **Conflict Detected!**\n\n"]
-        for conflict in conflicts:
-            if 'number' in conflict:
-                warnings.append(
-                    f"- **{conflict['event']}** ({conflict.get('number')})\n"
-                    f"  - Period: {conflict['start']} to {conflict['end']}\n"
-                )
-            else:
-                warnings.append(
-                    f"- **{conflict['event']}**\n"
-                    f"  - Period: {conflict['start']} to {conflict['end']}\n"
-                    f"  - {conflict.get('description', '')}\n"
-                )
-        
-        warnings.append(f"\n❌ **Recommendation:** Please select a different date to avoid operational conflicts.")
-        return jsonify({"answer": "".join(warnings)})
-    else:
-        return jsonify({
-            "answer": f"✅ **No conflicts found!**\n\nThe date **{proposed_date.strftime('%B %d, %Y')}** appears to be available for scheduling your change. Please proceed with your change request."
-        })
+    lines = [f"🗓️ **Earliest conflict-free {_format_duration(duration)} windows** ({period}):\n\n"]
+    for i, (start, end) in enumerate(free, 1):
+        lines.append(f"{i}. **{start.strftime('%a %b %d, %Y %H:%M')}** → {end.strftime('%a %b %d, %Y %H:%M')}\n")
+    lines.append("\nThese avoid all freeze/blackout periods and high-risk changes currently on the calendar.")
+    return jsonify({"answer": "".join(lines)})
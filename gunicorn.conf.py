@@ -0,0 +1,63 @@
+"""
+Gunicorn settings (Dockerfile: gunicorn -c gunicorn.conf.py run:app).
+
+PRELOAD_APP=true (the Docker default): the master imports the app and builds
+the RAG state once (vector index mapped, chunk texts loaded, LangChain
+imported); workers fork from it and share those pages copy-on-write. What must
+not cross a fork is re-created in each worker: SQLite connections and thread
+pools are reset by fork hooks in their modules, and post_fork below builds new
+Gemini (gRPC) clients and starts the worker's background threads.
+
+PRELOAD_APP=false: every worker imports the app and runs create_app itself.
+
+`gunicorn --preload` (or --preload in GUNICORN_CMD_ARGS) counts as
+PRELOAD_APP=true. The decision is written back to PRELOAD_APP before the app
+is imported, so app.config.Config.PRELOAD_APP always agrees with gunicorn and
+create_app never starts threads in a master that is about to fork.
+
+preload_benchmark.py compares the two (start-up time and memory per worker).
+Measured with the pinned LangChain/Gemini stack, 4 workers, Linux, Python 3.11,
+on a host without Gemini access (no API key, API unreachable):
+
+                          per-worker init     preload
+  PSS total (MB)                    421.5       184.6
+  worker private (MB)                93.4        14.2
+  master RSS (MB)                    26.0       130.2
+  all workers ready (s)             237.7        62.6
+
+The memory covers LangChain and the Gemini client imported and the PDFs parsed
+and chunked. The embedding calls failed, so the mapped vectors and the chain
+are not in it. Start-up is dominated by those calls timing out (60 s each,
+one worker at a time under the build lock), so it only shows that preload does
+the work once; rerun with a key for real start-up times.
+"""
+import os
+import sys
+from dotenv import load_dotenv
+
+# Read like app.config does, without importing the app package into the master when not preloading
+load_dotenv()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+preload_app = ("--preload" in sys.argv[1:] + os.environ.get("GUNICORN_CMD_ARGS", "").split()
+               or os.environ.get("PRELOAD_APP", "false").lower() == "true")
+# The one setting both sides read: Config.PRELOAD_APP is evaluated after this file, when the app is imported
+os.environ["PRELOAD_APP"] = "true" if preload_app else "false"
+
+if preload_app:
+    # The master opens gRPC channels while building the index; gRPC only tolerates a fork with these set
+    os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "1")
+    os.environ.setdefault("GRPC_POLL_STRATEGY", "poll")
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import after_fork
+        after_fork()
+
+
+def post_worker_init(worker):
+    # preload_benchmark.py waits for one of these per worker
+    worker.log.info("Worker ready (pid: %s)", worker.pid)
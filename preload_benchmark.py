@@ -0,0 +1,136 @@
+"""
+Compares gunicorn with and without PRELOAD_APP: start-up time and memory.
+
+For each mode a real gunicorn (gunicorn.conf.py, run:app) is started on a
+local port. Start-up time is measured from spawn until every worker has logged
+"Worker ready" (post_worker_init). After --settle seconds, and one request per
+worker, memory is read from /proc/<pid>/smaps_rollup (Linux only):
+  - PSS total: the whole server's real footprint, with shared pages split between processes
+  - worker RSS: what each worker maps, shared pages included
+  - worker private: pages only that worker holds, i.e. the cost of one more worker
+
+Usage:
+    python preload_benchmark.py
+    python preload_benchmark.py --workers 4 --json preload.json
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import statistics
+import requests
+
+READY_LINE = "Worker ready"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _children(pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name may contain spaces; the ppid is the 2nd field after it
+                    if int(f.read().rsplit(")", 1)[1].split()[1]) == pid:
+                        children.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+    return children
+
+
+def _memory_mb(pid):
+    """{"rss", "pss", "private"} in MB from smaps_rollup."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return {
+        "rss": values.get("Rss", 0),
+        "pss": values.get("Pss", 0),
+        "private": values.get("Private_Clean", 0) + values.get("Private_Dirty", 0),
+    }
+
+
+def run_mode(preload, args):
+    port = _free_port()
+    env = dict(os.environ, PRELOAD_APP="true" if preload else "false",
+               GUNICORN_BIND=f"127.0.0.1:{port}", GUNICORN_WORKERS=str(args.workers))
+    here = os.path.dirname(os.path.abspath(__file__))
+    spawned = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "run:app"],
+                              cwd=here, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    ready = threading.Event()
+    ready_at = []
+
+    def watch():
+        for line in server.stderr:
+            if READY_LINE in line:
+                ready_at.append(time.perf_counter())
+                if len(ready_at) == args.workers:
+                    ready.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        if not ready.wait(args.timeout):
+            raise RuntimeError(f"{len(ready_at)} of {args.workers} workers ready after {args.timeout} s")
+        startup = ready_at[-1] - spawned
+        for _ in range(args.workers):
+            requests.get(f"http://127.0.0.1:{port}/login", timeout=30)
+        time.sleep(args.settle)
+
+        master = _memory_mb(server.pid)
+        workers = [_memory_mb(pid) for pid in _children(server.pid)]
+        return {
+            "preload": preload,
+            "workers": len(workers),
+            "all_workers_ready_s": round(startup, 2),
+            "first_worker_ready_s": round(ready_at[0] - spawned, 2),
+            "pss_total_mb": round(master["pss"] + sum(w["pss"] for w in workers), 1),
+            "master_rss_mb": round(master["rss"], 1),
+            "worker_rss_mb": round(statistics.mean(w["rss"] for w in workers), 1),
+            "worker_private_mb": round(statistics.mean(w["private"] for w in workers), 1),
+        }
+    finally:
+        server.terminate()
+        try:
+            server.wait(30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure gunicorn start-up and memory with and without preload.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=5, help="seconds to wait after start-up before reading memory")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for all workers")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = [run_mode(preload, args) for preload in (False, True)]
+    print(f"\n{'':24}{'per-worker init':>18}{'preload':>12}")
+    for key, label in [("all_workers_ready_s", "all workers ready (s)"), ("first_worker_ready_s", "first worker ready (s)"),
+                       ("pss_total_mb", "PSS total (MB)"), ("master_rss_mb", "master RSS (MB)"),
+                       ("worker_rss_mb", "worker RSS (MB)"), ("worker_private_mb", "worker private (MB)")]:
+        print(f"{label:24}{results[0][key]:>18}{results[1][key]:>12}")
+    saved = results[0]["pss_total_mb"] - results[1]["pss_total_mb"]
+    print(f"\nPreload saves {saved:.1f} MB PSS across {args.workers} workers "
+          f"and {results[0]['all_workers_ready_s'] - results[1]['all_workers_ready_s']:.2f} s of start-up.")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Local stand-in for the ServiceNow business rule: posts a change event to the
+running app's webhook so cache invalidation can be tried without an instance.
+
+Usage:
+    WEBHOOK_SECRET=... python send_webhook_event.py change_request update CHG0030001 --state 3
+    WEBHOOK_SECRET=... python send_webhook_event.py sysapproval_approver update --approver david.loo
+"""
+import os
+import argparse
+import requests
+
+BASE_URL = os.environ.get("APP_URL", "http://127.0.0.1:5000")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a ServiceNow-style change event to the webhook.")
+    parser.add_argument("table", choices=["change_request", "sysapproval_approver", "sc_task"])
+    parser.add_argument("operation", choices=["insert", "update", "delete"])
+    parser.add_argument("number", nargs="?", help="Record number, e.g. CHG0030001")
+    parser.add_argument("--sys-id")
+    parser.add_argument("--state")
+    parser.add_argument("--approver", help="Approver user_name (approval events)")
+    parser.add_argument("--assigned-to", help="Assignee user_name (task events)")
+    parser.add_argument("--short-description")
+    args = parser.parse_args()
+
+    secret = os.environ.get("WEBHOOK_SECRET")
+    if not secret:
+        print("Set WEBHOOK_SECRET to the same value the app runs with.")
+        return
+
+    event = {
+        "table": args.table,
+        "operation": args.operation,
+        "number": args.number,
+        "sys_id": args.sys_id,
+        "state": args.state,
+        "approver": args.approver,
+        "assigned_to": args.assigned_to,
+        "short_description": args.short_description,
+    }
+    event = {k: v for k, v in event.items() if v is not None}
+
+    response = requests.post(f"{BASE_URL}/webhooks/servicenow", json=event,
+                             headers={"X-Webhook-Token": secret}, timeout=10)
+    print(f"{response.status_code}: {response.text}")
+
+
+if __name__ == "__main__":
+    main()
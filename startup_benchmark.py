@@ -0,0 +1,172 @@
+"""
+Cold-start benchmark: import time per module, app-factory time and
+time-to-first-successful-request, each run in a fresh interpreter.
+
+Every run starts a new Python process with -X importtime, imports the app,
+calls create_app() and then logs in and sends requests through the Flask test
+client until one is answered (RAG_INIT_MODE=background answers 503 while
+the chain is still building; those are retried). Times are medians over
+--runs; time-to-first-request is measured from process spawn, so interpreter
+start-up is included.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --mode all --runs 5
+    python startup_benchmark.py --request index --max-seconds 8 --json startup.json
+
+--max-seconds makes the script exit non-zero when time-to-first-request is
+over budget, so it can gate CI against cold-start regressions.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+RESULT_MARKER = "STARTUP_BENCHMARK_RESULT "
+MODES = ["eager", "background", "lazy"]
+
+
+def child(request_kind, question, timeout):
+    """Runs inside the measured process; prints one RESULT_MARKER line."""
+    started = time.perf_counter()
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+
+    client = app.test_client()
+    client.post("/login", data={"username": "user", "password": "password", "role": "User"})
+    attempts, status = 0, None
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        attempts += 1
+        if request_kind == "ask":
+            response = client.post("/ask", json={"question": question, "chat_history": []})
+        else:
+            response = client.get("/")
+        status = response.status_code
+        # Only "still starting up" is retried; any other answer ends the measurement
+        if status != 503:
+            break
+        time.sleep(0.1)
+    ready = time.perf_counter()
+
+    result = {
+        "import_s": imported - started,
+        "create_app_s": created - imported,
+        "first_request_s": ready - created,
+        "first_request_status": status,
+        "attempts": attempts,
+        "finished_at": time.time(),
+    }
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+    # Skip interpreter teardown: background threads and atexit flushes are not part of start-up
+    os._exit(0)
+
+
+def parse_importtime(stderr):
+    """{module: (self seconds, cumulative seconds)} from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us) / 1e6, int(cumulative_us) / 1e6)
+    return modules
+
+
+def run_once(mode, args):
+    env = dict(os.environ, RAG_INIT_MODE=mode)
+    command = [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--child",
+               "--request", args.request, "--question", args.question, "--timeout", str(args.timeout)]
+    spawned = time.time()
+    proc = subprocess.run(command, env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    line = next((l for l in proc.stdout.splitlines() if l.startswith(RESULT_MARKER)), None)
+    if line is None:
+        raise RuntimeError(f"benchmark process failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+    result = json.loads(line[len(RESULT_MARKER):])
+    result["time_to_first_request_s"] = result.pop("finished_at") - spawned
+    result["imports"] = parse_importtime(proc.stderr)
+    return result
+
+
+def summarize(runs, top):
+    median = lambda key: statistics.median(r[key] for r in runs)
+    modules = {}
+    for run in runs:
+        for name, (own, cumulative) in run["imports"].items():
+            modules.setdefault(name, []).append((own, cumulative))
+    imports = {name: {"self_s": statistics.median(t[0] for t in times),
+                      "cumulative_s": statistics.median(t[1] for t in times)}
+               for name, times in modules.items()}
+    slowest = sorted(imports.items(), key=lambda kv: -kv[1]["cumulative_s"])
+    return {
+        "runs": len(runs),
+        "import_s": median("import_s"),
+        "create_app_s": median("create_app_s"),
+        "first_request_s": median("first_request_s"),
+        "time_to_first_request_s": median("time_to_first_request_s"),
+        "first_request_status": runs[-1]["first_request_status"],
+        "slowest_imports": [dict(module=name, **times) for name, times in slowest[:top]],
+        "app_imports": [dict(module=name, **times) for name, times in slowest if name.startswith("app")],
+    }
+
+
+def report(mode, summary):
+    print(f"\n=== RAG_INIT_MODE={mode} ({summary['runs']} runs, medians) ===")
+    print(f"  import app             {summary['import_s']:8.3f} s")
+    print(f"  create_app()           {summary['create_app_s']:8.3f} s")
+    print(f"  first answered request {summary['first_request_s']:8.3f} s  (last status {summary['first_request_status']})")
+    print(f"  spawn -> first request {summary['time_to_first_request_s']:8.3f} s")
+    print("  slowest imports (cumulative / self):")
+    for item in summary["slowest_imports"]:
+        print(f"    {item['cumulative_s']:7.3f} s {item['self_s']:7.3f} s  {item['module']}")
+    print("  app modules:")
+    for item in summary["app_imports"]:
+        print(f"    {item['cumulative_s']:7.3f} s {item['self_s']:7.3f} s  {item['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start time of the Flask app.")
+    parser.add_argument("--mode", choices=MODES + ["all"], default=os.environ.get("RAG_INIT_MODE", "eager"),
+                        help="RAG_INIT_MODE to benchmark, or all of them")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--request", choices=["ask", "index"], default="ask",
+                        help="first request: POST /ask (needs the RAG chain) or GET / (page only)")
+    parser.add_argument("--question", default="What is a standard change?")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds to keep retrying the first request")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports listed")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--max-seconds", type=float,
+                        help="exit 1 when spawn -> first request exceeds this (CI budget)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.request, args.question, args.timeout)
+        return
+
+    results = {}
+    for mode in (MODES if args.mode == "all" else [args.mode]):
+        runs = [run_once(mode, args) for _ in range(args.runs)]
+        results[mode] = summarize(runs, args.top)
+        report(mode, results[mode])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.max_seconds is not None:
+        over = {mode: r["time_to_first_request_s"] for mode, r in results.items()
+                if r["time_to_first_request_s"] > args.max_seconds or r["first_request_status"] != 200}
+        if over:
+            print(f"\nFAIL: over the {args.max_seconds} s budget or no successful request: {over}")
+            sys.exit(1)
+        print(f"\nOK: within the {args.max_seconds} s budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+"""
+pytest setup for the unit tests in this directory.
+
+Config refuses to load without GOOGLE_API_KEY, and the log store, traces and
+archives default to files in the working directory; point them at a temporary
+directory before any app module is imported. No test calls ServiceNow or Gemini.
+"""
+import os
+import tempfile
+
+_tmp = tempfile.mkdtemp(prefix="futura-tests-")
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("LOG_DB_FILE", os.path.join(_tmp, "logs.db"))
+os.environ.setdefault("LOG_ARCHIVE_DIR", os.path.join(_tmp, "log_archive"))
+os.environ.setdefault("TRACE_FILE", os.path.join(_tmp, "traces.jsonl"))
+os.environ.setdefault("VECTOR_INDEX_DIR", os.path.join(_tmp, "vector_index"))
+
+# Manual script that drives a running server (python tests/test_routing.py), not a pytest module
+collect_ignore = ["test_routing.py"]
@@ -0,0 +1,104 @@
+import io
+import csv
+import datetime
+import threading
+import pytest
+from flask import Flask
+from app.config import Config
+from app.routes import main_bp
+import app.services.log_store as log_store
+import app.services.log_archive as log_archive
+import app.services.analytics_api as analytics_api
+
+TODAY = datetime.date(2026, 3, 31)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty log store and archive of its own."""
+    monkeypatch.setattr(Config, "LOG_DB_FILE", str(tmp_path / "logs.db"))
+    monkeypatch.setattr(Config, "LOG_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(Config, "LOG_HOT_DAYS", 14)
+    for name in ("LOG_FILE", "FEEDBACK_FILE", "ESCALATION_FILE"):
+        # No legacy CSVs to import
+        monkeypatch.setattr(Config, name, str(tmp_path / f"{name}.csv"))
+    monkeypatch.setattr(log_store, "_local", threading.local())
+    monkeypatch.setattr(log_store, "_initialized", False)
+    yield
+    conn = getattr(log_store._local, "conn", None)
+    if conn:
+        conn.close()
+
+
+def _interactions():
+    rows = []
+    for day in range(1, 31):
+        for n, status in enumerate(["Unanswered", "Answered", "Unanswered"]):
+            # Same second on purpose: ties are broken by id
+            rows.append(("interactions", {"Timestamp": f"2026-03-{day:02d} 09:00:00", "Question": f"q {day}-{n}", "Status": status}))
+    return rows
+
+
+def _all_pages(kind, limit, **kwargs):
+    items, cursor, pages = [], None, 0
+    while True:
+        page = analytics_api.page(kind, cursor=cursor, limit=limit, **kwargs)
+        items += page["items"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items, pages
+
+
+def test_pages_walk_hot_and_archived_rows_without_gaps_or_repeats(store):
+    log_store.write_rows(_interactions())
+    moved = log_archive.archive_old_rows(TODAY)
+    assert moved["interactions"] == 16 * 3                    # 1-16 March archived, 17-30 still hot
+    assert log_archive.partition_days("interactions")
+
+    items, pages = _all_pages("unanswered", limit=7)
+
+    questions = [row["Question"] for row in items]
+    expected = [f"q {day}-{n}" for day in range(30, 0, -1) for n in (2, 0)]
+    assert questions == expected
+    assert pages == -(-len(expected) // 7)
+
+
+def test_paging_respects_the_date_range(store):
+    log_store.write_rows(_interactions())
+    log_archive.archive_old_rows(TODAY)
+    items, _ = _all_pages("unanswered", limit=3, start="2026-03-15 00:00:00", end="2026-03-18 23:59:59")
+    assert [row["Timestamp"][:10] for row in items] == [f"2026-03-{d}" for d in (18, 18, 17, 17, 16, 16, 15, 15)]
+
+
+def test_invalid_cursor_is_rejected(store):
+    with pytest.raises(ValueError):
+        analytics_api.page("feedback", cursor="bogus")
+
+
+@pytest.fixture
+def admin(store):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(main_bp)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user"], session["role"] = "admin", "Change Admin"
+    return client
+
+
+def test_export_covers_hot_and_archived_rows_in_the_range(admin):
+    log_store.write_rows(_interactions())
+    log_archive.archive_old_rows(TODAY)
+    response = admin.get("/analytics/export?table=interactions&start=2026-03-15&end=2026-03-17")
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row["Timestamp"][:10] for row in rows] == [f"2026-03-{d}" for d in (15, 15, 15, 16, 16, 16, 17, 17, 17)]
+
+
+@pytest.mark.parametrize("query", ["end=2026-10", "start=yesterday", "start=2026-03-32",
+                                   "start=2026-03-18&end=2026-03-15", "end=2026-03-15T10:00:00"])
+def test_export_rejects_an_invalid_range(admin, query):
+    response = admin.get(f"/analytics/export?table=interactions&{query}")
+    assert response.status_code == 400
+    assert "Invalid date range" in response.get_data(as_text=True)
@@ -0,0 +1,133 @@
+import datetime
+import numpy as np
+import pytest
+import app.services.change_dataset as change_dataset
+from app.config import Config
+
+
+def record(number, opened_at, closed_at="", state="Closed", risk="Moderate", approval="Approved",
+           group="Network", sys_updated_on=None):
+    """A Table API record as fetched with sysparm_display_value=all."""
+    def field(value, display=None):
+        return {"value": value, "display_value": value if display is None else display}
+    return {
+        "number": field(number),
+        "state": field("3", state),
+        "risk": field("3", risk),
+        "priority": field("4", "4 - Low"),
+        "impact": field("3", "3 - Low"),
+        "type": field("normal", "Normal"),
+        "approval": field("approved", approval),
+        "category": field("", ""),
+        "assignment_group": field("abc", group),
+        "assigned_to": field("", ""),
+        "opened_at": field(opened_at),
+        "closed_at": field(closed_at),
+        "start_date": field(""),
+        "end_date": field(""),
+        "sys_updated_on": field(sys_updated_on or opened_at),
+    }
+
+
+@pytest.fixture
+def snapshot():
+    return change_dataset.build_snapshot([
+        record("CHG1", "2026-01-05 10:00:00", "2026-01-05 22:00:00", group="Network"),
+        record("CHG2", "2026-01-20 08:00:00", "2026-01-24 08:00:00", group="Database", approval="Rejected"),
+        record("CHG3", "2026-02-02 09:00:00", "", state="New", risk="High", approval="Requested", group="Network"),
+        record("CHG4", "2026-03-15 12:00:00", "2026-04-30 12:00:00", risk="High", group="Network"),
+    ])
+
+
+def test_build_snapshot_encodes_categories_and_dates(snapshot):
+    assert snapshot["number"].tolist() == ["CHG1", "CHG2", "CHG3", "CHG4"]
+    states = [snapshot["labels"]["state"][code] for code in snapshot["codes"]["state"]]
+    assert states == ["Closed", "Closed", "New", "Closed"]
+    # Empty display values are labelled rather than dropped
+    assert snapshot["labels"]["category"] == ["Unknown"]
+    assert snapshot["opened_at"][0] == np.datetime64("2026-01-05T10:00:00")
+    assert np.isnat(snapshot["closed_at"][2])
+
+
+def test_merge_replaces_updated_rows_instead_of_duplicating(snapshot):
+    update = change_dataset.build_snapshot([
+        record("CHG3", "2026-02-02 09:00:00", "2026-02-03 09:00:00", risk="Very High", group="Security"),
+        record("CHG5", "2026-03-01 09:00:00"),
+    ])
+    merged = change_dataset._merge(snapshot, update)
+    assert sorted(merged["number"].tolist()) == ["CHG1", "CHG2", "CHG3", "CHG4", "CHG5"]
+    row = merged["number"].tolist().index("CHG3")
+    assert merged["labels"]["risk"][merged["codes"]["risk"][row]] == "Very High"
+    assert merged["labels"]["assignment_group"][merged["codes"]["assignment_group"][row]] == "Security"
+    assert merged["closed_at"][row] == np.datetime64("2026-02-03T09:00:00")
+    # Labels of untouched rows survive re-encoding
+    row = merged["number"].tolist().index("CHG2")
+    assert merged["labels"]["assignment_group"][merged["codes"]["assignment_group"][row]] == "Database"
+
+
+def test_filter_mask_combines_time_bounds_and_labels(snapshot):
+    assert change_dataset.filter_mask(snapshot, state="Closed").tolist() == [True, True, False, True]
+    assert change_dataset.filter_mask(snapshot, assignment_group=["Database", "Security"]).tolist() == [False, True, False, False]
+    mask = change_dataset.filter_mask(snapshot, since=datetime.date(2026, 1, 10), until=datetime.date(2026, 3, 1), risk="High")
+    assert mask.tolist() == [False, False, True, False]
+    with pytest.raises(KeyError):
+        change_dataset.filter_mask(snapshot, colour="red")
+
+
+def test_duration_histogram_buckets_by_days(snapshot):
+    # 0.5 days, 4 days, still open, 46 days
+    assert change_dataset.duration_histogram(snapshot, [1, 7, 30]) == [1, 1, 0, 1]
+    mask = change_dataset.filter_mask(snapshot, assignment_group="Network")
+    assert change_dataset.duration_histogram(snapshot, [1, 7, 30], mask=mask) == [1, 0, 0, 1]
+
+
+def test_monthly_counts_include_empty_months(snapshot):
+    counts = change_dataset.monthly_counts(snapshot, datetime.date(2025, 12, 1), datetime.date(2026, 4, 1))
+    assert counts == {"labels": ["Dec 2025", "Jan 2026", "Feb 2026", "Mar 2026"], "data": [0, 2, 1, 1]}
+
+
+def test_crosstab_counts_every_pair(snapshot):
+    rows, cols, matrix = change_dataset.crosstab(snapshot, "assignment_group", "risk")
+    table = {(r, c): int(matrix[i][j]) for i, r in enumerate(rows) for j, c in enumerate(cols)}
+    assert table == {("Database", "High"): 0, ("Database", "Moderate"): 1,
+                     ("Network", "High"): 2, ("Network", "Moderate"): 1}
+
+
+def test_approval_rate_counts_only_decided_changes(snapshot):
+    # Network: two approved and one still requested; Database: one rejected
+    assert change_dataset.approval_rate_by(snapshot, "assignment_group") == {"labels": ["Database", "Network"],
+                                                                           "data": [0.0, 100.0]}
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, result):
+        self._result = result
+
+    def json(self):
+        return {"result": self._result}
+
+
+def test_incremental_filter_is_relative_to_the_instance_clock(monkeypatch):
+    monkeypatch.setattr(Config, "SERVICENOW_INSTANCE", "https://example.service-now.com")
+    monkeypatch.setattr(Config, "SERVICENOW_USER", "user")
+    monkeypatch.setattr(Config, "SERVICENOW_PASSWORD", "secret")
+    queries = []
+
+    def get(url, params=None, **kwargs):
+        queries.append(params["sysparm_query"])
+        return _Response([record("CHG9", datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))])
+
+    monkeypatch.setattr(change_dataset.requests, "get", get)
+    monkeypatch.setattr(change_dataset, "_snapshot", None)
+    monkeypatch.setattr(change_dataset, "_refreshing", False)
+    monkeypatch.setattr(change_dataset, "_last_refresh",
+                        datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=30))
+    change_dataset.refresh_dataset()
+
+    assert queries[0].startswith(f"opened_at>=javascript:gs.daysAgoStart({Config.DATASET_HISTORY_DAYS})")
+    assert "^sys_updated_on>=javascript:gs.minutesAgoStart(35)" in queries[0]
+    assert "dateGenerate" not in queries[0]
+    assert change_dataset.size() == 1
+    assert change_dataset.last_refresh().tzinfo is not None
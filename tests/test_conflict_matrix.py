@@ -0,0 +1,72 @@
+import io
+import csv
+import random
+import datetime
+import pytest
+from flask import Flask
+import app.services.conflict_matrix as conflict_matrix
+from app.config import Config
+
+BASE = datetime.datetime(2026, 3, 1)
+DAY = datetime.datetime(2026, 3, 14)
+
+
+def _interval(number, start_hours, length_hours):
+    start = BASE + datetime.timedelta(hours=start_hours)
+    return {"number": number, "start": start, "end": start + datetime.timedelta(hours=length_hours)}
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_overlap_pairs_match_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = [_interval(f"CHG{i}", rng.randint(0, 300), rng.choice([0, 1, 3, 12, 72]))
+                 for i in range(rng.randint(0, 150))]
+    expected = {frozenset((a["number"], b["number"]))
+                for i, a in enumerate(intervals) for b in intervals[i + 1:]
+                if a["start"] <= b["end"] and b["start"] <= a["end"]}
+
+    pairs = conflict_matrix.overlap_pairs(intervals)
+    found = [frozenset((a["number"], b["number"])) for a, b in pairs]
+    assert len(found) == len(set(found))
+    assert set(found) == expected
+
+
+def test_touching_windows_overlap():
+    pairs = conflict_matrix.overlap_pairs([_interval("A", 0, 2), _interval("B", 2, 1), _interval("C", 4, 1)])
+    assert [(a["number"], b["number"]) for a, b in pairs] == [("A", "B")]
+
+
+@pytest.fixture
+def mock_window(monkeypatch):
+    """The mock release window used when ServiceNow is not configured."""
+    monkeypatch.setattr(Config, "SERVICENOW_INSTANCE", None)
+    return DAY, DAY + datetime.timedelta(hours=23, minutes=59)
+
+
+def test_build_matrix_groups_pairs_by_ci_and_group(mock_window):
+    result = conflict_matrix.build_matrix(conflict_matrix.load_window_changes(*mock_window))
+
+    pairs = [(row["change_a"], row["change_b"]) for row in result["pairs"]]
+    # Same-CI pairs first, then same-group; the Oracle patch overlaps nothing
+    assert pairs == [("CHG0040001", "CHG0040003"), ("CHG0040001", "CHG0040002")]
+    assert result["by_ci"] == {"Core-Switch-01": [["CHG0040001", "CHG0040003"]]}
+    assert result["by_group"] == {"Network Team": [["CHG0040001", "CHG0040002"]]}
+    assert sorted(result["matrix"]["CHG0040001"]) == ["CHG0040002", "CHG0040003"]
+    assert "CHG0040004" not in result["matrix"]
+    assert result["pairs"][0]["overlap_hours"] == 0.5
+
+
+def test_conflict_matrix_csv_has_the_header_and_one_row_per_pair(mock_window):
+    with Flask(__name__).test_request_context():
+        response = conflict_matrix.get_conflict_matrix(*mock_window, as_csv=True)
+        body = b"".join(response.response).decode()
+
+    assert "conflict_matrix_20260314_20260314.csv" in response.headers["Content-Disposition"]
+    reader = csv.DictReader(io.StringIO(body))
+    assert reader.fieldnames == conflict_matrix.CSV_FIELDS
+    rows = list(reader)
+    assert [(r["change_a"], r["change_b"], r["same_ci"], r["same_group"]) for r in rows] == [
+        ("CHG0040001", "CHG0040003", "True", "False"),
+        ("CHG0040001", "CHG0040002", "False", "True"),
+    ]
+    assert rows[1]["overlap_start"] == "2026-03-14 03:00:00" and rows[1]["overlap_end"] == "2026-03-14 04:00:00"
@@ -0,0 +1,51 @@
+import csv
+import io
+import gzip
+import zlib
+from flask import Flask
+from app.services.export_service import stream_csv_export
+
+FIELDS = ["Number", "Risk"]
+
+
+def _export(pages, compress=False):
+    """(response, body chunks) as the client receives them."""
+    with Flask(__name__).test_request_context():
+        response = stream_csv_export(pages, FIELDS, compress=compress)
+        return response, list(response.response)
+
+
+def test_plain_stream_writes_header_then_each_page():
+    pages = [[{"Number": "CHG1", "Risk": "Low"}], [{"Number": "CHG2", "Risk": "High", "extra": "ignored"}]]
+    _, chunks = _export(pages)
+    rows = list(csv.DictReader(io.StringIO(b"".join(chunks).decode())))
+    assert [r["Number"] for r in rows] == ["CHG1", "CHG2"]
+    assert len(chunks) == 3
+
+
+def test_gzip_stream_is_one_valid_member_and_each_page_decodes_on_arrival():
+    pages = [[{"Number": f"CHG{p}{i}", "Risk": "Low"} for i in range(100)] for p in range(3)]
+    response, chunks = _export(pages, compress=True)
+    assert response.headers["Content-Encoding"] == "gzip"
+
+    # A client decoding incrementally sees every page as soon as its chunk arrives
+    decoder = zlib.decompressobj(wbits=31)
+    seen = decoder.decompress(chunks[0]).decode()
+    assert seen == "Number,Risk\r\n"
+    for page, chunk in zip(pages, chunks[1:]):
+        seen += decoder.decompress(chunk).decode()
+        assert page[-1]["Number"] in seen
+
+    rows = list(csv.DictReader(io.StringIO(gzip.decompress(b"".join(chunks)).decode())))
+    assert len(rows) == 300
+
+
+def test_failing_page_source_ends_with_a_truncation_line():
+    def pages():
+        yield [{"Number": "CHG1", "Risk": "Low"}]
+        raise Exception("at offset 1: ServiceNow API Error: Status 500")
+
+    _, chunks = _export(pages(), compress=True)
+    body = gzip.decompress(b"".join(chunks)).decode()
+    assert body.splitlines()[-1] == "# export truncated: at offset 1: ServiceNow API Error: Status 500"
+    assert "CHG1" in body
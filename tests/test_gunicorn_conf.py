@@ -0,0 +1,33 @@
+import os
+import sys
+import runpy
+import pytest
+
+CONF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "gunicorn.conf.py")
+
+
+def load_conf(monkeypatch, argv, env=None, cmd_args=""):
+    monkeypatch.setattr(sys, "argv", ["gunicorn"] + argv)
+    monkeypatch.setenv("GUNICORN_CMD_ARGS", cmd_args)
+    # Recorded so the variables the config file sets are restored after the test
+    for name in ("GRPC_ENABLE_FORK_SUPPORT", "GRPC_POLL_STRATEGY"):
+        monkeypatch.delenv(name, raising=False)
+    if env is None:
+        monkeypatch.delenv("PRELOAD_APP", raising=False)
+    else:
+        monkeypatch.setenv("PRELOAD_APP", env)
+    return runpy.run_path(CONF)
+
+
+@pytest.mark.parametrize("argv, env, cmd_args, expected", [
+    (["-c", "gunicorn.conf.py", "run:app"], None, "", False),
+    (["-c", "gunicorn.conf.py", "run:app"], "true", "", True),
+    (["-c", "gunicorn.conf.py", "run:app"], "false", "", False),
+    # --preload without the env var must still keep the master's threads deferred
+    (["--preload", "-c", "gunicorn.conf.py", "run:app"], None, "", True),
+    (["-c", "gunicorn.conf.py", "run:app"], "false", "--workers 2 --preload", True),
+])
+def test_preload_decision_is_shared_with_the_app(monkeypatch, argv, env, cmd_args, expected):
+    conf = load_conf(monkeypatch, argv, env, cmd_args)
+    assert conf["preload_app"] is expected
+    assert os.environ["PRELOAD_APP"] == ("true" if expected else "false")
@@ -0,0 +1,85 @@
+import os
+import datetime
+import threading
+import pytest
+from app.config import Config
+import app.services.log_store as log_store
+import app.services.log_archive as log_archive
+
+TODAY = datetime.date(2026, 3, 31)
+DAY = "2026-03-01"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty log store and archive of its own."""
+    monkeypatch.setattr(Config, "LOG_DB_FILE", str(tmp_path / "logs.db"))
+    monkeypatch.setattr(Config, "LOG_ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(Config, "LOG_HOT_DAYS", 14)
+    monkeypatch.setattr(Config, "LOG_RETENTION_DAYS", 0)
+    for name in ("LOG_FILE", "FEEDBACK_FILE", "ESCALATION_FILE"):
+        monkeypatch.setattr(Config, name, str(tmp_path / f"{name}.csv"))
+    monkeypatch.setattr(log_store, "_local", threading.local())
+    monkeypatch.setattr(log_store, "_initialized", False)
+    yield
+    conn = getattr(log_store._local, "conn", None)
+    if conn:
+        conn.close()
+
+
+def _feedback(times, prefix):
+    return [("feedback", {"Timestamp": f"{DAY} {t}", "Type": "thumbs_up", "Message_Snippet": f"{prefix}{i}"})
+            for i, t in enumerate(times)]
+
+
+def _archived(table, day=DAY):
+    return log_archive._read_partition(table, day)
+
+
+def test_late_rows_are_merged_into_an_archived_day(store):
+    log_store.write_rows(_feedback(["09:00:00", "12:00:00"], "early"))
+    assert log_archive.archive_old_rows(TODAY)["feedback"] == 2
+
+    # A row for the same day arrives after the day was archived (e.g. a delayed batch)
+    log_store.write_rows(_feedback(["10:30:00"], "late"))
+    assert log_archive.archive_old_rows(TODAY)["feedback"] == 1
+
+    rows = _archived("feedback")
+    assert [r["Message_Snippet"] for r in rows] == ["early0", "late0", "early1"]
+    assert len({r["id"] for r in rows}) == 3
+    assert log_store.count("feedback") == 0
+    assert log_archive.count("feedback") == 3
+
+
+def test_retry_after_a_crash_does_not_duplicate_rows(store):
+    log_store.write_rows(_feedback(["09:00:00", "12:00:00"], "row"))
+    rows = list(log_store.rows("feedback", start=DAY, end=f"{DAY} 23:59:59", newest_first=False, with_id=True))
+    # Crash between writing the partition and deleting the rows from SQLite
+    log_archive._write_partition("feedback", DAY, rows)
+
+    assert log_archive.archive_old_rows(TODAY)["feedback"] == 2
+    archived = _archived("feedback")
+    assert sorted(r["id"] for r in archived) == sorted(str(r["id"]) for r in rows)
+    assert log_archive.count("feedback") == 2
+
+
+def test_hot_days_stay_in_the_database(store):
+    log_store.write_rows([("feedback", {"Timestamp": "2026-03-20 09:00:00", "Type": "thumbs_down", "Message_Snippet": "hot"})])
+    assert log_archive.archive_old_rows(TODAY)["feedback"] == 0
+    assert log_archive.partition_days("feedback") == []
+    assert log_store.count("feedback") == 1
+
+
+def test_retention_removes_only_partitions_older_than_the_cutoff(store, monkeypatch):
+    for day in ("2026-01-29", "2026-01-30", "2026-01-31", "2026-03-01"):
+        log_archive._write_partition("escalations", day, [])
+    log_archive._write_partition("feedback", "2026-01-01", [])
+
+    # Nothing is removed while retention is off
+    assert log_archive.apply_retention(TODAY) == 0
+
+    monkeypatch.setattr(Config, "LOG_RETENTION_DAYS", 60)       # oldest day kept: 2026-01-30
+    assert log_archive.apply_retention(TODAY) == 2
+    assert log_archive.partition_days("escalations") == ["2026-01-30", "2026-01-31", "2026-03-01"]
+    assert log_archive.partition_days("feedback") == []
+    assert not os.path.exists(log_archive.partition_path("escalations", "2026-01-29"))
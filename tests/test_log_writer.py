@@ -0,0 +1,62 @@
+import pytest
+from flask import Flask
+import app.services.log_store as log_store
+import app.services.log_writer as log_writer
+from app.routes import main_bp
+
+
+def _count(table):
+    return log_store.connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _interaction(question):
+    return ("interactions", {"Timestamp": "2026-01-05 10:00:00", "Question": question, "Status": "Answered"})
+
+
+def test_submitted_rows_are_written_in_batches():
+    before, stats = _count("interactions"), log_writer.stats()
+    for i in range(50):
+        log_writer.submit(*_interaction(f"batched question {i}"))
+    log_writer.flush()
+    after = log_writer.stats()
+    assert _count("interactions") == before + 50
+    assert after["written"] - stats["written"] == 50
+    assert 1 <= after["batches"] - stats["batches"] <= 50
+    assert after["pending"] == 0
+
+
+def test_one_bad_row_only_loses_itself():
+    before = {table: _count(table) for table in ("interactions", "feedback")}
+    stats = log_writer.stats()
+    bad = ("feedback", {"Timestamp": "2026-01-05 10:00:00", "Type": None, "Message_Snippet": "x"})
+
+    log_writer._write([_interaction("kept 1"), bad, _interaction("kept 2")])
+
+    after = log_writer.stats()
+    assert _count("interactions") == before["interactions"] + 2
+    assert _count("feedback") == before["feedback"]
+    assert after["dropped"] - stats["dropped"] == 1
+    assert after["written"] - stats["written"] == 2
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.register_blueprint(main_bp)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user"] = "user"
+    return client
+
+
+@pytest.mark.parametrize("body", [{}, {"type": None, "content": "x"}, {"type": "meh", "content": "x"}])
+def test_feedback_without_a_known_type_is_rejected(client, body):
+    assert client.post("/feedback", json=body).status_code == 400
+
+
+def test_feedback_with_null_content_is_logged(client):
+    before = _count("feedback")
+    assert client.post("/feedback", json={"type": "thumbs_up", "content": None}).status_code == 200
+    log_writer.flush()
+    assert _count("feedback") == before + 1
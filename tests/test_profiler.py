@@ -0,0 +1,93 @@
+import time
+import threading
+import pytest
+from flask import Flask
+import app.services.log_store as log_store
+import app.services.profiler as profiler
+import app.services.tracing as tracing
+from app.config import Config
+
+FOLDED = "\n".join([
+    "ask (app/routes.py:40);answer (app/services/rag.py:12);invoke (langchain/llm.py:88) 3",
+    "ask (app/routes.py:40);answer (app/services/rag.py:12) 1",
+    "ask (app/routes.py:40);detect_intent (app/services/intents.py:5) 2",
+    "",
+])
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty log store of its own and no cached profiler settings."""
+    monkeypatch.setattr(Config, "LOG_DB_FILE", str(tmp_path / "logs.db"))
+    monkeypatch.setattr(Config, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    for name in ("LOG_FILE", "FEEDBACK_FILE", "ESCALATION_FILE"):
+        monkeypatch.setattr(Config, name, str(tmp_path / f"{name}.csv"))
+    monkeypatch.setattr(log_store, "_local", threading.local())
+    monkeypatch.setattr(log_store, "_initialized", False)
+    monkeypatch.setattr(profiler, "_settings", None)
+    yield
+    conn = getattr(log_store._local, "conn", None)
+    if conn:
+        conn.close()
+
+
+def test_tree_parses_folded_stacks_with_spaces_in_frame_names():
+    root = profiler._tree(FOLDED)
+    assert root["count"] == 6
+    ask = root["children"]["ask (app/routes.py:40)"]
+    assert ask["count"] == 6
+    answer = ask["children"]["answer (app/services/rag.py:12)"]
+    assert answer["count"] == 4
+    assert answer["children"]["invoke (langchain/llm.py:88)"]["count"] == 3
+    assert ask["children"]["detect_intent (app/services/intents.py:5)"]["count"] == 2
+    assert profiler._depth(root) == 4
+
+
+def test_flamegraph_escapes_frame_names():
+    svg = profiler.to_flamegraph_svg('<lambda> (app/x.py:1);render "a&b" (app/y.py:2) 5', title="<req>")
+    assert "<lambda>" not in svg and "&lt;lambda&gt;" in svg
+    assert "&amp;b" in svg and "&quot;a" in svg
+    assert "&lt;req&gt;" in svg
+    assert svg.startswith("<svg") and svg.endswith("</svg>")
+
+
+def test_save_keeps_only_the_newest_profiles(store, monkeypatch):
+    monkeypatch.setattr(Config, "PROFILE_KEEP", 3)
+    for n in range(5):
+        profiler._save({"stacks": {"ask": 1}, "samples": 1}, 10.0, f"req{n}", "general")
+    # A request that finished before the first sample stores nothing
+    profiler._save({"stacks": {}, "samples": 0}, 1.0, "req-empty", "general")
+
+    assert [p["request_id"] for p in profiler.recent_profiles()] == ["req4", "req3", "req2"]
+
+
+def test_configure_rejects_a_sample_rate_below_one(store):
+    with pytest.raises(ValueError):
+        profiler.configure(True, 0)
+    assert profiler.configure(True, "4") == {"enabled": True, "sample_every": 4}
+
+
+def test_profiled_request_stores_its_request_id_and_intent(store, monkeypatch):
+    monkeypatch.setattr(Config, "TRACE_ENABLED", True)
+    monkeypatch.setattr(Config, "PROFILE_INTERVAL_MS", 1)
+    profiler.configure(True, 1)
+    app = Flask(__name__)
+
+    @app.route("/ask")
+    @tracing.traced_request("POST /ask")
+    @profiler.profiled
+    def ask():
+        tracing.set_root_attribute("intent", "change_status")
+        deadline = time.time() + 0.1
+        while time.time() < deadline:
+            time.sleep(0.005)
+        return "ok"
+
+    response = app.test_client().get("/ask", headers={"X-Request-ID": "req-42"})
+    assert response.status_code == 200
+
+    [saved] = profiler.recent_profiles()
+    assert (saved["request_id"], saved["intent"]) == ("req-42", "change_status")
+    assert saved["samples"] > 0 and saved["duration_ms"] >= 100
+    folded = profiler.get_profile(saved["id"])["folded"]
+    assert "ask (tests/test_profiler.py:" in folded
@@ -0,0 +1,90 @@
+import threading
+import pytest
+import app.services.log_store as log_store
+import app.services.question_clusters as question_clusters
+from app.config import Config
+
+TS = "2026-03-01 09:00:00"
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """An empty log store of its own."""
+    monkeypatch.setattr(Config, "LOG_DB_FILE", str(tmp_path / "logs.db"))
+    monkeypatch.setattr(log_store, "_local", threading.local())
+    monkeypatch.setattr(log_store, "_initialized", False)
+    yield
+    conn = getattr(log_store._local, "conn", None)
+    if conn:
+        conn.close()
+
+
+def _vectors(questions):
+    vectors = question_clusters._hash_embed(list(questions))
+    return {q: question_clusters._unit(v) for q, v in zip(questions, vectors)}
+
+
+def _cluster(questions):
+    """build_clusters on hashed vectors; returns the member sets, largest cluster first."""
+    clusters = question_clusters.build_clusters(questions, _vectors(questions), question_clusters.HASH_THRESHOLD)
+    return [set(c["questions"]) for c in sorted(clusters, key=lambda c: -c["count"])]
+
+
+def test_near_duplicates_merge_and_unrelated_questions_open_a_new_cluster():
+    questions = {
+        "how do i restart the core router": (5, TS),
+        "restart core router": (3, TS),
+        "please restart the core router now": (1, TS),
+        "oracle database backup schedule": (2, TS),
+    }
+    assert _cluster(questions) == [
+        {"how do i restart the core router", "restart core router", "please restart the core router now"},
+        {"oracle database backup schedule"},
+    ]
+
+
+def test_reassignment_moves_a_question_to_its_settled_centroid():
+    questions = {
+        "patch router": (6, TS),
+        "patch switch": (6, TS),
+        "switch router": (2, TS),
+        "router": (2, TS),
+    }
+    vectors = _vectors(questions)
+    # In the leader pass "switch router" joins the first cluster before "router" opens the second...
+    leaders = []
+    for q in ("patch router", "patch switch", "switch router", "router"):
+        question_clusters._assign(leaders, vectors[q], q, questions[q][0], TS, question_clusters.HASH_THRESHOLD)
+    assert [set(c["questions"]) for c in leaders] == [{"patch router", "patch switch", "switch router"}, {"router"}]
+
+    # ...but it is nearer the settled "router" centroid, so the second pass moves it there
+    assert _cluster(questions) == [{"patch router", "patch switch"}, {"switch router", "router"}]
+
+
+def test_stop_word_only_questions_are_skipped():
+    questions = {"what is it": (9, TS), "how do i": (4, TS), "restart core router": (1, TS)}
+    clusters = question_clusters.build_clusters(questions, _vectors(questions), question_clusters.HASH_THRESHOLD)
+    assert [set(c["questions"]) for c in clusters] == [{"restart core router"}]
+    assert clusters[0]["count"] == 1
+
+    assert question_clusters.build_clusters({"what is it": (1, TS)}, _vectors({"what is it": 0}), 0.5) == []
+
+
+def test_embed_reuses_cached_vectors(store, monkeypatch):
+    calls = []
+
+    def counting_embed(texts):
+        calls.append(list(texts))
+        return question_clusters._hash_embed(texts)
+
+    monkeypatch.setattr(question_clusters, "_embedding_model", lambda: (question_clusters.HASH_MODEL, counting_embed))
+    model, first = question_clusters.embed(["restart core router", "oracle backup"])
+    assert model == question_clusters.HASH_MODEL
+    assert calls == [["oracle backup", "restart core router"]]
+
+    # Only the question never seen before is embedded; the others come from the cache
+    _, second = question_clusters.embed(["restart core router", "oracle backup", "restart core router", "vlan change"])
+    assert calls[1:] == [["vlan change"]]
+    assert (second["restart core router"] == first["restart core router"]).all()
+    question_clusters.embed(["vlan change", "oracle backup"])
+    assert len(calls) == 2
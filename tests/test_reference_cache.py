@@ -0,0 +1,110 @@
+import pytest
+from cachetools import TTLCache
+import app.services.reference_cache as reference_cache
+import app.services.smart_change_creator as smart_change_creator
+from app.config import Config
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, result):
+        self._result = result
+
+    def json(self):
+        return {"result": self._result}
+
+
+@pytest.fixture(autouse=True)
+def servicenow(monkeypatch):
+    """Empty caches and a fake Table API; returns the list of (table, query) calls made."""
+    monkeypatch.setattr(Config, "SERVICENOW_INSTANCE", "https://example.service-now.com")
+    monkeypatch.setattr(Config, "SERVICENOW_USER", "integration")
+    monkeypatch.setattr(Config, "SERVICENOW_PASSWORD", "secret")
+    monkeypatch.setattr(reference_cache, "_caches", {kind: TTLCache(maxsize=1000, ttl=60) for kind in reference_cache.REFERENCE_TABLES})
+    monkeypatch.setattr(reference_cache, "_stats", {"hits": 0, "misses": 0})
+    records = {
+        "sys_user": {"user_name": {"alice": "u1", "bob": "u2"}},
+        "sys_user_group": {"name": {"Network": "g1", "Database": "g2"}},
+    }
+    calls = []
+
+    def get(url, params=None, **kwargs):
+        table = url.rsplit("/", 1)[1]
+        query = params["sysparm_query"]
+        calls.append((table, query))
+        field = dict(reference_cache.REFERENCE_TABLES.values())[table]
+        known = records.get(table, {}).get(field, {})
+        if query == "active=true":
+            keys = list(known)
+        elif "IN" in query:
+            keys = query.split("IN", 1)[1].split(",")
+        else:
+            keys = [query.split("=", 1)[1]]
+        return _Response([{"sys_id": known[k], field: k} for k in keys if k in known])
+
+    monkeypatch.setattr(reference_cache.requests, "get", get)
+    return calls
+
+
+def test_resolve_caches_a_hit(servicenow):
+    assert reference_cache.resolve_user("alice") == "u1"
+    assert reference_cache.resolve_user("alice") == "u1"
+    assert servicenow == [("sys_user", "user_name=alice")]
+    stats = reference_cache.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["user_entries"]) == (1, 1, 1)
+
+
+def test_resolve_does_not_cache_a_negative_result(servicenow):
+    assert reference_cache.resolve_user("mallory") is None
+    assert reference_cache.resolve_user("mallory") is None
+    # Not cached, so a record created later is found by the next lookup
+    assert len(servicenow) == 2
+    assert reference_cache.resolve_user("") is None
+    assert len(servicenow) == 2
+
+
+def test_warm_up_batches_keys_into_in_queries(servicenow, monkeypatch):
+    monkeypatch.setattr(reference_cache, "WARM_UP_BATCH", 2)
+    loaded = reference_cache.warm_up("user", ["alice", "bob", "alice", "carol", None])
+    assert loaded == 2
+    # Duplicates and empty keys are dropped before batching
+    assert servicenow == [("sys_user", "user_nameINalice,bob"), ("sys_user", "user_nameINcarol")]
+    assert reference_cache.resolve_user("bob") == "u2"
+    assert len(servicenow) == 2
+
+
+def test_warm_up_without_keys_loads_every_active_record(servicenow):
+    assert reference_cache.warm_up("group") == 2
+    assert servicenow == [("sys_user_group", "active=true")]
+    assert reference_cache.resolve_group("Database") == "g2"
+    assert len(servicenow) == 1
+
+
+def test_invalidate_drops_one_key_one_kind_or_everything(servicenow):
+    reference_cache.remember("user", "alice", "u1")
+    reference_cache.remember("user", "bob", "u2")
+    reference_cache.remember("group", "Network", "g1")
+
+    reference_cache.invalidate("user", "alice")
+    assert reference_cache.cache_stats()["user_entries"] == 1
+    reference_cache.invalidate("user")
+    assert reference_cache.cache_stats()["user_entries"] == 0
+    assert reference_cache.cache_stats()["group_entries"] == 1
+    reference_cache.invalidate()
+    assert reference_cache.cache_stats()["group_entries"] == 0
+    # The next lookup goes back to ServiceNow
+    assert reference_cache.resolve_user("alice") == "u1"
+    assert servicenow == [("sys_user", "user_name=alice")]
+
+
+@pytest.mark.parametrize("group, expected", [
+    ({"display_value": "Network", "link": "https://example.service-now.com/api/now/table/sys_user_group/g1"}, "g1"),
+    ({"display_value": "Network", "value": "g9"}, "g9"),
+    ("Database", "g2"),
+    (None, None),
+])
+def test_change_creation_resolves_the_template_group(servicenow, group, expected):
+    reference_cache.warm_up("group")
+    assert smart_change_creator._assignment_group({"assignment_group": group}) == expected
+    assert len(servicenow) == 1
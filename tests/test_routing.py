@@ -76,3 +76,6 @@ if __name__ == "__main__":
 
     # 8. Smart Change Creator (Cloning with Assignee)
     test_query("Clone CR-1024 for 2025-12-01 to 2025-12-02 assigned to Bob Smith", expected_intent_hint="CREATE")
+
+    # 9. Earliest conflict-free window
+    test_query("Find the earliest 4-hour window between December 14, 2025 and December 20, 2025", expected_intent_hint="SCHEDULE")
@@ -0,0 +1,100 @@
+import random
+import datetime
+import threading
+import pytest
+from flask import Flask
+import app.utils as utils
+import app.services.schedule_index as schedule_index
+from app.services.schedule_index import IntervalIndex
+
+BASE = datetime.datetime(2026, 1, 1)
+
+
+def _interval(start_hours, length_hours, **extra):
+    start = BASE + datetime.timedelta(hours=start_hours)
+    return dict(extra, start=start, end=start + datetime.timedelta(hours=length_hours))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_overlapping_matches_brute_force(seed):
+    rng = random.Random(seed)
+    intervals = [_interval(rng.randint(0, 500), rng.choice([0, 1, 4, 24, 200]), id=i) for i in range(rng.randint(0, 300))]
+    index = IntervalIndex(intervals)
+    for _ in range(200):
+        start = BASE + datetime.timedelta(hours=rng.randint(-20, 520))
+        end = start + datetime.timedelta(hours=rng.randint(0, 48))
+        expected = sorted(i["id"] for i in intervals if i["start"] <= end and i["end"] >= start)
+        assert sorted(i["id"] for i in index.overlapping(start, end)) == expected
+
+
+def test_overlapping_bounds_are_inclusive_and_predicate_filters():
+    index = IntervalIndex([_interval(0, 2, id="a"), _interval(2, 2, id="b", kind="x")])
+    touch = BASE + datetime.timedelta(hours=2)
+    assert [i["id"] for i in index.overlapping(touch, touch)] == ["a", "b"]
+    assert [i["id"] for i in index.overlapping(touch, touch, predicate=lambda i: i.get("kind"))] == ["b"]
+    assert IntervalIndex().overlapping(BASE, BASE) == []
+
+
+def _record(risk, description="Patch servers"):
+    return {"number": {"display_value": "CHG1"}, "short_description": {"display_value": description},
+            "start_date": {"display_value": "2026-01-05 10:00:00"}, "end_date": {"display_value": "2026-01-05 12:00:00"},
+            "risk": {"display_value": risk}, "state": {"display_value": "Scheduled", "value": "-2"}}
+
+
+@pytest.mark.parametrize("risk, blocking", [("Very High", True), ("High", True), ("Moderate", False), ("Low", False), ("", False)])
+def test_high_and_very_high_risk_changes_block(risk, blocking):
+    assert bool(schedule_index.change_interval(_record(risk))["blocking"]) is blocking
+
+
+def test_freeze_changes_block_whatever_the_risk():
+    assert schedule_index.change_interval(_record("Low", "Year-end freeze"))["blocking"]
+
+
+def test_free_windows_skip_a_very_high_change(monkeypatch):
+    very_high = schedule_index.change_interval(_record("Very High"))          # 2026-01-05 10:00-12:00
+    moderate = dict(schedule_index.change_interval(_record("Moderate")), number="CHG2",
+                    start=datetime.datetime(2026, 1, 5, 13), end=datetime.datetime(2026, 1, 5, 14))
+    monkeypatch.setattr(schedule_index, "_index", IntervalIndex([very_high, moderate]))
+    monkeypatch.setattr(schedule_index, "_last_refresh", datetime.datetime.now())
+    monkeypatch.setattr(schedule_index, "ensure_fresh", lambda: None)
+
+    windows = schedule_index.find_free_windows(datetime.timedelta(hours=2),
+                                               datetime.datetime(2026, 1, 5, 9), datetime.datetime(2026, 1, 5, 18), count=2)
+
+    # 09:00-11:00 would overlap the Very High change; the Moderate one does not block
+    assert windows == [(datetime.datetime(2026, 1, 5, 13), datetime.datetime(2026, 1, 5, 15)),
+                       (datetime.datetime(2026, 1, 5, 15), datetime.datetime(2026, 1, 5, 17))]
+
+
+def test_first_lookup_starts_a_background_load_and_reports_loading(monkeypatch):
+    release = threading.Event()
+    refreshes = []
+
+    def slow_refresh(force=False):
+        refreshes.append(force)
+        release.wait(5)
+
+    monkeypatch.setattr(schedule_index, "refresh_index", slow_refresh)
+    monkeypatch.setattr(schedule_index, "_last_refresh", None)
+    monkeypatch.setattr(schedule_index, "_refreshing", False)
+    window = schedule_index.day_window(datetime.date(2026, 1, 5))
+    started = datetime.datetime.now()
+    try:
+        assert schedule_index.find_conflicts([window]) is None
+        assert schedule_index.find_free_windows(datetime.timedelta(hours=2), *window) is None
+        assert (datetime.datetime.now() - started).total_seconds() < 1
+    finally:
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "schedule-index-refresh":
+                thread.join(5)
+    assert refreshes
+
+
+def test_schedule_answers_say_the_index_is_loading(monkeypatch):
+    monkeypatch.setattr(schedule_index, "find_conflicts", lambda windows: None)
+    monkeypatch.setattr(schedule_index, "find_free_windows", lambda *args: None)
+    with Flask(__name__).app_context():
+        for answer in (utils.check_schedule_conflict("Can I deploy on 2026-01-05?"),
+                       utils.find_schedule_windows("Find a 2 hour window next week")):
+            assert answer.get_json()["answer"] == utils.SCHEDULE_LOADING
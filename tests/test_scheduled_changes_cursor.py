@@ -0,0 +1,46 @@
+import datetime
+import pytest
+from flask import Flask
+import app.services.scheduled_changes_service as scheduled_changes
+from app.config import Config
+
+START = datetime.datetime(2026, 3, 2, 0, 0, 0)
+END = datetime.datetime(2026, 3, 8, 23, 59, 59)
+
+
+def test_cursor_round_trips_offset_and_period():
+    cursor = scheduled_changes._next_cursor(0, 50, 120, START, END, False)
+    assert scheduled_changes._parse_cursor(cursor) == (50, START, END, False)
+
+
+def test_no_cursor_after_the_last_page():
+    assert scheduled_changes._next_cursor(100, 20, 120, START, END, False) is None
+    assert scheduled_changes._next_cursor(0, 0, 120, START, END, False) is None
+
+
+@pytest.mark.parametrize("cursor", ["50", "not base64!", "", "W10"])
+def test_foreign_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        scheduled_changes._parse_cursor(cursor)
+
+
+def test_next_page_reuses_the_first_page_window(monkeypatch):
+    monkeypatch.setattr(Config, "SERVICENOW_INSTANCE", "https://example.service-now.com")
+    monkeypatch.setattr(Config, "SERVICENOW_USER", "user")
+    monkeypatch.setattr(Config, "SERVICENOW_PASSWORD", "secret")
+    seen = []
+
+    def fetch(sysparm_query, offset=0, limit=None):
+        seen.append((sysparm_query, offset))
+        return [{"number": "CHG0000051"}], 120
+
+    monkeypatch.setattr(scheduled_changes, "_fetch_changes_page", fetch)
+    cursor = scheduled_changes._next_cursor(0, 50, 120, START, END, False)
+
+    with Flask(__name__).app_context():
+        response = scheduled_changes.get_more_scheduled_changes("changes this week", cursor)
+
+    query, offset = seen[0]
+    assert offset == 50
+    assert "gs.dateGenerate('2026-03-02','00:00:00')@javascript:gs.dateGenerate('2026-03-08','23:59:59')" in query
+    assert scheduled_changes._parse_cursor(response.get_json()["next_cursor"])[0] == 51
@@ -0,0 +1,80 @@
+import datetime
+import threading
+from collections import defaultdict
+import pytest
+import app.services.similarity_index as similarity_index
+from app.config import Config
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, result):
+        self._result = result
+
+    def json(self):
+        return {"result": self._result}
+
+
+@pytest.fixture(autouse=True)
+def empty_index(monkeypatch):
+    """Each test gets its own empty index; the module's own state is put back afterwards."""
+    monkeypatch.setattr(similarity_index, "_documents", {})
+    monkeypatch.setattr(similarity_index, "_term_freqs", {})
+    monkeypatch.setattr(similarity_index, "_postings", defaultdict(set))
+    monkeypatch.setattr(similarity_index, "_norms", {})
+    monkeypatch.setattr(similarity_index, "_norms_dirty", True)
+    monkeypatch.setattr(similarity_index, "_last_refresh", None)
+    monkeypatch.setattr(similarity_index, "_refreshing", False)
+    yield
+    # A refresh started by ensure_fresh must finish before monkeypatch restores the globals it writes
+    for thread in threading.enumerate():
+        if thread.name == "similarity-refresh":
+            thread.join(10)
+            assert not thread.is_alive()
+
+
+def _configure(monkeypatch):
+    monkeypatch.setattr(Config, "SERVICENOW_INSTANCE", "https://example.service-now.com")
+    monkeypatch.setattr(Config, "SERVICENOW_USER", "user")
+    monkeypatch.setattr(Config, "SERVICENOW_PASSWORD", "secret")
+
+
+def test_search_ranks_by_tfidf():
+    similarity_index.add_changes([
+        {"number": "CHG1", "short_description": "Oracle database patching", "description": ""},
+        {"number": "CHG2", "short_description": "Core switch firmware", "description": "network switch"},
+    ])
+    (score, best), = similarity_index.search("patch the oracle database", top_k=1)
+    assert best["number"] == "CHG1" and 0 < score <= 1
+
+
+def test_first_load_does_not_block_the_caller(monkeypatch):
+    _configure(monkeypatch)
+    release = threading.Event()
+
+    def slow_get(*args, **kwargs):
+        release.wait(5)
+        return _Response([])
+
+    monkeypatch.setattr(similarity_index.requests, "get", slow_get)
+    started = datetime.datetime.now()
+    similarity_index.ensure_fresh()
+    assert (datetime.datetime.now() - started).total_seconds() < 1
+    assert similarity_index.size() == 0
+    release.set()
+
+
+def test_incremental_filter_is_relative_to_the_instance_clock(monkeypatch):
+    _configure(monkeypatch)
+    queries = []
+
+    def get(url, params=None, **kwargs):
+        queries.append(params["sysparm_query"])
+        return _Response([])
+
+    monkeypatch.setattr(similarity_index.requests, "get", get)
+    monkeypatch.setattr(similarity_index, "_last_refresh",
+                        datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=30))
+    similarity_index.refresh_index(force=True)
+    assert "sys_updated_on>=javascript:gs.minutesAgoStart(35)" in queries[0]
@@ -0,0 +1,112 @@
+import time
+import threading
+import pytest
+from requests.auth import HTTPBasicAuth
+import app.services.single_flight as single_flight
+
+URL = "https://example.service-now.com/api/now/table/change_request"
+N = 8
+
+
+class _Response:
+    status_code = 200
+    content = b'{"result": []}'
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(single_flight, "_in_flight", {})
+    monkeypatch.setattr(single_flight, "_metrics", {"requests": 0, "executed": 0, "coalesced": 0, "errors": 0, "max_waiters": 0})
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def _run_concurrently(monkeypatch, upstream, calls):
+    """
+    Runs every (params, auth) in `calls` in its own thread while the fake upstream
+    GET blocks, and releases it once all of them are either upstream or waiting.
+    Returns ([result or exception per call], [upstream calls]).
+    """
+    release = threading.Event()
+    upstream_calls = []
+
+    def blocking_get(url, params=None, auth=None, **kwargs):
+        upstream_calls.append((url, params, auth))
+        release.wait(5)
+        return upstream()
+
+    monkeypatch.setattr(single_flight.requests, "get", blocking_get)
+    results = [None] * len(calls)
+
+    def worker(i, params, auth):
+        try:
+            results[i] = single_flight.get(URL, params=params, auth=auth, timeout=10)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i, params, auth)) for i, (params, auth) in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    _wait_for(lambda: single_flight.metrics()["requests"] == len(calls))
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, upstream_calls
+
+
+def test_identical_concurrent_gets_share_one_upstream_call(monkeypatch):
+    auth = HTTPBasicAuth("integration", "secret")
+    params = {"sysparm_query": "active=true", "sysparm_limit": 10}
+    results, upstream = _run_concurrently(monkeypatch, _Response, [(params, auth)] * N)
+
+    assert len(upstream) == 1
+    assert all(result is results[0] for result in results)
+    metrics = single_flight.metrics()
+    assert metrics["executed"] == 1
+    assert metrics["coalesced"] == N - 1
+    assert metrics["in_flight"] == 0
+
+
+def test_an_upstream_error_reaches_every_waiter(monkeypatch):
+    def fail():
+        raise ConnectionError("instance unreachable")
+
+    results, upstream = _run_concurrently(monkeypatch, fail, [({"sysparm_limit": 1}, None)] * N)
+
+    assert len(upstream) == 1
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert single_flight.metrics()["errors"] == 1
+    # Nothing is kept after a failure: the next call goes upstream again
+    monkeypatch.setattr(single_flight.requests, "get", lambda *args, **kwargs: _Response())
+    assert isinstance(single_flight.get(URL, params={"sysparm_limit": 1}), _Response)
+
+
+def test_different_params_or_users_are_not_coalesced(monkeypatch):
+    alice = HTTPBasicAuth("alice", "secret")
+    bob = HTTPBasicAuth("bob", "secret")
+    calls = [({"sysparm_limit": 1}, alice), ({"sysparm_limit": 2}, alice), ({"sysparm_limit": 1}, bob)]
+    release = threading.Event()
+    upstream = []
+
+    def blocking_get(url, params=None, auth=None, **kwargs):
+        upstream.append((params["sysparm_limit"], auth.username))
+        release.wait(5)
+        return _Response()
+
+    monkeypatch.setattr(single_flight.requests, "get", blocking_get)
+    threads = [threading.Thread(target=single_flight.get, args=(URL,), kwargs={"params": params, "auth": auth})
+               for params, auth in calls]
+    for thread in threads:
+        thread.start()
+    # All three reach ServiceNow while the others are still in flight
+    _wait_for(lambda: len(upstream) == 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(upstream) == [(1, "alice"), (1, "bob"), (2, "alice")]
+    assert single_flight.metrics()["coalesced"] == 0
@@ -0,0 +1,25 @@
+import time
+import app.services.stats_cube as stats_cube
+
+
+def test_failed_dimension_keeps_its_own_as_of(monkeypatch):
+    monkeypatch.setattr(stats_cube.change_dataset, "refresh_dataset", lambda: None)
+    monkeypatch.setattr(stats_cube, "_cube", {})
+    monkeypatch.setattr(stats_cube, "_as_of", {})
+
+    monkeypatch.setattr(stats_cube, "compute_dimension", lambda d: {"labels": ["x"], "data": [1]})
+    stats_cube.refresh_cube()
+    _, first = stats_cube.get_dimension("risk")
+
+    def risk_fails(dimension):
+        if dimension == "risk":
+            raise Exception("API returned status 500")
+        return {"labels": ["y"], "data": [2]}
+
+    time.sleep(0.01)
+    monkeypatch.setattr(stats_cube, "compute_dimension", risk_fails)
+    stats_cube.refresh_cube()
+
+    assert stats_cube.get_dimension("risk") == ({"labels": ["x"], "data": [1]}, first)
+    state, as_of = stats_cube.get_dimension("state")
+    assert state == {"labels": ["y"], "data": [2]} and as_of > first
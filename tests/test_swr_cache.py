@@ -0,0 +1,89 @@
+import types
+import threading
+import pytest
+import app.services.swr_cache as swr_cache
+from app.config import Config
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Empty cache and a settable clock; returns [now]."""
+    now = [1000.0]
+    monkeypatch.setattr(swr_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    monkeypatch.setattr(swr_cache, "_entries", {})
+    monkeypatch.setattr(swr_cache, "_refreshing", set())
+    monkeypatch.setattr(Config, "PENDING_CACHE_MAX_AGE", 60)
+    monkeypatch.setattr(Config, "PENDING_CACHE_MAX_STALE", 600)
+    yield now
+    for thread in threading.enumerate():
+        if thread.name.startswith("swr-"):
+            thread.join(5)
+
+
+def test_fresh_hit_does_not_fetch(clock):
+    calls = []
+    fetch = lambda: calls.append(1) or f"v{len(calls)}"
+    assert swr_cache.get("approvals", "alice", fetch) == ("v1", 1000.0, False)
+    clock[0] += 30
+    assert swr_cache.get("approvals", "alice", fetch) == ("v1", 1000.0, False)
+    assert len(calls) == 1
+
+
+def test_stale_hit_returns_old_value_and_refreshes_once(clock):
+    swr_cache.get("approvals", "alice", lambda: "old")
+    clock[0] += 120
+    release = threading.Event()
+    calls = []
+
+    def slow_fetch():
+        calls.append(1)
+        release.wait(5)
+        return "new"
+
+    # Both requests get the old value at once; only the first starts a refresh
+    assert swr_cache.get("approvals", "alice", slow_fetch) == ("old", 1000.0, True)
+    assert swr_cache.get("approvals", "alice", slow_fetch) == ("old", 1000.0, True)
+    release.set()
+    for thread in threading.enumerate():
+        if thread.name == "swr-approvals":
+            thread.join(5)
+    assert len(calls) == 1
+    assert swr_cache.get("approvals", "alice", slow_fetch) == ("new", 1120.0, False)
+
+
+def test_too_stale_entry_is_fetched_synchronously(clock):
+    swr_cache.get("approvals", "alice", lambda: "old")
+    clock[0] += 900
+    assert swr_cache.get("approvals", "alice", lambda: "new") == ("new", 1900.0, False)
+
+
+def test_invalidate_forces_a_synchronous_fetch(clock):
+    swr_cache.get("approvals", "alice", lambda: "a1")
+    swr_cache.get("approvals", "bob", lambda: "b1")
+    swr_cache.get("tasks", "alice", lambda: "t1")
+
+    swr_cache.invalidate("approvals", "alice")
+    assert swr_cache.get("approvals", "alice", lambda: "a2")[0] == "a2"
+    assert swr_cache.get("approvals", "bob", lambda: "b2")[0] == "b1"
+
+    swr_cache.invalidate("approvals")
+    assert swr_cache.get("approvals", "bob", lambda: "b2")[0] == "b2"
+    assert swr_cache.get("tasks", "alice", lambda: "t2")[0] == "t1"
+
+
+def test_synchronous_fetch_error_reaches_the_caller(clock):
+    def failing():
+        raise RuntimeError("ServiceNow down")
+
+    with pytest.raises(RuntimeError):
+        swr_cache.get("approvals", "alice", failing)
+
+
+@pytest.mark.parametrize("age, refreshing, label", [
+    (3, False, "Updated just now"),
+    (42, False, "Updated 42s ago"),
+    (300, True, "Updated 5 min ago · refreshing…"),
+    (7300, False, "Updated 2 h ago"),
+])
+def test_age_label(clock, age, refreshing, label):
+    assert swr_cache.age_label(clock[0] - age, refreshing) == label
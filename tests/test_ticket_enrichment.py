@@ -0,0 +1,25 @@
+import time
+import app.services.ticket_service as ticket_service
+
+
+def _ticket():
+    return {"sys_id": "a" * 32, "cmdb_ci": {"value": "b" * 32},
+            "start_date": "2026-01-01 10:00:00", "end_date": "2026-01-01 12:00:00"}
+
+
+def test_failed_lookup_is_reported_apart_from_timeout(monkeypatch):
+    def failing(*args):
+        raise RuntimeError("401 Unauthorized")
+
+    def slow(*args):
+        time.sleep(1)
+        return ["late"]
+
+    monkeypatch.setattr(ticket_service, "_fetch_approvers", failing)
+    monkeypatch.setattr(ticket_service, "_fetch_related_changes", slow)
+    monkeypatch.setattr(ticket_service, "_local_conflicts", lambda *args: ["CHG1"])
+
+    results, missing = ticket_service._enrich_ticket(_ticket(), "CHG0000001", 0.2)
+
+    assert results == {"conflicts": ["CHG1"]}
+    assert missing == {"approvers": "failed", "related": "timeout"}
@@ -0,0 +1,66 @@
+import os
+import glob
+import json
+import multiprocessing
+import pytest
+from flask import Flask
+from app.config import Config
+import app.services.tracing as tracing
+
+WRITERS = 4
+TRACES_PER_WRITER = 60
+
+
+def _write_many(writer):
+    for n in range(TRACES_PER_WRITER):
+        tracing._write_trace({"writer": writer, "n": n, "padding": "x" * 200})
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_workers_rotating_together_lose_no_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(Config, "TRACE_FILE_MAX_BYTES", 2000)
+    monkeypatch.setattr(Config, "TRACE_FILE_BACKUPS", 1000)
+    # The test writes plain dicts in place of finished traces
+    monkeypatch.setattr(tracing, "to_otlp", lambda trace: trace)
+
+    context = multiprocessing.get_context("fork")
+    writers = [context.Process(target=_write_many, args=(w,)) for w in range(WRITERS)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(30)
+        assert process.exitcode == 0
+
+    seen = []
+    for path in glob.glob(f"{Config.TRACE_FILE}*"):
+        if path.endswith(".lock"):
+            continue
+        assert os.path.getsize(path) <= 2000
+        with open(path, encoding="utf-8") as f:
+            seen += [(t["writer"], t["n"]) for t in map(json.loads, f)]
+    assert sorted(seen) == [(w, n) for w in range(WRITERS) for n in range(TRACES_PER_WRITER)]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    app = Flask(__name__)
+
+    @app.route("/traced")
+    @tracing.traced_request("GET /traced")
+    def traced():
+        return "ok"
+
+    return app.test_client()
+
+
+def test_well_formed_request_id_is_echoed(client):
+    assert client.get("/traced", headers={"X-Request-ID": "abc-123"}).headers["X-Request-ID"] == "abc-123"
+
+
+@pytest.mark.parametrize("request_id", ["", "a" * 65, "id with spaces", "../etc", "ünïcode"])
+def test_unusable_request_id_is_replaced(client, request_id):
+    echoed = client.get("/traced", headers={"X-Request-ID": request_id}).headers["X-Request-ID"]
+    assert echoed != request_id
+    assert tracing.REQUEST_ID_PATTERN.fullmatch(echoed)
@@ -0,0 +1,88 @@
+import os
+import json
+import multiprocessing
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+from app.config import Config
+import app.services.vector_index as vector_index
+
+
+class _Embeddings:
+    """Deterministic 8-dimensional embeddings from character counts; counts its calls."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def _vector(self, text):
+        vector = np.zeros(8, dtype=np.float32)
+        for ch in text.lower():
+            vector[ord(ch) % 8] += 1
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+def _collections(texts):
+    return {"kb": lambda: [Document(page_content=t, metadata={"i": i}) for i, t in enumerate(texts)]}
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, "VECTOR_INDEX_DIR", str(tmp_path / "vector_index"))
+
+
+def test_build_once_then_map(tmp_path):
+    embeddings = _Embeddings()
+    first = vector_index.open_indexes(_collections(["alpha", "beta"]), embeddings, "v1")
+    again = vector_index.open_indexes(_collections(["alpha", "beta"]), embeddings, "v1")
+    assert embeddings.calls == 1
+    assert isinstance(again["kb"].vectors, np.memmap)
+    (doc, score), = again["kb"].search(embeddings.embed_query("alpha"), 1)
+    assert doc["page_content"] == "alpha" and score == pytest.approx(1.0)
+    assert first["kb"].documents == again["kb"].documents
+
+
+def test_rebuild_switches_vectors_and_documents_together():
+    embeddings = _Embeddings()
+    old = vector_index.open_indexes(_collections(["alpha", "beta"]), embeddings, "v1")
+    new = vector_index.open_indexes(_collections(["gamma", "delta", "epsilon"]), embeddings, "v2")
+
+    # The old mapping still pairs its own vectors and documents
+    assert len(old["kb"].vectors) == len(old["kb"].documents) == 2
+    assert len(new["kb"].vectors) == len(new["kb"].documents) == 3
+    manifest = json.load(open(os.path.join(Config.VECTOR_INDEX_DIR, "manifest.json")))
+    builds = [e for e in os.listdir(Config.VECTOR_INDEX_DIR) if e.startswith("build-")]
+    assert manifest["directory"] in builds and len(builds) == 2
+
+    vector_index.open_indexes(_collections(["zeta"]), embeddings, "v3")
+    builds = [e for e in os.listdir(Config.VECTOR_INDEX_DIR) if e.startswith("build-")]
+    assert len(builds) == 2       # current and previous only
+
+
+def _open_in_child(queue):
+    embeddings = _Embeddings()
+    indexes = vector_index.open_indexes(_collections(["alpha", "beta", "gamma"]), embeddings, "shared")
+    queue.put((embeddings.calls, len(indexes["kb"].documents)))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_concurrent_workers_build_once():
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    workers = [context.Process(target=_open_in_child, args=(queue,)) for _ in range(4)]
+    for process in workers:
+        process.start()
+    results = [queue.get(timeout=30) for _ in workers]
+    for process in workers:
+        process.join(30)
+    assert sorted(calls for calls, _ in results) == [0, 0, 0, 1]
+    assert {size for _, size in results} == {3}
@@ -0,0 +1,91 @@
+import time
+import threading
+import pytest
+from flask import Flask
+from app.config import Config
+from app.routes import main_bp
+import app.services.webhook_service as webhook_service
+import app.services.swr_cache as swr_cache
+
+SECRET = "s3cret"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(Config, "WEBHOOK_SECRET", SECRET)
+    monkeypatch.setattr(Config, "WEBHOOK_REFRESH_DELAY", 60)
+    # Change events schedule index refreshes; keep them from reaching ServiceNow
+    monkeypatch.setattr(webhook_service, "_refresh_later", lambda name, target, **kwargs: None)
+    app = Flask(__name__)
+    app.register_blueprint(main_bp)
+    return app.test_client()
+
+
+def _post(client, body, token=SECRET):
+    return client.post("/webhooks/servicenow", json=body, headers={"X-Webhook-Token": token})
+
+
+def test_missing_or_wrong_token_is_rejected(client):
+    assert _post(client, {"table": "sc_task", "operation": "update"}, token="").status_code == 401
+    assert _post(client, {"table": "sc_task", "operation": "update"}, token="s3cre7").status_code == 401
+
+
+def test_disabled_without_a_secret(client, monkeypatch):
+    monkeypatch.setattr(Config, "WEBHOOK_SECRET", None)
+    assert _post(client, {"table": "sc_task", "operation": "update"}).status_code == 503
+
+
+@pytest.mark.parametrize("body", [
+    {"events": "change_request"},
+    {"events": ["change_request"]},
+    {"events": [{"table": "incident", "operation": "update"}]},
+    {"table": "change_request", "operation": 5},
+    {"table": "change_request", "operation": "update", "number": ["CHG1"]},
+])
+def test_malformed_events_get_400(client, body):
+    assert _post(client, body).status_code == 400
+
+
+def test_bad_event_rejects_the_whole_batch(client):
+    swr_cache._store(("approvals", "david.loo"), ["cached"])
+    response = _post(client, {"events": [
+        {"table": "sysapproval_approver", "operation": "update", "approver": "david.loo"},
+        {"table": "change_request", "operation": "explode"},
+    ]})
+    assert response.status_code == 400
+    assert ("approvals", "david.loo") in swr_cache._entries
+
+
+def test_valid_batch_is_applied(client):
+    swr_cache._store(("tasks", "beth.anglin"), ["cached"])
+    response = _post(client, {"events": [{"table": "sc_task", "operation": "update", "assigned_to": "beth.anglin"}]})
+    assert response.status_code == 200
+    assert response.get_json()["actions"] == ["tasks:beth.anglin"]
+    assert ("tasks", "beth.anglin") not in swr_cache._entries
+
+
+def test_events_received_by_another_worker_are_replayed(client, monkeypatch):
+    webhook_service.sync(force=True)
+    swr_cache._store(("approvals", "david.loo"), ["cached"])
+    # Another worker records the event; this process only sees the log store row
+    webhook_service._publish([{"table": "sysapproval_approver", "operation": "update", "approver": "david.loo"}])
+    monkeypatch.setattr(webhook_service, "_last_sync", 0.0)
+    # Any request checks for replayed events before it is handled
+    client.get("/metrics/servicenow")
+    assert ("approvals", "david.loo") not in swr_cache._entries
+
+
+def test_refreshes_are_debounced(monkeypatch):
+    monkeypatch.setattr(Config, "WEBHOOK_REFRESH_DELAY", 0.2)
+    calls = []
+    done = threading.Event()
+
+    def refresh():
+        calls.append(1)
+        done.set()
+
+    for _ in range(20):
+        webhook_service._refresh_later("test", refresh)
+    assert done.wait(2)
+    time.sleep(0.3)
+    assert calls == [1]